@@ -1,10 +1,7 @@
 import os
-import sys
 import threading
-from flask import Flask, jsonify
+from flask import Flask
 from dotenv import load_dotenv
-from flask_socketio import SocketIO
-import google.generativeai as genai
 from utils.load_creds import load_creds
 from flask_cors import CORS
 
@@ -13,10 +10,22 @@ from controller.chat_controller import chat_bp
 from controller.tuning_job_controller import tuning_bp
 from controller.custom_document_processing_controller import Custom_document_tuning_bp
 from controller.model_status_controller import model_status_bp
+from controller.metrics_controller import metrics_bp
 
 from utils.services import create_finetuning_job
+import job_manager
 from model.custom_gemini_model import CustomGemini_Model
 from model.socketio_instance import socketio
+from model.socketio_queue import message_queue_options
+from model.vertex_model_registry import VertexModelRegistry
+from utils.response_cache import response_cache
+from utils.metrics import instrument_app
+
+def _warm_up_model(model_registry):
+    try:
+        model_registry.warm_up()
+    except Exception as e:
+        print(f"⚠️ Could not pre-warm Vertex AI model client: {e}")
 
 def create_app():
     # Always load the default .env file first
@@ -35,6 +44,7 @@ def create_app():
         
     
     app = Flask(__name__)
+    instrument_app(app)
     
     frontend_origin = os.getenv("FRONTEND_ORIGIN", "*")
     # Enable CORS for all routes with proper configuration
@@ -42,15 +52,29 @@ def create_app():
         "*": {
             "origins": [frontend_origin],
             "methods": ["GET", "POST", "OPTIONS"],
-            "allow_headers": ["Content-Type"]
+            "allow_headers": ["Content-Type", "X-Session-Id", "X-Filename"],
+            "expose_headers": ["Retry-After", "X-Session-Id"]
         }
     })
     
-    creds = load_creds()
-    genai.configure(credentials=creds)
-    genai.configure(transport='grpc')
+    # Resolves GOOGLE_APPLICATION_CREDENTIALS; the Google SDKs are imported on first use
+    load_creds()
     
-    socketio.init_app(app, cors_allowed_origins="*")
+    # With SOCKETIO_MESSAGE_QUEUE set, workers share emits and rooms through the queue
+    socketio.init_app(app, cors_allowed_origins="*", **message_queue_options())
+
+    # Sweeps interrupted by a restart carry on from the progress saved on disk
+    if job_manager.sweep_scheduler.has_unfinished():
+        job_manager.sweep_scheduler.start()
+
+    # Cached answers belong to the old model once the tuned endpoint changes
+    model_registry = VertexModelRegistry.get_instance()
+    model_registry.add_rebuild_listener(lambda model_name: response_cache.clear())
+
+    # Pre-warm the Vertex AI client so the first chat request does not pay for it.
+    # This runs in the background so the app can answer /health right away.
+    if os.getenv("VERTEX_WARM_UP", "1") != "0":
+        threading.Thread(target=_warm_up_model, args=(model_registry,), daemon=True).start()
     
     # Initialize the model singleton
     # gemini_model = CustomGemini_Model.get_instance()
@@ -60,6 +84,7 @@ def create_app():
     # app.register_blueprint(chat_bp)
     app.register_blueprint(tuning_bp)
     app.register_blueprint(Custom_document_tuning_bp)
-    # app.register_blueprint(model_status_bp)
+    app.register_blueprint(model_status_bp)
+    app.register_blueprint(metrics_bp)
     
     return app
\ No newline at end of file
@@ -0,0 +1,321 @@
+"""
+Drives the HTTP and Socket.IO endpoints at fixed request rates and reports
+latency percentiles and throughput per scenario.
+
+Scenarios run side by side, so the control-plane endpoints are measured while
+chat traffic loads the model path:
+
+- chat       POST /tuning-chat
+- lambda     POST /lambda_proxy
+- presign    POST /get_presigned_url
+- socketio   'tuning_chat' over Socket.IO, timed until 'tuning_chat_done'
+
+Load is open-loop: requests start on a fixed schedule whether or not earlier ones
+have finished, and latency is measured from the scheduled start, so a backed-up
+server shows up as latency instead of a silently lower request rate.
+
+By default a local server is started with MODEL_BACKEND=stub, so no cloud access
+is needed. Thresholds make the run fail on capacity regressions.
+
+Run from the backend directory:
+    python -m benchmarks.load_test --duration 20 --rate chat=20 --rate lambda=5 --rate presign=5 \\
+        --rate socketio=5 --max-p95-ms chat=500 --report load-report.json
+    python -m benchmarks.load_test --url http://localhost:5000 --rate chat=2
+"""
+import argparse
+import itertools
+import json
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.startup_benchmark import BACKEND_DIR, _environment, _free_port
+
+QUESTIONS = (
+    "How does LIU ensure equal access to education?",
+    "What are the tuition fees for international students?",
+    "When does the library open on weekends?",
+    "How do I apply for student housing?",
+    "Which master's programmes are taught in English?",
+)
+DOCUMENT = " ".join(
+    f"Section {i}. Students must register for courses before the deadline and may contact the study counsellor."
+    for i in range(50)
+)
+
+
+def _post_json(url, payload, timeout):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+class Scenario:
+    """A named request kind; run(n) performs the n-th request and returns a status."""
+
+    def __init__(self, name, base_url, timeout):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def setup(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+class ChatScenario(Scenario):
+    def run(self, n):
+        # Numbered questions keep most requests from being answered by the response cache.
+        question = f"{QUESTIONS[n % len(QUESTIONS)]} (load test {n})"
+        return _post_json(f"{self.base_url}/tuning-chat", {"msg": question, "session_id": f"load-{n}"}, self.timeout)
+
+
+class LambdaScenario(Scenario):
+    def run(self, n):
+        payload = {"text": DOCUMENT, "s3_key": f"uploads/load-test-{n % 50}.pdf"}
+        return _post_json(f"{self.base_url}/lambda_proxy", payload, self.timeout)
+
+
+class PresignScenario(Scenario):
+    def run(self, n):
+        payload = {"filename": f"load-test-{n}.pdf", "content_type": "application/pdf"}
+        return _post_json(f"{self.base_url}/get_presigned_url", payload, self.timeout)
+
+
+class SocketIOScenario(Scenario):
+    """
+    Sends chat questions over a small pool of Socket.IO connections.
+    """
+
+    def __init__(self, name, base_url, timeout, connections=4):
+        super().__init__(name, base_url, timeout)
+        self.connections = connections
+        self._clients = []
+        self._waiters = {}
+        self._lock = threading.Lock()
+
+    def setup(self):
+        import socketio
+
+        for _ in range(self.connections):
+            client = socketio.Client(reconnection=False)
+            client.on("tuning_chat_done", lambda data: self._finish(data, 200))
+            client.on("tuning_chat_error", lambda data: self._finish(data, 429 if "retry_after" in data else 500))
+            client.connect(self.base_url, wait_timeout=self.timeout)
+            self._clients.append(client)
+
+    def _finish(self, data, status):
+        with self._lock:
+            waiter = self._waiters.pop(data.get("request_id"), None)
+        if waiter is not None:
+            waiter[1] = status
+            waiter[0].set()
+
+    def run(self, n):
+        request_id = f"load-{n}"
+        waiter = [threading.Event(), None]
+        with self._lock:
+            self._waiters[request_id] = waiter
+        question = f"{QUESTIONS[n % len(QUESTIONS)]} (socket load test {n})"
+        self._clients[n % len(self._clients)].emit("tuning_chat", {"msg": question, "request_id": request_id})
+        if not waiter[0].wait(self.timeout):
+            with self._lock:
+                self._waiters.pop(request_id, None)
+            return "timeout"
+        return waiter[1]
+
+    def teardown(self):
+        for client in self._clients:
+            client.disconnect()
+
+
+SCENARIOS = {
+    "chat": ChatScenario,
+    "lambda": LambdaScenario,
+    "presign": PresignScenario,
+    "socketio": SocketIOScenario,
+}
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))] if ordered else 0.0
+
+
+def drive(scenario, rate, duration, max_in_flight=256):
+    """
+    Runs a scenario open-loop at `rate` requests per second for `duration` seconds.
+
+    Returns:
+        dict: Request and error counts, status codes, throughput and latency percentiles.
+    """
+    samples = []
+    statuses = Counter()
+    lock = threading.Lock()
+    interval = 1.0 / rate
+
+    def one(n, scheduled):
+        try:
+            status = scenario.run(n)
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = (time.perf_counter() - scheduled) * 1000
+        with lock:
+            samples.append(elapsed)
+            statuses[str(status)] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for n in itertools.count():
+            scheduled = started + n * interval
+            if scheduled - started >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, n, scheduled)
+    wall = time.perf_counter() - started
+
+    ordered = sorted(samples)
+    ok = sum(count for status, count in statuses.items() if status.isdigit() and int(status) < 400)
+    return {
+        "target_rate": rate,
+        "requests": len(samples),
+        "errors": len(samples) - ok,
+        "statuses": dict(statuses),
+        "throughput_per_s": round(ok / wall, 3) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.mean(ordered), 3) if ordered else 0.0,
+            "p50": round(_percentile(ordered, 0.50), 3),
+            "p95": round(_percentile(ordered, 0.95), 3),
+            "p99": round(_percentile(ordered, 0.99), 3),
+            "max": round(ordered[-1], 3) if ordered else 0.0,
+        },
+    }
+
+
+def start_stub_server(stub_latency_ms, stub_failure_rate):
+    """
+    Starts the app on a free port with the stub model backend and waits for /health.
+
+    Returns:
+        tuple: (process, base_url)
+    """
+    env = _environment(warm_up=False)
+    env.update({
+        "MODEL_BACKEND": "stub",
+        "STUB_LATENCY_MS": str(stub_latency_ms),
+        "STUB_FAILURE_RATE": str(stub_failure_rate),
+        # Presigning is local signing, so any key pair works offline.
+        "AWS_ACCESS_KEY": env.get("AWS_ACCESS_KEY") or "load-test",
+        "AWS_SECRET_ACCESS_KEY": env.get("AWS_SECRET_ACCESS_KEY") or "load-test",
+    })
+    port = _free_port()
+    script = ("import sys\nfrom app import create_app\nfrom model.socketio_instance import socketio\n"
+              "socketio.run(create_app(), host='127.0.0.1', port=int(sys.argv[1]), allow_unsafe_werkzeug=True)\n")
+    server = subprocess.Popen([sys.executable, "-c", script, str(port)], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=1):
+                return server, base_url
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise TimeoutError("The load-test server did not answer /health")
+
+
+def _parse_pairs(values, cast=float):
+    pairs = {}
+    for value in values or ():
+        name, _, number = value.partition("=")
+        if name not in SCENARIOS or not number:
+            raise ValueError(f"Expected <scenario>=<number> with a scenario from {sorted(SCENARIOS)}, got {value!r}")
+        pairs[name] = cast(number)
+    return pairs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the chat, document and Socket.IO endpoints.")
+    parser.add_argument("--url", help="Test a running server instead of starting a stub-backed one")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per scenario")
+    parser.add_argument("--rate", action="append", default=[], help="<scenario>=<requests per second>")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds before a request counts as failed")
+    parser.add_argument("--stub-latency-ms", type=float, default=200.0)
+    parser.add_argument("--stub-failure-rate", type=float, default=0.0)
+    parser.add_argument("--max-p95-ms", action="append", default=[], help="<scenario>=<ms> fails the run above it")
+    parser.add_argument("--min-throughput", action="append", default=[], help="<scenario>=<req/s> fails below it")
+    parser.add_argument("--max-error-rate", type=float, help="Fail when any scenario's error share is above this")
+    parser.add_argument("--report", help="Path for the JSON report")
+    args = parser.parse_args(argv)
+
+    rates = _parse_pairs(args.rate) or {"chat": 10.0, "lambda": 5.0, "presign": 5.0, "socketio": 5.0}
+    max_p95 = _parse_pairs(args.max_p95_ms)
+    min_throughput = _parse_pairs(args.min_throughput)
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server, base_url = start_stub_server(args.stub_latency_ms, args.stub_failure_rate)
+    try:
+        scenarios = {name: SCENARIOS[name](name, base_url.rstrip("/"), args.timeout) for name in rates}
+        for scenario in scenarios.values():
+            scenario.setup()
+        results = {}
+        threads = [
+            threading.Thread(target=lambda name=name: results.__setitem__(
+                name, drive(scenarios[name], rates[name], args.duration)))
+            for name in scenarios
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for scenario in scenarios.values():
+            scenario.teardown()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    failures = []
+    for name, result in sorted(results.items()):
+        latency = result["latency_ms"]
+        print(f"{name:<9} {result['requests']:>6} req  {result['throughput_per_s']:>8.2f} ok/s  "
+              f"p50={latency['p50']:>9.1f} ms  p95={latency['p95']:>9.1f} ms  p99={latency['p99']:>9.1f} ms  "
+              f"errors={result['errors']} {result['statuses']}")
+        if name in max_p95 and latency["p95"] > max_p95[name]:
+            failures.append(f"{name}: p95 {latency['p95']} ms > {max_p95[name]} ms")
+        if name in min_throughput and result["throughput_per_s"] < min_throughput[name]:
+            failures.append(f"{name}: throughput {result['throughput_per_s']}/s < {min_throughput[name]}/s")
+        if args.max_error_rate is not None and result["requests"]:
+            error_rate = result["errors"] / result["requests"]
+            if error_rate > args.max_error_rate:
+                failures.append(f"{name}: error rate {error_rate:.3f} > {args.max_error_rate}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as outfile:
+            json.dump({"base_url": base_url, "duration": args.duration, "scenarios": results}, outfile, indent=2)
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Measures the per-request cost of building a Vertex AI model client versus
+reusing the warm client held by VertexModelRegistry.
+
+Run from the backend directory:
+    python -m benchmarks.model_client_benchmark --iterations 200
+"""
+import argparse
+import statistics
+import time
+
+from model.model_backends import vertex_backend
+from model.vertex_model_registry import VertexModelRegistry
+
+
+def _build_per_request(registry, open_client):
+    # What every /tuning-chat request used to do.
+    project, location, _ = registry.endpoint_config()
+    model = vertex_backend(project, location, registry.model_name())
+    if open_client:
+        model._prediction_client
+    return model
+
+
+def _time_calls(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _summary(name, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<22} mean={statistics.mean(samples):8.4f} ms  p50={statistics.median(samples):8.4f} ms  p95={p95:8.4f} ms")
+    return statistics.mean(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Vertex AI model client reuse.")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    registry = VertexModelRegistry()
+    # Opening the prediction client needs credentials; fall back to construction only.
+    try:
+        _build_per_request(registry, open_client=True)
+        open_client = True
+    except Exception as e:
+        print(f"⚠️ No usable credentials ({type(e).__name__}); measuring client construction only.")
+        open_client = False
+
+    cold = _summary("per-request client", _time_calls(lambda: _build_per_request(registry, open_client), args.iterations))
+    registry.get_model()
+    warm = _summary("registry (warm)", _time_calls(registry.get_model, args.iterations))
+    print(f"Saved per request: {cold - warm:.4f} ms ({cold / max(warm, 1e-9):.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
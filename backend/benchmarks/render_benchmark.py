@@ -0,0 +1,143 @@
+"""
+Compares incremental response rendering with the old one-shot rendering.
+
+A synthetic streamed answer of many text chunks, code blocks and inline images
+is rendered two ways:
+
+- legacy       the old display_chatbot_execution_result, run once over the
+               whole response after the last chunk (string concatenation per
+               part, images embedded as data URIs)
+- incremental  StreamingRenderer, fed one chunk at a time, with images above
+               the inline limit handed to a (local, fake) object store
+
+The report shows the render time of each, when the first rendered output is
+available, the size of the rendered payload, and how the incremental cost per
+chunk changes when the response gets longer.
+
+Run from the backend directory:
+    python -m benchmarks.render_benchmark --chunks 2000 --images 4 --image-kb 512
+"""
+import argparse
+import base64
+import os
+import statistics
+import time
+from types import SimpleNamespace
+
+from utils.response_renderer import StreamingRenderer
+
+WORDS = ("Linköping", "University", "offers", "courses", "in", "engineering", "<and>", "medicine", "&", "more.")
+
+
+def _part(text=None, code=None, output=None, image=None):
+    return SimpleNamespace(
+        text=text,
+        executable_code=SimpleNamespace(code=code) if code else None,
+        code_execution_result=SimpleNamespace(output=output) if output else None,
+        inline_data=SimpleNamespace(data=image, mime_type="image/png") if image else None,
+    )
+
+
+def make_response_chunks(chunks, chunk_words=12, images=2, image_kb=256, code_every=200):
+    """
+    Builds the chunks of a long multi-part answer, each holding one part.
+    """
+    result = []
+    image_every = max(chunks // (images + 1), 1) if images else 0
+    added_images = 0
+    for n in range(chunks):
+        words = " ".join(WORDS[(n + i) % len(WORDS)] for i in range(chunk_words))
+        result.append(_part(text=words + ("\n\n" if n % 20 == 19 else " ")))
+        if code_every and n % code_every == code_every - 1:
+            result.append(_part(code=f"print(sum(range({n})))"))
+            result.append(_part(output=str(sum(range(n)))))
+        if image_every and n % image_every == image_every - 1 and added_images < images:
+            result.append(_part(image=os.urandom(image_kb * 1024)))
+            added_images += 1
+    return [SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))]) for part in result]
+
+
+def legacy_render(parts):
+    # display_chatbot_execution_result before the incremental renderer (bytes are base64-encoded first,
+    # as the old code only accepted base64 text).
+    html_parts = []
+    for part in parts:
+        part_content = ""
+        if part.text and part.text.strip():
+            part_content += f"<p>{part.text.strip()}</p>"
+        if part.executable_code and part.executable_code.code and part.executable_code.code.strip():
+            part_content += f"<pre>{part.executable_code.code.strip()}</pre>"
+        if part.code_execution_result and part.code_execution_result.output and part.code_execution_result.output.strip():
+            part_content += f"<pre>{part.code_execution_result.output.strip()}</pre>"
+        if part.inline_data and part.inline_data.data:
+            inline_data = part.inline_data.data
+            if isinstance(inline_data, bytes):
+                inline_data = base64.b64encode(inline_data).decode("ascii")
+            if inline_data.strip() and inline_data.strip() != "b''":
+                part_content += f'<img src="data:image/png;base64,{inline_data.strip()}" alt="Image result"/>'
+        if part_content:
+            html_parts.append(part_content)
+    return "<hr/>".join(html_parts)
+
+
+def run_legacy(chunks):
+    # The old code rendered once, after the whole response had arrived.
+    parts = [chunk.candidates[0].content.parts[0] for chunk in chunks]
+    started = time.perf_counter()
+    rendered = legacy_render(parts)
+    return (time.perf_counter() - started) * 1000, len(rendered)
+
+
+def run_incremental(chunks, inline_image_limit):
+    renderer = StreamingRenderer("html", store_image=lambda data, mime: f"https://bucket.example/responses/{len(data)}.png",
+                                 inline_image_limit=inline_image_limit)
+    samples = []
+    size = 0
+    for chunk in chunks:
+        started = time.perf_counter()
+        size += len(renderer.feed(chunk))
+        samples.append((time.perf_counter() - started) * 1000)
+    size += len(renderer.close())
+    return samples, size, size
+
+
+def _best(runs, fn):
+    # Best of several runs, so a stray GC pause or cold cache does not skew a short measurement.
+    return min((fn() for _ in range(runs)), key=lambda result: result[0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark incremental response rendering.")
+    parser.add_argument("--chunks", type=int, default=1000, help="Text chunks in the streamed answer")
+    parser.add_argument("--chunk-words", type=int, default=12)
+    parser.add_argument("--images", type=int, default=2)
+    parser.add_argument("--image-kb", type=int, default=256)
+    parser.add_argument("--inline-image-kb", type=int, default=16, help="Images above this are offloaded")
+    parser.add_argument("--runs", type=int, default=5, help="Repetitions; the best run is reported")
+    args = parser.parse_args(argv)
+    inline_limit = args.inline_image_kb * 1024
+
+    def incremental(chunks):
+        samples, size, _ = run_incremental(chunks, inline_limit)
+        return sum(samples), size, samples
+
+    chunks = make_response_chunks(args.chunks, args.chunk_words, args.images, args.image_kb)
+    print(f"{len(chunks)} chunks, {args.images} images of {args.image_kb} KiB")
+    legacy_ms, legacy_bytes = _best(args.runs, lambda: run_legacy(chunks))
+    total_ms, size, samples = _best(args.runs, lambda: incremental(chunks))
+    print(f"legacy       render={legacy_ms:9.2f} ms once, after the last chunk  payload={legacy_bytes / 1024:9.1f} KiB")
+    print(f"incremental  render={total_ms:9.2f} ms over the stream  first output after {samples[0]:.4f} ms  "
+          f"per chunk mean={statistics.mean(samples) * 1000:7.2f} us  payload={size / 1024:9.1f} KiB")
+    print(f"Total render time is {total_ms / max(legacy_ms, 1e-9):.1f}x the one-shot render, spread over the stream; "
+          f"the payload is {legacy_bytes / max(size, 1):.1f}x smaller (images offloaded)")
+
+    # Linear cost: the time per chunk should not grow with the length of the response.
+    for factor in (1, 4, 16):
+        longer = make_response_chunks(args.chunks * factor, args.chunk_words, args.images, args.image_kb)
+        scaled_ms, _, _ = _best(args.runs, lambda: incremental(longer))
+        print(f"Incremental cost for {factor:>2}x the chunks: {scaled_ms:8.2f} ms, "
+              f"{scaled_ms / len(longer) * 1000:6.2f} us per chunk")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Measures backend cold start: the time to import the app and the time from
+process start to the first successful /health response.
+
+Every run starts a fresh interpreter, so nothing is served from an already
+warm import cache. Thresholds turn the benchmark into a regression check.
+
+Run from the backend directory:
+    python -m benchmarks.startup_benchmark --runs 5 --max-import-ms 1500 --max-health-ms 3000
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# SDKs that must not be loaded just by importing the app.
+LAZY_MODULES = ("vertexai", "google.genai", "google.generativeai", "boto3")
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({"import_ms": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+_SERVER_SCRIPT = """
+import sys
+from app import create_app
+from model.socketio_instance import socketio
+socketio.run(create_app(), host="127.0.0.1", port=int(sys.argv[1]), allow_unsafe_werkzeug=True)
+"""
+
+
+def _environment(warm_up):
+    env = dict(os.environ)
+    if not env.get("GOOGLE_APPLICATION_CREDENTIALS"):
+        # load_creds() only needs an existing file; the SDKs are never called here.
+        handle, path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(handle, "w") as f:
+            json.dump({}, f)
+        env["GOOGLE_APPLICATION_CREDENTIALS"] = path
+    env["VERTEX_WARM_UP"] = "1" if warm_up else "0"
+    env["PYTHONPATH"] = BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(env):
+    output = subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_health(env, timeout=60.0):
+    """
+    Starts the server and polls /health until it answers, returning the elapsed milliseconds.
+    """
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-c", _SERVER_SCRIPT, str(port)], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode} before answering /health")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"/health did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _summary(name, samples):
+    print(f"{name:<18} mean={statistics.mean(samples):8.1f} ms  min={min(samples):8.1f} ms  max={max(samples):8.1f} ms")
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark backend import time and time to first /health.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warm-up", action="store_true", help="Also pre-warm the Vertex AI client on startup")
+    parser.add_argument("--max-import-ms", type=float, help="Fail if the median import time is above this")
+    parser.add_argument("--max-health-ms", type=float, help="Fail if the median time to /health is above this")
+    args = parser.parse_args(argv)
+
+    env = _environment(args.warm_up)
+    imports = [measure_import(env) for _ in range(args.runs)]
+    import_ms = _summary("import app", [run["import_ms"] for run in imports])
+    health_ms = _summary("first /health", [measure_health(env) for _ in range(args.runs)])
+
+    failures = []
+    loaded = sorted({module for run in imports for module in run["loaded"]})
+    if loaded:
+        failures.append(f"importing the app loaded {', '.join(loaded)}")
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        failures.append(f"median import time {import_ms:.1f} ms > {args.max_import_ms} ms")
+    if args.max_health_ms is not None and health_ms > args.max_health_ms:
+        failures.append(f"median time to /health {health_ms:.1f} ms > {args.max_health_ms} ms")
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Measures Textract result extraction throughput, in pages per second, on documents
+with many pages.
+
+A fake paginated Textract client answers get_document_text_detection after a
+fixed latency per page, and a fake S3 client takes a fixed latency per request.
+Three ways of extracting are compared:
+
+- serial        pages fetched one after another, all text kept and written with
+                one put_object at the end (no prefetching, one document at a time)
+- streamed      extract_text_to_s3: the next page is prefetched while the current
+                one is written, and text goes to S3 as a multipart upload
+- concurrent    extract_documents: several documents streamed side by side
+
+The peak memory of one streamed document is also measured with and without
+keeping the full text.
+
+Run from the backend directory:
+    python -m benchmarks.textract_benchmark --documents 4 --pages 100 --page-ms 20
+"""
+import argparse
+import threading
+import time
+import tracemalloc
+
+from utils.textract_services import MIN_PART_SIZE, extract_documents, extract_text_to_s3, iter_result_pages
+
+
+class FakeTextract:
+    """Serves pages of LINE blocks after page_ms of simulated latency each."""
+
+    def __init__(self, pages, lines_per_page, line_chars, page_ms):
+        self.pages = pages
+        self.page_ms = page_ms
+        self.lines_per_page = lines_per_page
+        self.filler = "x" * max(line_chars - 12, 0)
+
+    def get_document_text_detection(self, JobId, MaxResults, NextToken=None):
+        time.sleep(self.page_ms / 1000)
+        page = int(NextToken or 0)
+        # New strings for every page, like a parsed API response.
+        blocks = [{"BlockType": "LINE", "Text": f"{page:05d} {i:05d} {self.filler}"} for i in range(self.lines_per_page)]
+        response = {"JobStatus": "SUCCEEDED", "Blocks": blocks}
+        if page + 1 < self.pages:
+            response["NextToken"] = str(page + 1)
+        return response
+
+
+class FakeS3:
+    """Accepts uploads after request_ms of simulated latency each, keeping only their sizes."""
+
+    def __init__(self, request_ms):
+        self.request_ms = request_ms
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def _request(self, body=b""):
+        time.sleep(self.request_ms / 1000)
+        with self._lock:
+            self.bytes += len(body)
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self._request(Body)
+
+    def create_multipart_upload(self, Bucket, Key, ContentType):
+        self._request()
+        return {"UploadId": "upload"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._request(Body)
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._request()
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        pass
+
+
+class FakeTextractJobs:
+    """Routes each job id to a fake client of its own, since extract_documents shares one client."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get_document_text_detection(self, JobId, **request):
+        with self._lock:
+            client = self._clients.get(JobId)
+            if client is None:
+                client = self._clients[JobId] = self._factory()
+        return client.get_document_text_detection(JobId=JobId, **request)
+
+
+def extract_serially(job_id, textract, s3):
+    # One page after another, the whole text kept and written at the end.
+    lines = []
+    pages = 0
+    for page in iter_result_pages(job_id, textract):
+        pages += 1
+        lines.extend(block["Text"] for block in page.get("Blocks", ()) if block.get("BlockType") == "LINE")
+    s3.put_object(Bucket="bench", Key=f"processed/{job_id}.txt", Body="\n".join(lines).encode("utf-8"),
+                  ContentType="text/plain; charset=utf-8")
+    return pages
+
+
+def _report(name, pages, seconds):
+    print(f"{name:<12} pages={pages:6d}  time={seconds:8.2f} s  throughput={pages / seconds:8.1f} pages/s")
+    return pages / seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Textract result extraction.")
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=100, help="Result pages per document")
+    parser.add_argument("--lines-per-page", type=int, default=500)
+    parser.add_argument("--line-chars", type=int, default=80)
+    parser.add_argument("--page-ms", type=float, default=20.0, help="Latency of one GetDocumentTextDetection call")
+    parser.add_argument("--s3-ms", type=float, default=30.0, help="Latency of one S3 request")
+    parser.add_argument("--prefetch", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    def textract():
+        return FakeTextract(args.pages, args.lines_per_page, args.line_chars, args.page_ms)
+
+    page_bytes = args.lines_per_page * (args.line_chars + 1)
+    print(f"{args.documents} documents of {args.pages} pages, {page_bytes / 1024:.0f} KiB of text per page, "
+          f"{args.page_ms:g} ms per page, {args.s3_ms:g} ms per S3 request")
+
+    started = time.perf_counter()
+    pages = sum(extract_serially(f"job-{n}", textract(), FakeS3(args.s3_ms)) for n in range(args.documents))
+    serial = _report("serial", pages, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    pages = 0
+    for n in range(args.documents):
+        pages += extract_text_to_s3(f"job-{n}", f"uploads/doc-{n}.pdf", textract=textract(), s3=FakeS3(args.s3_ms),
+                                    prefetch_pages=args.prefetch, part_size=MIN_PART_SIZE)["pages"]
+    streamed = _report("streamed", pages, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    results = extract_documents({f"job-{n}": f"uploads/doc-{n}.pdf" for n in range(args.documents)},
+                                max_documents=args.documents, textract=FakeTextractJobs(textract),
+                                s3=FakeS3(args.s3_ms), prefetch_pages=args.prefetch)
+    pages = sum(result["pages"] for result in results.values())
+    concurrent = _report("concurrent", pages, time.perf_counter() - started)
+    print(f"Streaming is {streamed / serial:.1f}x the serial throughput, "
+          f"{concurrent / serial:.1f}x with {args.documents} documents side by side")
+
+    for keep_text in (True, False):
+        tracemalloc.start()
+        extract_text_to_s3("job-memory", "uploads/memory.pdf", textract=textract(), s3=FakeS3(0),
+                           prefetch_pages=args.prefetch, keep_text=keep_text)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"Peak memory of one document, keep_text={keep_text!s:<5}: {peak / 1024 / 1024:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,8 @@
 from flask import Blueprint, jsonify, request
 from utils.services import generate_chat_response
+from controller.tuning_job_controller import get_session_id
 
 chat_bp = Blueprint('chat', __name__)
-# Optionally, you could load historical conversation data:
-# conversation_history = load_training_data()
-conversation_history = []
 
 @chat_bp.route("/chat", methods=["POST"])
 def chat():
@@ -17,7 +15,7 @@ def chat():
     """
     if userText:
         try:
-            response = generate_chat_response(userText, conversation_history)
+            response = generate_chat_response(userText, get_session_id())
             return jsonify({"response": response})
         except Exception as e:
             print(f"Error: {e}")
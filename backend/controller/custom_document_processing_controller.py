@@ -1,8 +1,14 @@
 from flask import Blueprint, request, jsonify
-from flask_socketio import emit
-from utils.aws_services import upload_file_to_S3, generate_presigned_url
+from flask_socketio import join_room, leave_room
+from botocore.exceptions import ClientError
+from utils.aws_services import (
+    upload_file_to_S3, generate_presigned_url, upload_stream_to_S3, start_multipart_upload, presign_upload_parts,
+    list_uploaded_parts, complete_multipart_upload, abort_multipart_upload, is_upload_key, MAX_PARTS
+)
+from utils.textract_services import extract_text_to_s3
 from model.socketio_instance import socketio
 import utils.transcription_cache as cache
+from utils.transcription_notifier import transcription_notifier, transcription_room
 
 Custom_document_tuning_bp = Blueprint('Custom_Document', __name__)
 
@@ -46,19 +52,209 @@ def get_presigned_url():
 
     return jsonify({"url": presigned_url, "s3_key": s3_key})
 
+@Custom_document_tuning_bp.route("/upload_stream", methods=["POST"])
+def upload_stream():
+    """
+    Streams a raw request body to S3 without buffering it.
+
+    The file name is taken from the 'filename' query parameter or the X-Filename header
+    and the body is uploaded in concurrent parts as it arrives.
+    """
+    filename = request.args.get("filename") or request.headers.get("X-Filename")
+    if not filename:
+        return jsonify({"error": "Missing filename"}), 400
+
+    try:
+        s3_key = upload_stream_to_S3(request.stream, filename, request.mimetype or "application/octet-stream")
+        return jsonify({"message": "File uploaded successfully", "s3_key": s3_key})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _get_upload(data):
+    """
+    Returns the (s3_key, upload_id) of a multipart upload request, or None when they are invalid.
+    """
+    s3_key, upload_id = data.get("s3_key"), data.get("upload_id")
+    if not upload_id or not is_upload_key(s3_key):
+        return None
+    return s3_key, upload_id
+
+def _s3_error(e):
+    code = e.response.get("Error", {}).get("Code")
+    status = 404 if code == "NoSuchUpload" else 400 if code in ("InvalidPart", "InvalidPartOrder", "EntityTooSmall") else 500
+    return jsonify({"error": str(e), "code": code}), status
+
+@Custom_document_tuning_bp.route("/multipart/start", methods=["POST"])
+def multipart_start():
+    """
+    Starts a multipart upload for a large file.
+
+    Expects {"filename", "content_type"} and optionally the file "size" in bytes.
+    Returns the upload id, the S3 key, the part size and the suggested number of
+    parts to upload in parallel.
+    """
+    data = request.get_json(silent=True) or {}
+    if not data.get("filename") or not data.get("content_type"):
+        return jsonify({"error": "Missing filename or content type"}), 400
+
+    try:
+        return jsonify(start_multipart_upload(data["filename"], data["content_type"], data.get("size")))
+    except ClientError as e:
+        return _s3_error(e)
+
+@Custom_document_tuning_bp.route("/multipart/presign", methods=["POST"])
+def multipart_presign():
+    """
+    Returns presigned PUT URLs for parts of a multipart upload.
+
+    Expects {"s3_key", "upload_id"} and either "part_numbers" (a list) or "part_count"
+    (parts 1..part_count). Each uploaded part answers with an ETag header the client
+    passes back to /multipart/complete.
+    """
+    data = request.get_json(silent=True) or {}
+    upload = _get_upload(data)
+    if upload is None:
+        return jsonify({"error": "Missing or invalid s3_key or upload_id"}), 400
+
+    try:
+        # Sizes are checked before anything is built or signed, so one request can't ask for millions of URLs.
+        part_numbers = data.get("part_numbers")
+        if part_numbers:
+            if not isinstance(part_numbers, list) or len(part_numbers) > MAX_PARTS:
+                return jsonify({"error": f"part_numbers must be a list of at most {MAX_PARTS} parts"}), 400
+            part_numbers = [int(number) for number in part_numbers]
+        else:
+            part_count = int(data.get("part_count", 0))
+            if part_count > MAX_PARTS:
+                return jsonify({"error": f"part_count must be at most {MAX_PARTS}"}), 400
+            part_numbers = list(range(1, part_count + 1))
+        if not part_numbers:
+            return jsonify({"error": "Missing part_numbers or part_count"}), 400
+        return jsonify({"parts": presign_upload_parts(*upload, part_numbers)})
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+@Custom_document_tuning_bp.route("/multipart/parts", methods=["GET"])
+def multipart_parts():
+    """
+    Lists the parts already uploaded, so an interrupted upload can resume with the missing ones.
+    """
+    upload = _get_upload(request.args)
+    if upload is None:
+        return jsonify({"error": "Missing or invalid s3_key or upload_id"}), 400
+
+    try:
+        return jsonify({"parts": list_uploaded_parts(*upload)})
+    except ClientError as e:
+        return _s3_error(e)
+
+@Custom_document_tuning_bp.route("/multipart/complete", methods=["POST"])
+def multipart_complete():
+    """
+    Completes a multipart upload.
+
+    Expects {"s3_key", "upload_id"} and optionally "parts" as [{"part_number", "etag"}].
+    Without "parts" the upload is assembled from the parts S3 has received.
+    """
+    data = request.get_json(silent=True) or {}
+    upload = _get_upload(data)
+    if upload is None:
+        return jsonify({"error": "Missing or invalid s3_key or upload_id"}), 400
+
+    try:
+        result = complete_multipart_upload(*upload, data.get("parts"))
+        return jsonify({"message": "File uploaded successfully", **result})
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except ClientError as e:
+        return _s3_error(e)
+
+@Custom_document_tuning_bp.route("/multipart/abort", methods=["POST"])
+def multipart_abort():
+    """
+    Aborts a multipart upload and discards its parts.
+    """
+    data = request.get_json(silent=True) or {}
+    upload = _get_upload(data)
+    if upload is None:
+        return jsonify({"error": "Missing or invalid s3_key or upload_id"}), 400
+
+    try:
+        abort_multipart_upload(*upload)
+        return jsonify({"message": "Upload aborted", "s3_key": upload[0]})
+    except ClientError as e:
+        return _s3_error(e)
+
 @Custom_document_tuning_bp.route('/lambda_proxy', methods=['POST'])
 def lambda_proxy():
     """
-    Receives transcription from Lambda and emits it to connected WebSocket clients.
-    Also stores it in a global variable for later use in prompt construction.
+    Receives transcription from Lambda and sends it to the WebSocket clients
+    subscribed to its upload; bursts for the same upload are coalesced.
+    Also chunks and indexes it under the upload's S3 key, so chat prompts only
+    carry the passages relevant to each question.
     """
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     transcription_text = data.get("text", "")
     if transcription_text:
         print("🔥 Transcription received in Flask:", transcription_text)
-        cache.latest_transcription = transcription_text
-        
-        socketio.emit('transcription_update', {"text": transcription_text})
+        s3_key = cache.store_transcription(transcription_text, data.get("s3_key"))
+
+        transcription_notifier.publish(s3_key, transcription_text)
         return jsonify({"message": "Transcription sent via WebSocket and saved."}), 200
 
     return jsonify({"error": "No transcription text provided"}), 400
+
+def _ingest_textract_result(job_id, s3_key):
+    try:
+        # The text is indexed for chat below, so it is kept as well as written to S3.
+        result = extract_text_to_s3(job_id, s3_key, keep_text=True)
+    except Exception as e:
+        print(f"Error extracting Textract job {job_id}: {e}")
+        transcription_notifier.error(s3_key, {"job_id": job_id, "error": str(e)})
+        return
+    print(f"✅ Extracted {result['lines']} lines from {result['pages']} pages to {result['output_key']}")
+    cache.store_transcription(result["text"], s3_key)
+    transcription_notifier.publish(s3_key, result["text"])
+
+@Custom_document_tuning_bp.route('/textract_result', methods=['POST'])
+def textract_result():
+    """
+    Collects the text of a finished Textract job in the background.
+
+    Expects {"job_id": ..., "s3_key": ...}. The LINE blocks are streamed to S3 under
+    the 'processed/' prefix, then indexed for chat and announced over WebSocket like
+    a transcription received through /lambda_proxy.
+    """
+    data = request.get_json(silent=True) or {}
+    if not data.get("job_id") or not data.get("s3_key"):
+        return jsonify({"error": "Missing job_id or s3_key"}), 400
+
+    socketio.start_background_task(_ingest_textract_result, data["job_id"], data["s3_key"])
+    return jsonify({"message": "Textract extraction started.", "job_id": data["job_id"]}), 202
+
+@socketio.on("subscribe_transcription")
+def subscribe_transcription(data):
+    """
+    Joins the calling client to the room of an upload, so it receives that
+    upload's 'transcription_update' and 'transcription_error' events.
+
+    Expects {"s3_key": ...}. If the transcription already arrived, it is sent to
+    the client right away, so subscribing after the upload finished loses nothing.
+    """
+    s3_key = (data or {}).get("s3_key")
+    if not isinstance(s3_key, str) or not s3_key:
+        socketio.emit("transcription_error", {"error": "Missing s3_key"}, to=request.sid)
+        return
+    join_room(transcription_room(s3_key))
+    document = cache.document_store.get(s3_key)
+    if document is not None:
+        socketio.emit("transcription_update", {"text": document.text, "s3_key": s3_key, "updates": 0}, to=request.sid)
+
+@socketio.on("unsubscribe_transcription")
+def unsubscribe_transcription(data):
+    """
+    Leaves the room of an upload. Rooms are also left automatically on disconnect.
+    """
+    s3_key = (data or {}).get("s3_key")
+    if isinstance(s3_key, str) and s3_key:
+        leave_room(transcription_room(s3_key))
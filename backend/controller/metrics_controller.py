@@ -0,0 +1,21 @@
+from flask import Blueprint, Response
+from model.socketio_instance import socketio
+from utils.metrics import metrics_registry
+from utils.model_executor import model_executor
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# Point-in-time values are read when /metrics is scraped, so they cost nothing per request.
+metrics_registry.gauge("socketio_connected_clients", "Socket.IO clients connected to this worker.",
+                       callback=socketio.connected_clients)
+metrics_registry.gauge("model_executor_running", "Model calls currently running.",
+                       callback=lambda: model_executor.stats()["running"])
+metrics_registry.gauge("model_executor_queued", "Model calls waiting for a worker.",
+                       callback=lambda: model_executor.stats()["queued"])
+
+@metrics_bp.route("/metrics")
+def metrics():
+    """
+    Exposes request, upstream, token, Socket.IO and error metrics in the Prometheus text format.
+    """
+    return Response(metrics_registry.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
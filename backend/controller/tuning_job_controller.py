@@ -1,70 +1,445 @@
 import os
-from flask import Blueprint, jsonify, request
-import google.generativeai as genai
+import json
+import threading
+import time
+import uuid
+from flask import Blueprint, Response, g, jsonify, request, stream_with_context
 import job_manager as job_manager
-from utils.services import create_finetuning_job
 from utils.services import generate_fine_tuned_chat_response as generate_chat_response
-from utils.transcription_cache import latest_transcription
+from utils.services import stream_fine_tuned_chat_response
+from utils.response_cache import response_cache
+from utils.response_renderer import parse_format, render_response, render_stream
+from utils.metrics import record_error
+from utils.model_executor import ExecutorBusy, ModelCallTimeout, model_executor
+import utils.transcription_cache as transcription_cache
+from model.conversation_store import ConversationStore, conversation_store
+from model.context_window import context_window
+from model.tuning_job_registry import tuning_job_registry
+from model.socketio_instance import socketio
 
 
 tuning_bp = Blueprint('tuning', __name__)
-# Initialize conversation history for the fine-tuned chat
-conversation_history = []
 FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "*")
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", "100"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+SESSION_COOKIE = "chat_session_id"
+SESSION_COOKIE_MAX_AGE = int(os.getenv("CHAT_SESSION_COOKIE_MAX_AGE", str(24 * 3600)))
+
+def get_session_id():
+    """
+    Identifies the caller's chat session.
+
+    Uses the X-Session-Id header, then a 'session_id' field in the JSON body or
+    query string, then the session cookie. A caller with none of these gets a new
+    random id, returned in the X-Session-Id header and the cookie (see
+    issue_session_id), rather than one derived from its address: callers behind
+    the same proxy would otherwise share one conversation.
+    """
+    payload = request.get_json(silent=True) or {}
+    session_id = (
+        request.headers.get("X-Session-Id")
+        or payload.get("session_id")
+        or request.args.get("session_id")
+        or request.cookies.get(SESSION_COOKIE)
+    )
+    if not session_id:
+        session_id = g.get("issued_session_id") or uuid.uuid4().hex
+        g.issued_session_id = session_id
+    return session_id
+
+@tuning_bp.after_request
+def issue_session_id(response):
+    """
+    Hands a newly issued session id back to the caller, to send with its next messages.
+    """
+    session_id = g.pop("issued_session_id", None)
+    if session_id:
+        response.headers["X-Session-Id"] = session_id
+        response.set_cookie(SESSION_COOKIE, session_id, max_age=SESSION_COOKIE_MAX_AGE, httponly=True, samesite="Lax")
+    return response
+
+def get_user_text():
+    """
+    Reads the user's message from the query string or the JSON body.
+    """
+    return request.args.get('msg') or (request.get_json(silent=True) or {}).get('msg')
+
+def get_response_format(payload=None):
+    """
+    Returns the requested answer format: 'text' (the default), 'html' or 'markdown'.
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    if payload is None:
+        payload = {**request.args, **(request.get_json(silent=True) or {})}
+    return parse_format(payload.get("format"))
+
+def get_document_key(payload=None):
+    """
+    Returns the S3 key of the document the question is about.
+    Defaults to the most recently transcribed document.
+    """
+    if payload is None:
+        payload = {**request.args, **(request.get_json(silent=True) or {})}
+    return payload.get("s3_key") or transcription_cache.latest_document_key
+
+def get_document_context(question, document_key):
+    """
+    Retrieves the document passages most relevant to the question.
+
+    Returns:
+        tuple: (context, retrieval_info); info is None when there is no document.
+    """
+    if not document_key:
+        return "", None
+    context, info = transcription_cache.document_store.retrieve(document_key, question)
+    if info:
+        print(f"Retrieved {info['chunks']}/{info['total_chunks']} chunks from {document_key} "
+              f"in {info['retrieval_ms']}ms, saving {info['saved_tokens']} prompt tokens")
+    return context, info
+
+def busy_response(e):
+    """
+    Answers a call the model executor turned away, telling the client when to retry.
+    """
+    record_error("model_executor", e)
+    response = jsonify({"error": str(e), "retry_after": e.retry_after})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, e.status
 
 @tuning_bp.route("/tuning-job", methods=["POST"])
 def tuning_job():
     """
-    Handles fine-tuning job creation.
+    Starts a fine-tuning job in the background.
+
+    The JSON body may override the tuning settings (base_model, epoch_count,
+    batch_size, learning_rate, display_name) and the dataset options (shard_index,
+    num_shards, max_examples). A request matching a registered job that is
+    running or has succeeded reuses that job instead of tuning again.
+
+    Fingerprinting the dataset, submission and polling run off the request thread;
+    progress is pushed to Socket.IO clients as 'tuning_job_update' events and
+    served by /model-status, where a reused job has 'reused' set.
     """
+    overrides = request.get_json(silent=True) or {}
+    if not isinstance(overrides, dict):
+        return jsonify({"error": "Request body must be a JSON object of tuning parameters"}), 400
     try:
-        # Check if a tuning job already exists using the shared variable
-        if job_manager.tuning_job_instance is not None:
-            print("Tuning job already exists:", job_manager.tuning_job_instance)
-            return jsonify({
-                "job_id": job_manager.tuning_job_instance.name,
-                "state": job_manager.tuning_job_instance.state,
-                "message": "Tuning job already in progress or completed."
-            }), 200
-
-        # Create a new fine-tuning job
-        job_manager.tuning_job_instance = create_finetuning_job()
-        print("Created tuning job instance:", job_manager.tuning_job_instance)
-
-        # Monitor and log the job state
-        if job_manager.tuning_job_instance.state == "JOB_STATE_QUEUED":
-            print("Tuning job is still in queue. Waiting for completion...")
-            return jsonify({
-                "message": "Tuning job is in queue. Please check again later.",
-                "job_id": job_manager.tuning_job_instance.name
-            }), 202  # HTTP 202 - Accepted (not ready yet)
-
-        if not job_manager.tuning_job_instance.tuned_model:
-            raise ValueError("Tuning job completed, but no tuned model was returned.")
-
-        return jsonify({"fine_tuned_model": job_manager.tuning_job_instance.tuned_model.model})
+        snapshot, started = job_manager.tuning_job_runner.start(overrides)
+        if not started:
+            print("Tuning job already exists:", snapshot)
+            return jsonify(dict(snapshot, message="Tuning job already in progress or completed.")), 200
+
+        return jsonify(dict(snapshot, message="Tuning job accepted. Please check /model-status for progress.")), 202  # HTTP 202 - Accepted (not ready yet)
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error creating tuning job: {e}")
         return jsonify({"error": str(e)}), 500
 
+@tuning_bp.route("/tuning-jobs", methods=["GET"])
+def tuning_jobs():
+    """
+    Lists the registered tuning jobs with their fingerprints, settings and last known state.
+    """
+    return jsonify({"jobs": tuning_job_registry.entries()}), 200
+
+@tuning_bp.route("/tuning-sweeps", methods=["POST"])
+def create_tuning_sweep():
+    """
+    Queues a hyperparameter sweep and starts scheduling its trials.
+
+    The JSON body holds 'search' ('grid' or 'random'), a 'space' of epoch_count,
+    batch_size, learning_rate and dataset values, and optionally 'trials', 'seed',
+    'rank_by', 'eval_max_examples' and shared 'overrides'. Progress is served by
+    /tuning-sweeps/<id> and pushed as 'tuning_sweep_update' events.
+    """
+    try:
+        sweep = job_manager.sweep_scheduler.create(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job_manager.sweep_scheduler.start()
+    return jsonify(dict(sweep, message=f"Sweep queued with {len(sweep['trials'])} trials.")), 202
+
+@tuning_bp.route("/tuning-sweeps", methods=["GET"])
+def list_tuning_sweeps():
+    return jsonify({"sweeps": job_manager.sweep_scheduler.list()}), 200
+
+@tuning_bp.route("/tuning-sweeps/<sweep_id>", methods=["GET"])
+def get_tuning_sweep(sweep_id):
+    """
+    Returns a sweep with the state, metrics and rank of every trial.
+    """
+    sweep = job_manager.sweep_scheduler.get(sweep_id)
+    if sweep is None:
+        return jsonify({"error": "Sweep not found"}), 404
+    return jsonify(sweep), 200
+
 @tuning_bp.route("/tuning-chat", methods=["POST", "OPTIONS"])
 def tuning_chat():
     if request.method == "OPTIONS":
         response = jsonify({})
         response.headers.add('Access-Control-Allow-Origin', FRONTEND_ORIGIN)
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, X-Session-Id')
         response.headers.add('Access-Control-Allow-Methods', 'POST')
         return response
     
-    userText = request.args.get('msg') or request.json.get('msg')
-    prompt_construction = (latest_transcription + "\n" + userText).strip()
+    userText = get_user_text()
     if userText:
         try:
-            response = generate_chat_response(prompt_construction, conversation_history)
-            return jsonify({"response": response}), 200
+            response_format = get_response_format()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            context, retrieval = get_document_context(userText, get_document_key())
+            # The blocking model call runs on the bounded model executor, not this worker
+            response = model_executor.run(generate_chat_response, userText, get_session_id(), context=context)
+            body = {"response": render_response(response, response_format), "format": response_format}
+            if retrieval:
+                body["retrieval"] = retrieval
+            return jsonify(body), 200
+        except ExecutorBusy as e:
+            return busy_response(e)
+        except ModelCallTimeout as e:
+            record_error("model_executor", e)
+            print(f"Fine-tuned chat response timed out: {e}")
+            return jsonify({"error": str(e)}), 504
         except Exception as e:
             print(f"Error generating fine-tuned chat response: {e}")
             return jsonify({"error": str(e)}), 500
     else:
-        return jsonify({"error": "No message received"}), 
+        return jsonify({"error": "No message received"}), 400
+
+@tuning_bp.route("/tuning-chat/stats", methods=["GET"])
+def tuning_chat_stats():
+    """
+    Returns how much chat history the server holds, how the response cache performs
+    and how much of the token budget chat calls use.
+    """
+    return jsonify({
+        "conversations": conversation_store.stats(),
+        "response_cache": response_cache.stats(),
+        "model_executor": model_executor.stats(),
+        "context_window": context_window.stats()
+    }), 200
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@tuning_bp.route("/tuning-chat/stream", methods=["GET", "POST"])
+def tuning_chat_stream():
+    """
+    Streams the fine-tuned model's answer as Server-Sent Events.
+
+    Emits 'chunk' events with partial text (or HTML/Markdown deltas with
+    format=html|markdown), then a 'done' event carrying the time to first token,
+    or an 'error' event if generation fails.
+    """
+    userText = get_user_text()
+    if not userText:
+        return jsonify({"error": "No message received"}), 400
+    try:
+        response_format = get_response_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    session_id = get_session_id()
+    context, retrieval = get_document_context(userText, get_document_key())
+    try:
+        stream = model_executor.stream(stream_fine_tuned_chat_response, userText, session_id, context=context)
+    except ExecutorBusy as e:
+        return busy_response(e)
+
+    def generate():
+        started = time.perf_counter()
+        ttft_ms = None
+        try:
+            for text in render_stream(stream, response_format):
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - started) * 1000
+                yield _sse("chunk", {"text": text})
+            total_ms = (time.perf_counter() - started) * 1000
+            print(f"Streamed chat response: ttft={ttft_ms}ms total={total_ms:.1f}ms")
+            yield _sse("done", {"ttft_ms": ttft_ms, "total_ms": total_ms, "retrieval": retrieval})
+        except Exception as e:
+            print(f"Error streaming fine-tuned chat response: {e}")
+            yield _sse("error", {"error": str(e)})
+        finally:
+            # Stops the model call as well when the client goes away mid-stream.
+            stream.close()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
+
+def parse_batch_prompts(payload):
+    """
+    Normalizes the prompts of a batch request to dicts with an id, a message and a document key.
+
+    Prompts may be plain strings or {"id", "msg", "s3_key"} objects; a missing id
+    defaults to the prompt's position and a missing s3_key to the batch's s3_key.
+
+    Raises:
+        ValueError: If the prompts are missing, malformed or too many.
+    """
+    prompts = payload.get("prompts")
+    if not isinstance(prompts, list) or not prompts:
+        raise ValueError("Expected a non-empty 'prompts' list")
+    if len(prompts) > BATCH_MAX_PROMPTS:
+        raise ValueError(f"A batch can hold at most {BATCH_MAX_PROMPTS} prompts")
+
+    shared_key = get_document_key(payload)
+    items = []
+    seen = set()
+    for position, prompt in enumerate(prompts):
+        if isinstance(prompt, str):
+            prompt = {"msg": prompt}
+        if not isinstance(prompt, dict) or not prompt.get("msg"):
+            raise ValueError(f"Prompt {position} has no message")
+        prompt_id = prompt.get("id", position)
+        if prompt_id in seen:
+            raise ValueError(f"Duplicate prompt id: {prompt_id}")
+        seen.add(prompt_id)
+        items.append({"id": prompt_id, "msg": prompt["msg"], "s3_key": prompt.get("s3_key") or shared_key})
+    return items
+
+@tuning_bp.route("/tuning-chat/batch", methods=["POST"])
+def tuning_chat_batch():
+    """
+    Answers a list of prompts concurrently and streams the answers as NDJSON.
+
+    Expects {"prompts": [...], "s3_key": ..., "max_concurrency": ..., "format": ...}. Every prompt
+    goes through the same model client, response cache and executor as /tuning-chat,
+    with at most max_concurrency (capped by BATCH_MAX_CONCURRENCY) in flight. Each
+    line is {"id", "response"} or {"id", "error", "status"} in completion order,
+    followed by a {"done": true, ...} summary line.
+
+    Prompts in a batch are independent: they see no chat history and add none.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        items = parse_batch_prompts(payload)
+        max_concurrency = min(int(payload.get("max_concurrency") or BATCH_MAX_CONCURRENCY), BATCH_MAX_CONCURRENCY)
+        response_format = get_response_format(payload)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    # A throwaway store keeps the batch out of every real conversation.
+    batch_store = ConversationStore(max_sessions=len(items))
+
+    def answer(item):
+        started = time.perf_counter()
+        context, _ = get_document_context(item["msg"], item["s3_key"])
+        response = generate_chat_response(item["msg"], f"batch:{item['id']}", store=batch_store, context=context)
+        return render_response(response, response_format), (time.perf_counter() - started) * 1000
+
+    def generate():
+        started = time.perf_counter()
+        errors = 0
+        for item, result, error in model_executor.map_unordered(answer, items, max_concurrency):
+            if error is None:
+                response, elapsed_ms = result
+                line = {"id": item["id"], "response": response, "ms": round(elapsed_ms, 1)}
+            else:
+                errors += 1
+                status = getattr(error, "status", 504 if isinstance(error, ModelCallTimeout) else 500)
+                line = {"id": item["id"], "error": str(error), "status": status}
+                if isinstance(error, ExecutorBusy):
+                    line["retry_after"] = error.retry_after
+            yield json.dumps(line) + "\n"
+        total_ms = (time.perf_counter() - started) * 1000
+        print(f"Answered batch of {len(items)} prompts in {total_ms:.1f}ms with {errors} errors")
+        yield json.dumps({"done": True, "count": len(items), "errors": errors, "total_ms": round(total_ms, 1)}) + "\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson", headers=headers)
+
+# Streams started over Socket.IO, keyed by (sid, request_id), mapped to an abort flag
+_socket_streams = {}
+_socket_streams_lock = threading.Lock()
+
+def _run_socket_stream(sid, request_id, stream, aborted):
+    started = time.perf_counter()
+    ttft_ms = None
+    try:
+        for text in stream:
+            if aborted.is_set():
+                # Closing the generator skips the history update for a partial answer.
+                stream.close()
+                socketio.emit("tuning_chat_aborted", {"request_id": request_id}, to=sid)
+                return
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+            socketio.emit("tuning_chat_chunk", {"request_id": request_id, "text": text}, to=sid)
+        socketio.emit("tuning_chat_done", {
+            "request_id": request_id,
+            "ttft_ms": ttft_ms,
+            "total_ms": (time.perf_counter() - started) * 1000
+        }, to=sid)
+    except Exception as e:
+        record_error("socketio", e)
+        print(f"Error streaming fine-tuned chat response over Socket.IO: {e}")
+        socketio.emit("tuning_chat_error", {"request_id": request_id, "error": str(e)}, to=sid)
+    finally:
+        stream.close()
+        with _socket_streams_lock:
+            _socket_streams.pop((sid, request_id), None)
+
+@socketio.on("tuning_chat")
+def tuning_chat_socket(data):
+    """
+    Starts a streamed chat answer for the calling Socket.IO client.
+
+    Expects {"msg": ..., "request_id": ..., "session_id": ..., "s3_key": ..., "format": ...}; chunks are
+    sent back as 'tuning_chat_chunk' events followed by 'tuning_chat_done'.
+    """
+    data = data or {}
+    userText = data.get("msg")
+    request_id = data.get("request_id")
+    if not userText:
+        socketio.emit("tuning_chat_error", {"request_id": request_id, "error": "No message received"}, to=request.sid)
+        return
+    try:
+        response_format = get_response_format(data)
+    except ValueError as e:
+        socketio.emit("tuning_chat_error", {"request_id": request_id, "error": str(e)}, to=request.sid)
+        return
+
+    context, _ = get_document_context(userText, get_document_key(data))
+    try:
+        stream = model_executor.stream(
+            stream_fine_tuned_chat_response, userText, data.get("session_id") or request.sid, context=context
+        )
+    except ExecutorBusy as e:
+        socketio.emit("tuning_chat_error", {
+            "request_id": request_id, "error": str(e), "retry_after": e.retry_after
+        }, to=request.sid)
+        return
+
+    aborted = threading.Event()
+    with _socket_streams_lock:
+        _socket_streams[(request.sid, request_id)] = aborted
+    socketio.start_background_task(_run_socket_stream, request.sid, request_id,
+                                   render_stream(stream, response_format), aborted)
+
+@socketio.on("tuning_chat_abort")
+def tuning_chat_socket_abort(data):
+    """
+    Stops a streamed answer started by this client.
+    """
+    with _socket_streams_lock:
+        aborted = _socket_streams.get((request.sid, (data or {}).get("request_id")))
+    if aborted is not None:
+        aborted.set()
+
+@socketio.on("disconnect")
+def tuning_chat_socket_disconnect(*args):
+    """
+    Aborts every stream the disconnected client still had running.
+    """
+    with _socket_streams_lock:
+        for (sid, _), aborted in _socket_streams.items():
+            if sid == request.sid:
+                aborted.set()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Read once: os.umask can only be queried by setting it.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextmanager
+def atomic_open(path, mode="w", encoding=None):
+    """
+    Opens a temporary file next to path and moves it over path only once the
+    block completes, so readers never see a partial file. On error the
+    temporary file is removed and path is left untouched.
+
+    Every call gets a temporary file of its own, so concurrent writers of the
+    same path never mix their output; the last one to finish wins.
+    """
+    path = os.fspath(path)
+    if "b" not in mode and encoding is None:
+        encoding = "utf-8"
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f".{os.path.basename(path)}.",
+                                     suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as file:
+            yield file
+        # mkstemp creates the file readable by its owner only; give it the permissions open() would have.
+        os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def check_outputs(inputs, outputs):
+    """
+    Refuses output paths that are also inputs, so a rerun can never destroy its own sources.
+
+    Raises:
+        ValueError: If an output resolves to the same file as an input.
+    """
+    sources = {os.path.realpath(path) for path in inputs}
+    for path in outputs:
+        if path and os.path.realpath(path) in sources:
+            raise ValueError(f"Refusing to overwrite input file {path}")
@@ -0,0 +1,236 @@
+"""
+Rebuilds the training and validation datasets from the collected data, incrementally.
+
+The build has two stages:
+
+- compile   each input JSONL file is validated and compiled (see compiled_dataset)
+            into a cache file named after the input's content hash and the token
+            counter, so an unchanged input is never read again
+- split     the compiled inputs are merged in order, exact duplicates are dropped,
+            examples outside the token range are filtered out, and each example is
+            assigned to training or validation by its content hash
+
+A manifest next to the outputs records the content hash of every input and the
+fingerprint and output hashes of every stage. On a rebuild, only changed inputs
+are compiled again, and the split stage reruns only when its inputs, parameters
+or outputs changed. Because the split is hash-based, an example stays on the same
+side across rebuilds. Outputs are written atomically and may never be inputs.
+
+Run from the backend directory:
+    python -m data.build_datasets --output-dir data/build --validation 0.2 --min-tokens 5 --max-tokens 80
+    python -m data.build_datasets data/collected-data/pdf*.jsonl --output-dir data/build-pdf
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+
+from data.atomic_files import atomic_open, check_outputs
+from data.compiled_dataset import VERSION as COMPILED_VERSION, CompiledDataset, compile_jsonl, split_bucket
+from data.token_counting import get_token_counter
+
+BUILD_VERSION = 1
+DEFAULT_INPUTS = "./data/collected-data/*.jsonl"
+DEFAULT_OUTPUT_DIR = "./data/build"
+MANIFEST_NAME = "manifest.json"
+TRAIN_NAME = "training-dataset.jsonl"
+VALIDATION_NAME = "validation-dataset.jsonl"
+
+_READ_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """
+    Returns the SHA-256 of a file's contents as a hex string, reading it in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(_READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(*parts):
+    """
+    Hashes the JSON form of parts, e.g. a stage name, its parameters and its input hashes.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class BuildManifest:
+    """
+    The input content hashes and stage fingerprints recorded by the last build.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.inputs = {}
+        self.stages = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if data.get("version") == BUILD_VERSION:
+                self.inputs = data.get("inputs", {})
+                self.stages = data.get("stages", {})
+
+    def input_hash(self, path):
+        """
+        Returns the content hash of an input. The hash recorded by the last build
+        is reused while the file's size and modification time are unchanged.
+        """
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = self.inputs.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+        self.inputs[key] = {"sha256": file_sha256(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        return self.inputs[key]["sha256"]
+
+    def is_current(self, stage, stage_fingerprint):
+        """
+        Tells whether a stage last ran with this fingerprint and its outputs are still as it wrote them.
+        """
+        entry = self.stages.get(stage)
+        if not entry or entry["fingerprint"] != stage_fingerprint:
+            return False
+        for path, recorded in entry["outputs"].items():
+            if not os.path.exists(path) or os.path.getsize(path) != recorded["size"]:
+                return False
+            if file_sha256(path) != recorded["sha256"]:
+                return False
+        return True
+
+    def record_stage(self, stage, stage_fingerprint, outputs, **details):
+        self.stages[stage] = {
+            "fingerprint": stage_fingerprint,
+            "outputs": {path: {"sha256": file_sha256(path), "size": os.path.getsize(path)} for path in outputs},
+            **details,
+        }
+
+    def save(self):
+        with atomic_open(self.path) as file:
+            json.dump({"version": BUILD_VERSION, "inputs": self.inputs, "stages": self.stages}, file, indent=2)
+
+
+def _in_range(tokens, min_tokens, max_tokens):
+    return (min_tokens is None or tokens >= min_tokens) and (max_tokens is None or tokens <= max_tokens)
+
+
+def split_compiled(compiled_paths, train_path, validation_path, validation_fraction=0.2, salt="",
+                   min_tokens=None, max_tokens=None):
+    """
+    Merges compiled datasets into deduplicated, token-filtered training and validation JSONL files.
+
+    Returns:
+        dict: The number of examples read, written to each split, and dropped as duplicates or out of range.
+    """
+    seen = set()
+    counts = {"examples": 0, "train": 0, "validation": 0, "duplicates": 0, "out_of_range": 0}
+    with atomic_open(train_path, "wb") as ftrain, atomic_open(validation_path, "wb") as fvalidation:
+        for path in compiled_paths:
+            with CompiledDataset(path) as dataset:
+                user_tokens = dataset.column("user_tokens")
+                model_tokens = dataset.column("model_tokens")
+                for index in range(len(dataset)):
+                    counts["examples"] += 1
+                    digest = dataset.digest(index)
+                    if digest in seen:
+                        counts["duplicates"] += 1
+                        continue
+                    seen.add(digest)
+                    if not (_in_range(user_tokens[index], min_tokens, max_tokens)
+                            and _in_range(model_tokens[index], min_tokens, max_tokens)):
+                        counts["out_of_range"] += 1
+                        continue
+                    side = "validation" if split_bucket(digest, salt) < validation_fraction else "train"
+                    (fvalidation if side == "validation" else ftrain).write(dataset.raw(index))
+                    counts[side] += 1
+    return counts
+
+
+def build(inputs, output_dir=DEFAULT_OUTPUT_DIR, validation_fraction=0.2, salt="", min_tokens=None,
+          max_tokens=None, counter=None, force=False):
+    """
+    Brings the training and validation datasets in output_dir up to date with the inputs.
+
+    Args:
+        inputs (list[str]): Gemini-format JSONL files, merged in order.
+        output_dir (str): Where the outputs, the manifest and the compile cache live.
+        validation_fraction (float): Share of examples assigned to validation.
+        salt (str): Changes which examples are assigned to validation.
+        min_tokens (int, optional): Drop examples whose user or model text is shorter.
+        max_tokens (int, optional): Drop examples whose user or model text is longer.
+        counter: Token counter for the length filter; defaults to 'approx'.
+        force (bool): Rebuild every stage even if it is up to date.
+
+    Returns:
+        dict: Which inputs were compiled or reused, whether the split ran, and its counts.
+    """
+    counter = counter or get_token_counter("approx")
+    cache_dir = os.path.join(output_dir, "cache")
+    train_path = os.path.join(output_dir, TRAIN_NAME)
+    validation_path = os.path.join(output_dir, VALIDATION_NAME)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    check_outputs(inputs, [train_path, validation_path, manifest_path])
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = BuildManifest(manifest_path)
+    report = {"compiled": [], "reused": [], "split": "reused"}
+
+    compiled_paths = []
+    for path in inputs:
+        compile_key = fingerprint("compile", BUILD_VERSION, COMPILED_VERSION, manifest.input_hash(path), counter.name)
+        compiled_path = os.path.join(cache_dir, f"{compile_key[:32]}.gds")
+        if force or not os.path.exists(compiled_path):
+            compile_jsonl([path], compiled_path, counter)
+            report["compiled"].append(path)
+        else:
+            report["reused"].append(path)
+        manifest.inputs[os.path.abspath(path)]["compiled"] = compiled_path
+        compiled_paths.append(compiled_path)
+
+    split_key = fingerprint("split", BUILD_VERSION, [os.path.basename(p) for p in compiled_paths],
+                            validation_fraction, salt, min_tokens, max_tokens)
+    if force or not manifest.is_current("split", split_key):
+        counts = split_compiled(compiled_paths, train_path, validation_path, validation_fraction, salt,
+                                min_tokens, max_tokens)
+        manifest.record_stage("split", split_key, [train_path, validation_path], counts=counts)
+        report["split"] = "built"
+    report["counts"] = manifest.stages["split"]["counts"]
+
+    # Forget inputs that are gone from the build and drop compiled files nothing refers to.
+    # Other files, such as another build's temporary file still being written, are left alone.
+    current = {os.path.abspath(path) for path in inputs}
+    manifest.inputs = {path: entry for path, entry in manifest.inputs.items() if path in current}
+    referenced = {os.path.basename(path) for path in compiled_paths}
+    for name in os.listdir(cache_dir):
+        if name.endswith(".gds") and name not in referenced:
+            os.remove(os.path.join(cache_dir, name))
+    manifest.save()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally rebuild training and validation datasets.")
+    parser.add_argument("inputs", nargs="*", help=f"JSONL inputs, merged in order (default: {DEFAULT_INPUTS})")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--validation", type=float, default=0.2, help="Fraction of examples for validation")
+    parser.add_argument("--salt", default="", help="Changes which examples go to validation")
+    parser.add_argument("--min-tokens", type=int, default=None)
+    parser.add_argument("--max-tokens", type=int, default=None)
+    parser.add_argument("--counter", default="approx",
+                        help="Token counter: whitespace, approx, sentencepiece:<model file> or vertex[:<model>]")
+    parser.add_argument("--force", action="store_true", help="Rebuild every stage")
+    args = parser.parse_args(argv)
+
+    inputs = args.inputs or sorted(glob.glob(DEFAULT_INPUTS))
+    report = build(inputs, args.output_dir, args.validation, args.salt, args.min_tokens, args.max_tokens,
+                   get_token_counter(args.counter), args.force)
+    counts = report["counts"]
+    print(f"✅ Compiled {len(report['compiled'])} inputs, reused {len(report['reused'])}; split {report['split']}")
+    print(f"✅ {counts['train']} training and {counts['validation']} validation examples "
+          f"({counts['duplicates']} duplicates, {counts['out_of_range']} out of token range) in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+"""
+Compiles Gemini-format JSONL datasets into an indexed binary file that is read
+through a memory map.
+
+A compiled dataset holds the raw JSONL records of every schema-valid example,
+followed by an index: the byte offset of each record, the precomputed user and
+model lengths (characters and tokens) and a content hash of the example texts.
+Counting, random access, sampling, splitting and length statistics read only the
+index, so they cost O(1) per example and never parse the records; a record is
+decoded only when it is asked for.
+
+Layout (little-endian, sections aligned to 8 bytes):
+
+    header      64 bytes: magic, version, count, skipped lines, data size, counter name size
+    counter     the token counter's name, UTF-8, in full
+    data        the records, one JSONL line each, ending in a newline
+    offsets     (count + 1) uint64 record offsets into the data section
+    lengths     four uint32 columns: user tokens, model tokens, user chars, model chars
+    hashes      count 16-byte BLAKE2b digests of the (user, model) texts
+
+The data section is itself valid JSONL, so exporting the whole dataset is a copy.
+
+Run from the backend directory:
+    python -m data.compiled_dataset compile data/complete-training-dataset.jsonl --output data/complete-training.gds
+    python -m data.compiled_dataset stats data/complete-training.gds
+    python -m data.compiled_dataset split data/complete-training.gds --validation 0.2 \\
+        --train-output data/train.jsonl --validation-output data/validation.jsonl
+    python -m data.compiled_dataset export data/complete-training.gds --output data/sample.jsonl --sample 500 --seed 1
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+
+from data.atomic_files import atomic_open, check_outputs
+from data.dataset_pipeline import iter_chunks, iter_lines
+from data.gemini_schema import example_texts, parse_line
+from data.token_counting import get_token_counter
+
+MAGIC = b"GDSET\x00\r\n"
+VERSION = 2
+HASH_SIZE = 16
+LENGTH_COLUMNS = ("user_tokens", "model_tokens", "user_chars", "model_chars")
+
+# magic, version, flags, count, skipped, data size, size of the token counter name that follows
+_HEADER = struct.Struct("<8sIIQQQI")
+_HEADER_SIZE = 64
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _layout(count, data_size, counter_size):
+    """
+    Returns the start of each section for a dataset of count records.
+    """
+    sections = {"counter": _HEADER_SIZE, "data": _align(_HEADER_SIZE + counter_size)}
+    position = _align(sections["data"] + data_size)
+    sections["offsets"] = position
+    position = _align(position + (count + 1) * 8)
+    for column in LENGTH_COLUMNS:
+        sections[column] = position
+        position = _align(position + count * 4)
+    sections["hashes"] = position
+    sections["end"] = position + count * HASH_SIZE
+    return sections
+
+
+def content_hash(user_text, model_text):
+    """
+    Hashes the texts of one example; identical examples get identical digests
+    whatever their system instruction or formatting.
+    """
+    digest = hashlib.blake2b(user_text.encode("utf-8"), digest_size=HASH_SIZE)
+    digest.update(b"\x00")
+    digest.update(model_text.encode("utf-8"))
+    return digest.digest()
+
+
+def split_bucket(digest, salt=""):
+    """
+    Maps a content hash to a number in [0, 1) that is the same on every run for
+    a given salt; comparing it with a fraction assigns an example to a split.
+    """
+    if salt:
+        digest = hashlib.blake2b(digest, key=salt.encode("utf-8")[:64], digest_size=8).digest()
+    return int.from_bytes(digest[:8], "little") / 2 ** 64
+
+
+def is_compiled_dataset(path):
+    """
+    Tells whether a file is a compiled dataset, from its first bytes.
+    """
+    try:
+        with open(path, "rb") as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _column_bytes(values):
+    if not _LITTLE_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def compile_jsonl(inputs, output_path, counter=None, batch_size=512):
+    """
+    Compiles one or more Gemini-format JSONL files into a single compiled dataset.
+
+    Invalid and blank lines are left out and counted. The output is written
+    atomically and may not be one of the inputs.
+
+    Args:
+        inputs (list[str]): JSONL files, compiled in order.
+        output_path (str): Where the compiled dataset is written.
+        counter: Token counter used for the length columns; defaults to 'approx'.
+        batch_size (int): Lines token-counted per call.
+
+    Returns:
+        dict: The number of examples and skipped lines, and the output size.
+    """
+    if isinstance(inputs, (str, os.PathLike)):
+        inputs = [inputs]
+    check_outputs(inputs, [output_path])
+    counter = counter or get_token_counter("approx")
+    offsets = array("Q", [0])
+    columns = {column: array("I") for column in LENGTH_COLUMNS}
+    hashes = bytearray()
+    skipped = 0
+    data_size = 0
+    counter_name = counter.name.encode("utf-8")
+
+    with atomic_open(output_path, "wb") as out:
+        out.write(bytes(_HEADER_SIZE))
+        out.write(counter_name)
+        out.write(bytes(_layout(0, 0, len(counter_name))["data"] - out.tell()))
+        for chunk in iter_chunks(iter_lines(inputs), batch_size):
+            records, texts = [], []
+            for _, _, line in chunk:
+                if not line.strip():
+                    skipped += 1
+                    continue
+                obj, reason = parse_line(line)
+                if reason is not None:
+                    skipped += 1
+                    continue
+                user_text, model_text = example_texts(obj)
+                records.append((line.rstrip("\r\n").encode("utf-8") + b"\n", user_text, model_text))
+                texts.extend((user_text, model_text))
+            if not records:
+                continue
+            counts = counter.count_batch(texts)
+            for index, (raw, user_text, model_text) in enumerate(records):
+                out.write(raw)
+                data_size += len(raw)
+                offsets.append(data_size)
+                columns["user_tokens"].append(counts[2 * index])
+                columns["model_tokens"].append(counts[2 * index + 1])
+                columns["user_chars"].append(len(user_text))
+                columns["model_chars"].append(len(model_text))
+                hashes += content_hash(user_text, model_text)
+
+        count = len(offsets) - 1
+        sections = _layout(count, data_size, len(counter_name))
+        for name, values in [("offsets", offsets)] + [(column, columns[column]) for column in LENGTH_COLUMNS]:
+            out.write(bytes(sections[name] - out.tell()))
+            out.write(_column_bytes(values))
+        out.write(bytes(sections["hashes"] - out.tell()))
+        out.write(hashes)
+        out.seek(0)
+        out.write(_HEADER.pack(MAGIC, VERSION, 0, count, skipped, data_size, len(counter_name)))
+    return {"examples": count, "skipped": skipped, "bytes": sections["end"], "counter": counter.name}
+
+
+class CompiledDataset:
+    """
+    Read-only view of a compiled dataset, backed by a memory map.
+
+    Indexing returns decoded records; the *_tokens, *_chars and hash accessors
+    read only the index. Use as a context manager, or call close().
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            self._file.close()
+            raise ValueError(f"{self.path} is not a compiled dataset")
+        try:
+            self._open_sections()
+        except ValueError:
+            self.close()
+            raise
+
+    def _open_sections(self):
+        if len(self._map) < _HEADER_SIZE:
+            raise ValueError(f"{self.path} is not a compiled dataset")
+        magic, version, _, count, skipped, data_size, counter_size = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a compiled dataset")
+        if version != VERSION:
+            raise ValueError(f"{self.path} has format version {version}; expected {VERSION}")
+        sections = _layout(count, data_size, counter_size)
+        if len(self._map) < sections["end"]:
+            raise ValueError(f"{self.path} is truncated")
+
+        self.skipped = skipped
+        self.data_size = data_size
+        self.counter = self._map[sections["counter"]:sections["counter"] + counter_size].decode("utf-8")
+        self._count = count
+        self._view = memoryview(self._map)
+        self._offsets = self._column(sections["offsets"], count + 1, "Q")
+        self._columns = {column: self._column(sections[column], count, "I") for column in LENGTH_COLUMNS}
+        self._hashes = self._view[sections["hashes"]:sections["end"]]
+        self._data = self._view[sections["data"]:sections["data"] + data_size]
+
+    def _column(self, start, length, typecode):
+        size = array(typecode).itemsize
+        raw = self._view[start:start + length * size]
+        if _LITTLE_ENDIAN:
+            return raw.cast(typecode)
+        values = array(typecode, raw.tobytes())
+        values.byteswap()
+        return values
+
+    def close(self):
+        # Views into the map must be released before it can be closed.
+        for name in ("_offsets", "_hashes", "_data"):
+            view = self.__dict__.pop(name, None)
+            if isinstance(view, memoryview):
+                view.release()
+        for view in self.__dict__.pop("_columns", {}).values():
+            if isinstance(view, memoryview):
+                view.release()
+        view = self.__dict__.pop("_view", None)
+        if view is not None:
+            view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def _check(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("example index out of range")
+        return index
+
+    def raw(self, index):
+        """
+        Returns the JSONL line of one example as bytes, newline included.
+        """
+        index = self._check(index)
+        return bytes(self._data[self._offsets[index]:self._offsets[index + 1]])
+
+    def __getitem__(self, index):
+        return json.loads(self.raw(index))
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def texts(self, index):
+        """
+        Returns the (user_text, model_text) pair of one example.
+        """
+        return example_texts(self[index])
+
+    def lengths(self, index):
+        """
+        Returns the precomputed user/model token and character lengths of one example.
+        """
+        index = self._check(index)
+        return {column: self._columns[column][index] for column in LENGTH_COLUMNS}
+
+    def column(self, name):
+        """
+        Returns one length column (see LENGTH_COLUMNS) as a read-only sequence of ints.
+        """
+        return self._columns[name]
+
+    def hash(self, index):
+        """
+        Returns the content hash of one example as a hex string.
+        """
+        return self.digest(index).hex()
+
+    def digest(self, index):
+        """
+        Returns the content hash of one example as bytes.
+        """
+        index = self._check(index)
+        return bytes(self._hashes[index * HASH_SIZE:(index + 1) * HASH_SIZE])
+
+    def sample(self, k, seed=None):
+        """
+        Returns the indices of k examples drawn uniformly without replacement,
+        or all of them if there are fewer than k.
+        """
+        return sorted(random.Random(seed).sample(range(self._count), min(k, self._count)))
+
+    def select(self, min_tokens=None, max_tokens=None):
+        """
+        Returns the indices of examples whose user and model token counts both
+        lie within [min_tokens, max_tokens].
+        """
+        low = 0 if min_tokens is None else min_tokens
+        high = float("inf") if max_tokens is None else max_tokens
+        return [
+            index
+            for index, (user_tokens, model_tokens) in enumerate(
+                zip(self._columns["user_tokens"], self._columns["model_tokens"]))
+            if low <= user_tokens <= high and low <= model_tokens <= high
+        ]
+
+    def split(self, validation_fraction, salt="", indices=None):
+        """
+        Splits examples into training and validation sets by their content hash.
+
+        An example always lands on the same side for a given salt, whatever else
+        the dataset holds, and exact duplicates land on the same side, so they
+        cannot leak from training into validation.
+
+        Returns:
+            tuple: (train_indices, validation_indices).
+        """
+        if not 0 <= validation_fraction <= 1:
+            raise ValueError("validation_fraction must be in [0, 1]")
+        train, validation = [], []
+        for index in range(self._count) if indices is None else indices:
+            (validation if split_bucket(self.digest(index), salt) < validation_fraction else train).append(index)
+        return train, validation
+
+    def write_jsonl(self, output_path, indices=None):
+        """
+        Writes examples back out as Gemini-format JSONL, all of them by default.
+
+        Returns:
+            int: The number of examples written.
+        """
+        with atomic_open(output_path, "wb") as out:
+            if indices is None:
+                out.write(self._data)
+                return self._count
+            written = 0
+            for index in indices:
+                out.write(self.raw(index))
+                written += 1
+            return written
+
+    def stats(self):
+        """
+        Returns the example count, the duplicate count and summary statistics of every length column.
+        """
+        result = {
+            "examples": self._count,
+            "skipped": self.skipped,
+            "data_bytes": self.data_size,
+            "counter": self.counter,
+            "duplicates": self._count - len({bytes(self._hashes[i:i + HASH_SIZE])
+                                             for i in range(0, self._count * HASH_SIZE, HASH_SIZE)}),
+        }
+        for column in LENGTH_COLUMNS:
+            values = sorted(self._columns[column])
+            if not values:
+                result[column] = {"mean": 0.0, "p50": 0, "p95": 0, "max": 0}
+                continue
+            result[column] = {
+                "mean": round(sum(values) / len(values), 1),
+                "p50": values[len(values) // 2],
+                "p95": values[max(int(len(values) * 0.95) - 1, 0)],
+                "max": values[-1],
+            }
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile, inspect, split and export indexed Gemini-format datasets.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = commands.add_parser("compile", help="Compile JSONL files into one compiled dataset")
+    compile_parser.add_argument("inputs", nargs="+", help="JSONL files, compiled in order")
+    compile_parser.add_argument("--output", required=True, help="Path for the compiled dataset")
+    compile_parser.add_argument("--counter", default="approx",
+                                help="Token counter: whitespace, approx, sentencepiece:<model file> or vertex[:<model>]")
+
+    stats_parser = commands.add_parser("stats", help="Print the statistics of a compiled dataset")
+    stats_parser.add_argument("dataset")
+
+    export_parser = commands.add_parser("export", help="Write a compiled dataset (or a sample of it) as JSONL")
+    export_parser.add_argument("dataset")
+    export_parser.add_argument("--output", required=True, help="Path for the JSONL output")
+    export_parser.add_argument("--sample", type=int, default=None, help="Export this many random examples")
+    export_parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible sampling")
+    export_parser.add_argument("--min-tokens", type=int, default=None)
+    export_parser.add_argument("--max-tokens", type=int, default=None)
+
+    split_parser = commands.add_parser("split", help="Split a compiled dataset by content hash")
+    split_parser.add_argument("dataset")
+    split_parser.add_argument("--validation", type=float, required=True, help="Fraction of examples for validation")
+    split_parser.add_argument("--salt", default="", help="Changes which examples go to validation")
+    split_parser.add_argument("--train-output", required=True)
+    split_parser.add_argument("--validation-output", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "compile":
+        summary = compile_jsonl(args.inputs, args.output, get_token_counter(args.counter))
+        print(f"✅ Compiled {summary['examples']} examples ({summary['skipped']} lines skipped) "
+              f"into {args.output} ({summary['bytes'] / 1024:.1f} KiB)")
+        return 0 if summary["examples"] else 1
+
+    with CompiledDataset(args.dataset) as dataset:
+        if args.command == "stats":
+            print(json.dumps(dataset.stats(), indent=2))
+        elif args.command == "export":
+            indices = None
+            if args.min_tokens is not None or args.max_tokens is not None:
+                indices = dataset.select(args.min_tokens, args.max_tokens)
+            if args.sample is not None:
+                pool = range(len(dataset)) if indices is None else indices
+                indices = sorted(random.Random(args.seed).sample(pool, min(args.sample, len(pool))))
+            written = dataset.write_jsonl(args.output, indices)
+            print(f"✅ Saved {written} entries to {args.output}")
+        else:
+            train, validation = dataset.split(args.validation, args.salt)
+            dataset.write_jsonl(args.train_output, train)
+            dataset.write_jsonl(args.validation_output, validation)
+            print(f"✅ Saved {len(train)} training entries to {args.train_output} "
+                  f"and {len(validation)} validation entries to {args.validation_output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
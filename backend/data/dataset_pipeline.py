@@ -0,0 +1,174 @@
+"""
+Validates and cleans Gemini-format JSONL datasets in a single streaming pass.
+
+Every input is read once, line by line. Lines are validated in ordered chunks on
+a process pool, and the cleaned records, the rejected lines and a JSON report are
+all written during that same pass. Memory stays bounded by the chunk size and the
+number of chunks in flight, whatever the size of the inputs.
+
+Run from the backend directory:
+    python -m data.dataset_pipeline data/complete-training-dataset.jsonl \\
+        --output data/cleaned-training-dataset.jsonl \\
+        --rejected data/rejected-lines.jsonl --report data/cleaning-report.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from data.atomic_files import atomic_open, check_outputs
+from data.gemini_schema import parse_line, reason_category
+
+
+def iter_lines(paths):
+    """
+    Yields (source, line_number, line) for every line of every input, lazily.
+    """
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as infile:
+            for line_number, line in enumerate(infile, start=1):
+                yield path, line_number, line
+
+
+def iter_chunks(items, chunk_size):
+    """
+    Groups an iterator into lists of at most chunk_size items.
+    """
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def process_chunk(chunk):
+    """
+    Validates a chunk of lines.
+
+    Returns:
+        list: One (source, line_number, status, payload) tuple per line, where status is
+              'valid' (payload is the compact JSON line), 'rejected' (payload is the reason)
+              or 'blank'.
+    """
+    results = []
+    for source, line_number, line in chunk:
+        if not line.strip():
+            results.append((source, line_number, "blank", None))
+            continue
+        obj, reason = parse_line(line)
+        if reason is None:
+            results.append((source, line_number, "valid", json.dumps(obj, ensure_ascii=False, separators=(",", ":"))))
+        else:
+            results.append((source, line_number, "rejected", reason))
+    return results
+
+
+def map_ordered(func, chunks, workers):
+    """
+    Applies func to every chunk on a process pool and yields results in input order.
+
+    At most 2 * workers chunks are in flight at once, so inputs are never read
+    further ahead than the pool can keep up with.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield chunk, func(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = deque()
+        for chunk in chunks:
+            window.append((chunk, pool.submit(func, chunk)))
+            if len(window) >= workers * 2:
+                pending_chunk, future = window.popleft()
+                yield pending_chunk, future.result()
+        while window:
+            pending_chunk, future = window.popleft()
+            yield pending_chunk, future.result()
+
+
+def run_pipeline(inputs, output_path, rejected_path=None, report_path=None, workers=None, chunk_size=1000):
+    """
+    Streams the inputs once and writes cleaned, rejected and report outputs.
+    Each output replaces its file atomically once complete; none may be an input.
+
+    Args:
+        inputs (list[str]): JSONL files to validate, processed in order.
+        output_path (str): Where the valid records are written, one per line.
+        rejected_path (str, optional): Where rejected lines and their reasons are written.
+        report_path (str, optional): Where the JSON summary is written.
+        workers (int, optional): Worker processes; defaults to the CPU count.
+        chunk_size (int): Lines handed to a worker at a time.
+
+    Returns:
+        dict: The summary report.
+    """
+    check_outputs(inputs, [output_path, rejected_path, report_path])
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    totals = Counter()
+    reasons = Counter()
+    per_source = {path: Counter() for path in inputs}
+
+    with atomic_open(output_path) as fout, \
+         (atomic_open(rejected_path) if rejected_path else open(os.devnull, "w")) as frejected:
+        chunks = iter_chunks(iter_lines(inputs), chunk_size)
+        for chunk, results in map_ordered(process_chunk, chunks, workers):
+            for (_, _, raw), (source, line_number, status, payload) in zip(chunk, results):
+                totals[status] += 1
+                per_source[source][status] += 1
+                if status == "valid":
+                    fout.write(payload + "\n")
+                elif status == "rejected":
+                    reasons[reason_category(payload)] += 1
+                    frejected.write(json.dumps({
+                        "source": source,
+                        "line": line_number,
+                        "reason": payload,
+                        "raw": raw.rstrip("\n"),
+                    }, ensure_ascii=False) + "\n")
+
+    elapsed = time.perf_counter() - started
+    lines = sum(totals.values())
+    report = {
+        "inputs": {path: dict(counts) for path, counts in per_source.items()},
+        "lines": lines,
+        "valid": totals["valid"],
+        "rejected": totals["rejected"],
+        "blank": totals["blank"],
+        "reasons": dict(reasons.most_common()),
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 3),
+        "lines_per_second": round(lines / elapsed, 1) if elapsed else None,
+    }
+    if report_path:
+        with atomic_open(report_path) as freport:
+            json.dump(report, freport, indent=2, ensure_ascii=False)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate and clean Gemini-format JSONL datasets.")
+    parser.add_argument("inputs", nargs="+", help="JSONL files to process, in order")
+    parser.add_argument("--output", required=True, help="Path for the cleaned JSONL output")
+    parser.add_argument("--rejected", help="Path for rejected lines with their reasons (JSONL)")
+    parser.add_argument("--report", help="Path for the JSON summary report")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Lines per worker task")
+    args = parser.parse_args(argv)
+
+    report = run_pipeline(args.inputs, args.output, args.rejected, args.report, args.workers, args.chunk_size)
+    print(f"✅ {report['valid']} valid, ❌ {report['rejected']} rejected of {report['lines']} lines "
+          f"in {report['elapsed_seconds']}s ({report['lines_per_second']} lines/s)")
+    for reason, count in list(report["reasons"].items())[:10]:
+        print(f"   {count:>6}  {reason}")
+    return 0 if report["valid"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
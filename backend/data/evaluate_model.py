@@ -0,0 +1,317 @@
+"""
+Runs a Gemini-format validation set through a model and scores the answers.
+
+Prompts are sent concurrently under a rate limit, and every finished example is
+appended to a JSONL checkpoint, so an interrupted run resumes where it stopped.
+The report holds keyword hit rate, exact match and token F1 against the
+reference answers, plus latency percentiles and throughput.
+
+'--model stub:<latency ms>' answers with the local stub backend, which benchmarks the harness itself
+without network access.
+
+Run from the backend directory:
+    python -m data.evaluate_model data/filtered-validation-dataset.jsonl \\
+        --model vertex --concurrency 8 --rate 5 \\
+        --checkpoint data/eval-checkpoint.jsonl --report data/eval-report.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import string
+import sys
+import threading
+import time
+from collections import Counter
+
+from data.gemini_schema import example_texts, parse_line
+from model.model_backends import StubModel, get_model_backend
+from model.vertex_model_registry import VertexModelRegistry
+from utils.document_index import STOPWORDS
+from utils.model_executor import ModelExecutor
+
+_ARTICLES = re.compile(r"\b(a|an|the)\b")
+_PUNCTUATION = str.maketrans("", "", string.punctuation)
+
+
+def normalize_answer(text):
+    """
+    Lowercases text and drops punctuation, articles and extra whitespace (SQuAD style).
+    """
+    text = text.casefold().translate(_PUNCTUATION)
+    return " ".join(_ARTICLES.sub(" ", text).split())
+
+
+def exact_match(prediction, reference):
+    return float(normalize_answer(prediction) == normalize_answer(reference))
+
+
+def token_f1(prediction, reference):
+    """
+    Returns the harmonic mean of token precision and recall between two answers.
+    """
+    predicted = normalize_answer(prediction).split()
+    expected = normalize_answer(reference).split()
+    if not predicted or not expected:
+        return float(predicted == expected)
+    common = sum((Counter(predicted) & Counter(expected)).values())
+    if not common:
+        return 0.0
+    precision = common / len(predicted)
+    recall = common / len(expected)
+    return 2 * precision * recall / (precision + recall)
+
+
+def reference_keywords(reference, min_length=4):
+    """
+    Picks the content words of a reference answer that a good answer should mention.
+    """
+    return {word for word in normalize_answer(reference).split() if len(word) >= min_length and word not in STOPWORDS}
+
+
+def keyword_hit_rate(prediction, reference):
+    """
+    Returns the share of the reference keywords found in the prediction.
+    """
+    keywords = reference_keywords(reference)
+    if not keywords:
+        return 1.0
+    predicted = set(normalize_answer(prediction).split())
+    return len(keywords & predicted) / len(keywords)
+
+
+def score(prediction, reference):
+    return {
+        "exact_match": exact_match(prediction, reference),
+        "f1": round(token_f1(prediction, reference), 4),
+        "keyword_hit_rate": round(keyword_hit_rate(prediction, reference), 4),
+    }
+
+
+def iter_eval_examples(path):
+    """
+    Yields {"id", "prompt", "reference"} for every schema-valid line of a JSONL file.
+
+    The id combines the line number with a hash of the example, so a checkpoint
+    is not reused for a file whose contents changed.
+    """
+    with open(path, "r", encoding="utf-8") as infile:
+        for line_number, line in enumerate(infile, start=1):
+            if not line.strip():
+                continue
+            obj, reason = parse_line(line)
+            if reason is not None:
+                continue
+            prompt, reference = example_texts(obj)
+            digest = hashlib.sha1(f"{prompt}\0{reference}".encode("utf-8")).hexdigest()[:12]
+            yield {"id": f"{line_number}:{digest}", "prompt": prompt, "reference": reference}
+
+
+class RateLimiter:
+    """
+    A thread-safe token bucket allowing `rate` calls per second with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+def get_eval_model(spec="vertex"):
+    """
+    Builds the model to evaluate from a backend spec: 'vertex' or 'stub[:<latency ms>]'.
+    """
+    if spec.partition(":")[0] == "vertex":
+        return VertexModelRegistry.get_instance().get_model()
+    return get_model_backend(spec)(None, None, "evaluation")
+
+
+def load_checkpoint(path):
+    """
+    Returns the finished results stored in a checkpoint, keyed by example id.
+    A line cut short by an interrupted write is ignored; any other line that is not
+    a result with an id is reported and skipped, so it is evaluated again.
+    """
+    results = {}
+    if not path or not os.path.exists(path):
+        return results
+    with open(path, "r", encoding="utf-8") as infile:
+        for line_number, line in enumerate(infile, start=1):
+            if not line.strip():
+                continue
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(result, dict) or "id" not in result:
+                print(f"Skipping checkpoint line {line_number} without an example id")
+                continue
+            results[result["id"]] = result
+    return results
+
+
+def _ends_mid_line(path):
+    with open(path, "rb") as file:
+        file.seek(0, os.SEEK_END)
+        if not file.tell():
+            return False
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) != b"\n"
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    position = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[position]
+
+
+def summarize(results):
+    """
+    Aggregates per-example results into the evaluation metrics.
+    """
+    scored = [result for result in results if result.get("error") is None]
+    latencies = sorted(result["latency_ms"] for result in scored)
+    summary = {
+        "examples": len(results),
+        "errors": len(results) - len(scored),
+    }
+    for metric in ("exact_match", "f1", "keyword_hit_rate"):
+        summary[metric] = round(sum(result[metric] for result in scored) / len(scored), 4) if scored else 0.0
+    summary["latency_ms"] = {
+        "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        **{f"p{int(q * 100)}": round(percentile(latencies, q), 3) for q in (0.5, 0.9, 0.95, 0.99)},
+        "max": round(latencies[-1], 3) if latencies else 0.0,
+    }
+    return summary
+
+
+def evaluate(dataset_path, model, checkpoint_path=None, concurrency=4, rate=None, max_examples=None,
+             timeout=60.0, retry_errors=False):
+    """
+    Evaluates a model on a dataset, resuming from the checkpoint if there is one.
+
+    Args:
+        dataset_path (str): Gemini-format JSONL file with the reference answers.
+        model: A model backend instance; see model.model_backends.
+        checkpoint_path (str, optional): JSONL file results are appended to as they finish.
+        concurrency (int): Prompts in flight at the same time.
+        rate (float, optional): Maximum prompts sent per second.
+        max_examples (int, optional): Only evaluate the first examples of the dataset.
+        timeout (float): Seconds to wait for one answer.
+        retry_errors (bool): Send examples again whose checkpointed result is an error.
+
+    Returns:
+        dict: The summary over all results (resumed and new) and the run's throughput.
+    """
+    done = load_checkpoint(checkpoint_path)
+    if retry_errors:
+        done = {key: result for key, result in done.items() if result.get("error") is None}
+    examples = []
+    for example in iter_eval_examples(dataset_path):
+        if max_examples is not None and len(examples) >= max_examples:
+            break
+        examples.append(example)
+    wanted = {example["id"] for example in examples}
+    todo = [example for example in examples if example["id"] not in done]
+    limiter = RateLimiter(rate, burst=concurrency) if rate else None
+    executor = ModelExecutor(max_workers=concurrency, max_queue=0, queue_timeout=float("inf"), call_timeout=timeout)
+
+    def paced(items):
+        # Pacing happens before submission so time spent waiting for the limiter
+        # does not count against the answer timeout.
+        for item in items:
+            if limiter is not None:
+                limiter.acquire()
+            yield item
+
+    def answer(example):
+        started = time.perf_counter()
+        prediction = model.generate_content(example["prompt"]).text
+        return prediction, (time.perf_counter() - started) * 1000
+
+    model_name = getattr(model, "name", None) or getattr(model, "_model_name", type(model).__name__)
+    print(f"Evaluating {len(todo)} examples with {model_name} ({len(examples) - len(todo)} resumed from checkpoint)")
+    started = time.perf_counter()
+    checkpoint = open(checkpoint_path, "a", encoding="utf-8") if checkpoint_path else None
+    if checkpoint is not None and _ends_mid_line(checkpoint_path):
+        # An interrupted write left a partial line; start a new one so the next result stays readable.
+        checkpoint.write("\n")
+    try:
+        for example, outcome, error in executor.map_unordered(answer, paced(todo), concurrency):
+            result = {"id": example["id"], "prompt": example["prompt"], "reference": example["reference"]}
+            if error is None:
+                prediction, latency_ms = outcome
+                result.update(prediction=prediction, latency_ms=round(latency_ms, 3), error=None,
+                              **score(prediction, example["reference"]))
+            else:
+                result.update(prediction=None, latency_ms=None, error=f"{type(error).__name__}: {error}")
+            done[example["id"]] = result
+            if checkpoint is not None:
+                checkpoint.write(json.dumps(result, ensure_ascii=False) + "\n")
+                checkpoint.flush()
+    finally:
+        executor.shutdown(wait=False)
+        if checkpoint is not None:
+            checkpoint.close()
+    elapsed = time.perf_counter() - started
+
+    summary = summarize([result for key, result in done.items() if key in wanted])
+    summary.update({
+        "model": model_name,
+        "dataset": dataset_path,
+        "evaluated_this_run": len(todo),
+        "run_seconds": round(elapsed, 3),
+        "throughput_per_s": round(len(todo) / elapsed, 3) if elapsed > 0 else None,
+        "concurrency": concurrency,
+        "rate": rate,
+    })
+    if isinstance(model, StubModel) and not model.jitter_ms and todo:
+        # With a fixed-latency stub the ideal run time is known, so the rest is harness overhead.
+        ideal = -(-len(todo) // concurrency) * model.latency_ms / 1000
+        summary["harness_overhead_ms_per_example"] = round(max(elapsed - ideal, 0) * 1000 / len(todo), 4)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a model on a Gemini-format JSONL validation set.")
+    parser.add_argument("dataset", nargs="?", default="data/filtered-validation-dataset.jsonl")
+    parser.add_argument("--model", default="vertex", help="Model backend: 'vertex' or 'stub[:<latency ms>]'")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, help="Maximum prompts per second")
+    parser.add_argument("--max-examples", type=int)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for one answer")
+    parser.add_argument("--checkpoint", help="JSONL file to resume from and append results to")
+    parser.add_argument("--retry-errors", action="store_true", help="Re-run examples that failed in the checkpoint")
+    parser.add_argument("--report", help="Path for the JSON report")
+    args = parser.parse_args(argv)
+
+    summary = evaluate(args.dataset, get_eval_model(args.model), args.checkpoint, args.concurrency, args.rate,
+                       args.max_examples, args.timeout, args.retry_errors)
+    print(json.dumps(summary, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as outfile:
+            json.dump(summary, outfile, indent=2)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
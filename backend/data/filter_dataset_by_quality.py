@@ -1,12 +1,29 @@
+"""
+Keeps examples whose user and model texts fit a token budget and samples a subset.
+
+Each input is streamed once: lines are parsed and token-counted in batches, valid
+examples are fed to a seeded reservoir (optionally stratified by length), and
+token-length histograms are collected along the way, so thresholds can be tuned
+against real token budgets. Memory stays constant in the size of the input.
+
+Run from the backend directory:
+    python -m data.filter_dataset_by_quality --counter approx --histogram-report data/token-lengths.json
+"""
+import argparse
 import json
-import random
+
+from data.atomic_files import atomic_open, check_outputs
+from data.compiled_dataset import CompiledDataset, is_compiled_dataset
+from data.dataset_pipeline import iter_chunks
+from data.gemini_schema import example_texts, parse_line
+from data.token_counting import LengthHistogram, ReservoirSampler, StratifiedReservoirSampler, get_token_counter
 
 # ==== Configuration ====
-TRAIN_INPUT_PATH = "./backend/data/complete-training-dataset.jsonl"
-VAL_INPUT_PATH = "./backend/data/complete-validiation-dataset.jsonl"
+TRAIN_INPUT_PATH = "./data/complete-training-dataset.jsonl"
+VAL_INPUT_PATH = "./data/complete-validiation-dataset.jsonl"
 
-TRAIN_OUTPUT_PATH = "./backend/data/filtered-training-dataset.jsonl"
-VAL_OUTPUT_PATH = "./backend/data/filtered-validation-dataset.jsonl"
+TRAIN_OUTPUT_PATH = "./data/filtered-training-dataset.jsonl"
+VAL_OUTPUT_PATH = "./data/filtered-validation-dataset.jsonl"
 
 TRAIN_TARGET_SIZE = 6000
 VAL_TARGET_SIZE = 1500
@@ -15,37 +32,124 @@ VAL_TARGET_SIZE = 1500
 MIN_TOKENS = 5
 MAX_TOKENS = 80
 
-def is_valid_example(line):
-    try:
-        obj = json.loads(line)
-        user_text = obj['contents'][0]['parts'][0]['text']
-        model_text = obj['contents'][1]['parts'][0]['text']
-        user_tokens = len(user_text.split())
-        model_tokens = len(model_text.split())
-        return MIN_TOKENS <= user_tokens <= MAX_TOKENS and MIN_TOKENS <= model_tokens <= MAX_TOKENS
-    except Exception:
-        return False
-
-def process_file(input_path, output_path, target_size):
+BATCH_SIZE = 512
+
+
+def _count_lines(lines, counter, batch_size):
+    for chunk in iter_chunks(lines, batch_size):
+        valid, texts = [], []
+        for line in chunk:
+            if not line.strip():
+                continue
+            obj, reason = parse_line(line)
+            if reason is None:
+                valid.append(line if line.endswith("\n") else line + "\n")
+                texts.extend(example_texts(obj))
+        if not valid:
+            continue
+        counts = counter.count_batch(texts)
+        for index, line in enumerate(valid):
+            yield line, counts[2 * index], counts[2 * index + 1]
+
+
+def iter_counted_examples(input_path, counter, batch_size=BATCH_SIZE):
+    """
+    Yields (line, user_tokens, model_tokens) for every schema-valid line,
+    counting the tokens of each batch in a single call.
+
+    A compiled dataset built with the same counter already holds the counts,
+    so its records are not parsed at all.
+    """
+    if is_compiled_dataset(input_path):
+        with CompiledDataset(input_path) as dataset:
+            lines = (dataset.raw(index).decode("utf-8") for index in range(len(dataset)))
+            if dataset.counter != counter.name:
+                yield from _count_lines(lines, counter, batch_size)
+                return
+            yield from zip(lines, dataset.column("user_tokens"), dataset.column("model_tokens"))
+        return
     with open(input_path, 'r', encoding='utf-8') as infile:
-        lines = infile.readlines()
-
-    # Filter and shuffle
-    valid_lines = [line for line in lines if is_valid_example(line)]
-    print(f"✅ {len(valid_lines)} valid entries found in {input_path}")
-    
-    if len(valid_lines) < target_size:
-        print(f"⚠️ Warning: Only {len(valid_lines)} valid entries available, using all of them.")
-        subset = valid_lines
+        yield from _count_lines(infile, counter, batch_size)
+
+
+def process_file(input_path, output_path, target_size, counter, min_tokens=MIN_TOKENS, max_tokens=MAX_TOKENS,
+                 seed=None, stratify=False, bucket_width=10):
+    """
+    Filters one dataset by token length and writes a random subset of target_size examples.
+
+    Returns:
+        dict: Counts and the user/model token-length histograms of all valid examples.
+    """
+    check_outputs([input_path], [output_path])
+    if stratify:
+        sampler = StratifiedReservoirSampler(target_size, seed)
     else:
-        random.shuffle(valid_lines)
-        subset = valid_lines[:target_size]
+        sampler = ReservoirSampler(target_size, seed)
+    user_histogram = LengthHistogram(bucket_width)
+    model_histogram = LengthHistogram(bucket_width)
+    examples = 0
+
+    for line, user_tokens, model_tokens in iter_counted_examples(input_path, counter):
+        examples += 1
+        user_histogram.add(user_tokens)
+        model_histogram.add(model_tokens)
+        if min_tokens <= user_tokens <= max_tokens and min_tokens <= model_tokens <= max_tokens:
+            if stratify:
+                sampler.add((user_tokens + model_tokens) // bucket_width, line)
+            else:
+                sampler.add(line)
+
+    print(f"✅ {sampler.seen} of {examples} entries in {input_path} fit {min_tokens}-{max_tokens} tokens ({counter.name})")
+    subset = sampler.items
+    if len(subset) < target_size:
+        print(f"⚠️ Warning: Only {len(subset)} valid entries available, using all of them.")
 
-    with open(output_path, 'w', encoding='utf-8') as outfile:
+    with atomic_open(output_path) as outfile:
         outfile.writelines(subset)
-    
+
     print(f"✅ Saved {len(subset)} entries to {output_path}")
+    return {
+        "input": input_path,
+        "examples": examples,
+        "within_budget": sampler.seen,
+        "saved": len(subset),
+        "user_tokens": user_histogram.to_dict(),
+        "model_tokens": model_histogram.to_dict(),
+        "_histograms": (user_histogram, model_histogram),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Filter Gemini-format datasets by token length and sample subsets.")
+    parser.add_argument("--counter", default="approx",
+                        help="Token counter: whitespace, approx, sentencepiece:<model file> or vertex[:<model>]")
+    parser.add_argument("--train-input", default=TRAIN_INPUT_PATH, help="Training JSONL or compiled dataset")
+    parser.add_argument("--val-input", default=VAL_INPUT_PATH, help="Validation JSONL or compiled dataset")
+    parser.add_argument("--min-tokens", type=int, default=MIN_TOKENS)
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS)
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible sampling")
+    parser.add_argument("--stratify", action="store_true", help="Keep the length distribution in the sample")
+    parser.add_argument("--bucket-width", type=int, default=10, help="Histogram bucket width in tokens")
+    parser.add_argument("--histogram-report", help="Write token-length histograms to this JSON file")
+    args = parser.parse_args(argv)
+
+    counter = get_token_counter(args.counter)
+    reports = []
+    # ==== Run on training and validation ====
+    for input_path, output_path, target_size in (
+        (args.train_input, TRAIN_OUTPUT_PATH, TRAIN_TARGET_SIZE),
+        (args.val_input, VAL_OUTPUT_PATH, VAL_TARGET_SIZE),
+    ):
+        report = process_file(input_path, output_path, target_size, counter, args.min_tokens, args.max_tokens,
+                              args.seed, args.stratify, args.bucket_width)
+        user_histogram, model_histogram = report.pop("_histograms")
+        print(f"User tokens:\n{user_histogram.render()}\nModel tokens:\n{model_histogram.render()}")
+        reports.append(report)
+
+    if args.histogram_report:
+        with open(args.histogram_report, 'w', encoding='utf-8') as outfile:
+            json.dump({"counter": counter.name, "files": reports}, outfile, indent=2)
+
 
-# ==== Run on training and validation ====
-process_file(TRAIN_INPUT_PATH, TRAIN_OUTPUT_PATH, TRAIN_TARGET_SIZE)
-process_file(VAL_INPUT_PATH, VAL_OUTPUT_PATH, VAL_TARGET_SIZE)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import json
+
+# Roles expected in a supervised tuning example, in order.
+CONTENT_ROLES = ("user", "model")
+
+_decode = json.JSONDecoder().decode
+
+
+def _check_parts(parts, where):
+    if not isinstance(parts, list) or not parts:
+        return f"{where}.parts must be a non-empty list"
+    first = parts[0]
+    if not isinstance(first, dict):
+        return f"{where}.parts[0] must be an object"
+    text = first.get("text")
+    if not isinstance(text, str):
+        return f"{where}.parts[0].text must be a string"
+    if not text.strip():
+        return f"{where}.parts[0].text is empty"
+    return None
+
+
+def validate_example(obj):
+    """
+    Checks a decoded record against the Gemini tuning schema:
+    a 'systemInstruction' plus exactly one user turn followed by one model turn.
+
+    Args:
+        obj: The decoded JSON value of one dataset line.
+
+    Returns:
+        str: The reason the record is invalid, or None if it is valid.
+    """
+    if not isinstance(obj, dict):
+        return f"record must be an object, got {type(obj).__name__}"
+
+    si = obj.get("systemInstruction")
+    if si is None:
+        return "missing systemInstruction"
+    if not isinstance(si, dict):
+        return "systemInstruction must be an object"
+    if si.get("role") != "system":
+        return f"systemInstruction.role must be 'system', got {si.get('role')!r}"
+    reason = _check_parts(si.get("parts"), "systemInstruction")
+    if reason:
+        return reason
+
+    contents = obj.get("contents")
+    if not isinstance(contents, list):
+        return "contents must be a list"
+    if len(contents) != len(CONTENT_ROLES):
+        return f"contents must have {len(CONTENT_ROLES)} entries (user/model), got {len(contents)}"
+    for index, (message, role) in enumerate(zip(contents, CONTENT_ROLES)):
+        where = f"contents[{index}]"
+        if not isinstance(message, dict):
+            return f"{where} must be an object"
+        if message.get("role") != role:
+            return f"{where}.role must be {role!r}, got {message.get('role')!r}"
+        reason = _check_parts(message.get("parts"), where)
+        if reason:
+            return reason
+    return None
+
+
+def parse_line(line):
+    """
+    Decodes and validates one JSONL line.
+
+    Returns:
+        tuple: (record, reason). record is None when the line is not valid JSON,
+               reason is None when the record passes validation.
+    """
+    try:
+        obj = _decode(line)
+    except json.JSONDecodeError as e:
+        return None, f"malformed JSON: {e.msg} at column {e.colno}"
+    return obj, validate_example(obj)
+
+
+def reason_category(reason):
+    """
+    Strips the position from a rejection reason so similar failures group together.
+    """
+    return reason.split(" at column ", 1)[0]
+
+
+def example_texts(obj):
+    """
+    Returns the (user_text, model_text) pair of a valid record.
+    """
+    contents = obj["contents"]
+    return contents[0]["parts"][0]["text"], contents[1]["parts"][0]["text"]
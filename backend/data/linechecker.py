@@ -1,13 +1,65 @@
-def copy_lines(input_file, output_file):
-    with open(input_file, 'r', encoding='utf-8') as infile:
-        lines = infile.readlines()
-    with open(output_file, 'w', encoding='utf-8') as outfile:
-        for index, line in enumerate(lines, start=1):
-            if index % 2 == 0:
-                outfile.write(line)
-    with open(input_file, 'w', encoding='utf-8') as infile:
-        for index, line in enumerate(lines, start=1):
-            if index % 2 != 0:
-                infile.write(line)
-
-copy_lines('training-dataset.jsonl', 'validation-dataset.jsonl')
+"""
+Splits a JSONL dataset into training and validation files.
+
+Each line goes to validation when the hash of its example texts falls below the
+validation fraction, so a line stays on the same side however often the split
+is rerun and whatever other lines the file holds. The input is never modified.
+
+Run from the backend directory:
+    python -m data.linechecker data/collected-data/training_dataset.jsonl \\
+        --train-output data/training-dataset.jsonl --validation-output data/validation-dataset.jsonl
+"""
+import argparse
+import hashlib
+
+from data.atomic_files import atomic_open, check_outputs
+from data.compiled_dataset import HASH_SIZE, content_hash, split_bucket
+from data.gemini_schema import example_texts, parse_line
+
+
+def line_hash(line):
+    """
+    Hashes a line by its example texts, or by its stripped text if it is not a valid example.
+    """
+    obj, reason = parse_line(line)
+    if reason is None:
+        return content_hash(*example_texts(obj))
+    return hashlib.blake2b(line.strip().encode("utf-8"), digest_size=HASH_SIZE).digest()
+
+
+def split_lines(input_file, train_file, validation_file, validation_fraction=0.5, salt=""):
+    """
+    Writes each non-blank line of input_file to train_file or validation_file.
+
+    Returns:
+        tuple: (training_lines, validation_lines) written.
+    """
+    check_outputs([input_file], [train_file, validation_file])
+    counts = [0, 0]
+    with open(input_file, 'r', encoding='utf-8') as infile, \
+         atomic_open(train_file) as ftrain, atomic_open(validation_file) as fvalidation:
+        for line in infile:
+            if not line.strip():
+                continue
+            to_validation = split_bucket(line_hash(line), salt) < validation_fraction
+            (fvalidation if to_validation else ftrain).write(line if line.endswith("\n") else line + "\n")
+            counts[to_validation] += 1
+    return counts[0], counts[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Split a JSONL dataset into training and validation files by content hash.")
+    parser.add_argument("input", help="JSONL file to split; it is left unchanged")
+    parser.add_argument("--train-output", required=True)
+    parser.add_argument("--validation-output", required=True)
+    parser.add_argument("--validation", type=float, default=0.5, help="Fraction of lines for validation")
+    parser.add_argument("--salt", default="", help="Changes which lines go to validation")
+    args = parser.parse_args(argv)
+
+    train, validation = split_lines(args.input, args.train_output, args.validation_output, args.validation, args.salt)
+    print(f"✅ Saved {train} training lines to {args.train_output} "
+          f"and {validation} validation lines to {args.validation_output}")
+
+
+if __name__ == "__main__":
+    main()
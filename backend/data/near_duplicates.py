@@ -0,0 +1,292 @@
+"""
+Near-duplicate detection for Gemini-format Q/A datasets using MinHash and LSH.
+
+Each example is reduced to a MinHash signature over word shingles of its user and
+model texts. Signatures are bucketed with locality-sensitive hashing, so only
+examples that share a band are ever compared and the run stays sub-quadratic.
+The index can be saved and reloaded to deduplicate new files incrementally.
+
+Run from the backend directory:
+    python -m data.near_duplicates dedup data/collected-data/*.jsonl \\
+        --output data/deduplicated-dataset.jsonl --state data/near-duplicate-index.pkl
+    python -m data.near_duplicates contamination \\
+        --train data/filtered-training-dataset.jsonl \\
+        --validation data/filtered-validation-dataset.jsonl --report data/contamination-report.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+from data.atomic_files import atomic_open, check_outputs
+from data.dataset_pipeline import iter_lines
+from data.gemini_schema import example_texts, parse_line
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_TOKEN = re.compile(r"\w+")
+
+
+def shingles(user_text, model_text, size=3):
+    """
+    Returns the set of word shingles of an example.
+
+    User and model shingles are tagged separately, so a question that matches
+    another example's answer does not count as a duplicate.
+    """
+    result = set()
+    for tag, text in (("u", user_text), ("m", model_text)):
+        tokens = _TOKEN.findall(text.casefold())
+        if len(tokens) < size:
+            result.add(f"{tag}:{' '.join(tokens)}")
+            continue
+        for i in range(len(tokens) - size + 1):
+            result.add(f"{tag}:{' '.join(tokens[i:i + size])}")
+    return result
+
+
+def _hash_shingles(items):
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=4).digest(), "little") % _MERSENNE_PRIME
+         for item in items),
+        dtype=np.uint64,
+        count=len(items),
+    )
+
+
+class MinHashIndex:
+    """
+    An incremental MinHash/LSH index over Q/A examples.
+
+    Args:
+        num_perm (int): Number of hash permutations per signature.
+        bands (int): LSH bands; num_perm must be divisible by it.
+        threshold (float): Estimated Jaccard similarity at which examples count as duplicates.
+        seed (int): Seed for the permutation coefficients, fixed so saved indexes stay comparable.
+    """
+
+    def __init__(self, num_perm=128, bands=16, threshold=0.8, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._buckets = [defaultdict(list) for _ in range(bands)]
+        self._signatures = []
+        self.keys = []
+        self.seen_files = {}
+        # Output files this index wrote, with their size and modification time when it was saved.
+        self.outputs = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def signature(self, user_text, model_text):
+        """
+        Computes the MinHash signature of an example.
+        """
+        hashes = _hash_shingles(list(shingles(user_text, model_text)))
+        if not len(hashes):
+            return np.full(self.num_perm, _MERSENNE_PRIME, dtype=np.uint32)
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [signature[i * rows:(i + 1) * rows].tobytes() for i in range(self.bands)]
+
+    def query(self, signature):
+        """
+        Returns (key, similarity) of the most similar indexed example at or above
+        the threshold, or None.
+        """
+        candidates = set()
+        for band, band_key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(band.get(band_key, ()))
+        best = None
+        for candidate in candidates:
+            similarity = float(np.mean(self._signatures[candidate] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        if best is None:
+            return None
+        return self.keys[best[0]], best[1]
+
+    def add(self, key, signature):
+        """
+        Adds an example's signature to the index under a key such as 'file:line'.
+        """
+        position = len(self.keys)
+        self.keys.append(key)
+        self._signatures.append(signature)
+        for band, band_key in zip(self._buckets, self._band_keys(signature)):
+            band[band_key].append(position)
+
+    def save(self, path):
+        """
+        Writes the index to disk atomically.
+        """
+        with atomic_open(path, "wb") as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        """
+        Reads an index written by save().
+        """
+        with open(path, "rb") as file:
+            index = pickle.load(file)
+        # Indexes saved before outputs were tracked cover none.
+        index.__dict__.setdefault("outputs", {})
+        return index
+
+
+def _file_fingerprint(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def iter_examples(paths):
+    """
+    Yields (key, line, user_text, model_text) for every valid example in the inputs.
+    """
+    for source, line_number, line in iter_lines(paths):
+        if not line.strip():
+            continue
+        obj, reason = parse_line(line)
+        if reason is None:
+            user_text, model_text = example_texts(obj)
+            yield f"{source}:{line_number}", line, user_text, model_text
+
+
+def deduplicate(inputs, output_path, index=None, duplicates_path=None, state_path=None):
+    """
+    Writes the examples of inputs that are not near-duplicates of anything seen before.
+
+    Files already recorded in the index with the same size and modification time
+    are skipped, so re-running with a saved index only processes new files. The new
+    examples are added to an output the index wrote before; any other output is
+    replaced, and only a new, empty index may replace an existing one. The output is
+    rewritten atomically and then the index is saved to state_path, so a run that
+    stops early leaves both as they were.
+
+    Raises:
+        ValueError: If an output is also an input, or the output exists but was
+            not written by this index, so appending could repeat its examples.
+
+    Returns:
+        dict: Counts of kept and dropped examples and the files processed.
+    """
+    check_outputs(inputs, [output_path, duplicates_path, state_path])
+    if index is None:
+        index = MinHashIndex()
+    exists = os.path.exists(output_path)
+    appending = exists and index.outputs.get(os.path.abspath(output_path)) == _file_fingerprint(output_path)
+    if exists and not appending and (len(index) or index.seen_files):
+        raise ValueError(f"Refusing to append to {output_path}: it was changed or not written by this index")
+    new_inputs = [path for path in inputs if index.seen_files.get(os.path.abspath(path)) != _file_fingerprint(path)]
+    kept = dropped = 0
+    with atomic_open(output_path) as fout, \
+         open(duplicates_path or os.devnull, "a", encoding="utf-8") as fdup:
+        if appending:
+            with open(output_path, "r", encoding="utf-8") as existing:
+                shutil.copyfileobj(existing, fout)
+        for key, line, user_text, model_text in iter_examples(new_inputs):
+            signature = index.signature(user_text, model_text)
+            match = index.query(signature)
+            if match is not None:
+                dropped += 1
+                fdup.write(json.dumps({"example": key, "duplicate_of": match[0], "similarity": round(match[1], 3)}) + "\n")
+                continue
+            index.add(key, signature)
+            fout.write(line if line.endswith("\n") else line + "\n")
+            kept += 1
+    for path in new_inputs:
+        index.seen_files[os.path.abspath(path)] = _file_fingerprint(path)
+    index.outputs[os.path.abspath(output_path)] = _file_fingerprint(output_path)
+    if state_path:
+        index.save(state_path)
+    return {"processed_files": new_inputs, "kept": kept, "dropped": dropped, "indexed": len(index)}
+
+
+def contamination_report(train_paths, validation_paths, threshold=0.8, max_pairs=50):
+    """
+    Finds validation examples that are near-duplicates of training examples.
+
+    Returns:
+        dict: How many validation examples leak from training, and sample pairs.
+    """
+    index = MinHashIndex(threshold=threshold)
+    for key, _, user_text, model_text in iter_examples(train_paths):
+        index.add(key, index.signature(user_text, model_text))
+
+    checked = 0
+    leaked = []
+    for key, _, user_text, model_text in iter_examples(validation_paths):
+        checked += 1
+        match = index.query(index.signature(user_text, model_text))
+        if match is not None:
+            leaked.append({"validation": key, "train": match[0], "similarity": round(match[1], 3)})
+    return {
+        "train_examples": len(index),
+        "validation_examples": checked,
+        "contaminated": len(leaked),
+        "contamination_rate": round(len(leaked) / checked, 4) if checked else 0.0,
+        "threshold": threshold,
+        "pairs": leaked[:max_pairs],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Near-duplicate detection for Gemini-format datasets.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    dedup = commands.add_parser("dedup", help="Drop near-duplicate examples, incrementally")
+    dedup.add_argument("inputs", nargs="+")
+    dedup.add_argument("--output", required=True, help="JSONL file the unique examples are written to, "
+                       "or appended to when it was written with the same --state")
+    dedup.add_argument("--state", help="Index file to resume from and save to")
+    dedup.add_argument("--duplicates", help="JSONL log of dropped examples")
+    dedup.add_argument("--threshold", type=float, help="Similarity threshold (default 0.8, or the one saved in --state)")
+
+    contamination = commands.add_parser("contamination", help="Report train/validation leakage")
+    contamination.add_argument("--train", nargs="+", required=True)
+    contamination.add_argument("--validation", nargs="+", required=True)
+    contamination.add_argument("--report", help="Path for the JSON report")
+    contamination.add_argument("--threshold", type=float, default=0.8)
+    args = parser.parse_args(argv)
+
+    if args.command == "dedup":
+        if args.state and os.path.exists(args.state):
+            index = MinHashIndex.load(args.state)
+            if args.threshold is not None and args.threshold != index.threshold:
+                print(f"⚠️ Using threshold {args.threshold} instead of {index.threshold} saved in {args.state}")
+                index.threshold = args.threshold
+        else:
+            index = MinHashIndex(threshold=0.8 if args.threshold is None else args.threshold)
+        result = deduplicate(args.inputs, args.output, index, args.duplicates, args.state)
+        print(f"✅ Kept {result['kept']}, dropped {result['dropped']} near-duplicates "
+              f"from {len(result['processed_files'])} new files ({result['indexed']} indexed in total)")
+        return 0
+
+    report = contamination_report(args.train, args.validation, args.threshold)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    print(f"⚠️ {report['contaminated']} of {report['validation_examples']} validation examples "
+          f"({report['contamination_rate']:.2%}) are near-duplicates of training examples")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Pluggable token counters and constant-memory sampling for dataset filtering.
+
+Counters share one interface, count_batch(texts) -> list[int], so callers can
+count whole batches at once:
+
+- 'whitespace'           str.split() word counts (the legacy behaviour)
+- 'approx'               offline subword estimate, no dependencies
+- 'sentencepiece:<path>' a local SentencePiece model file, batch-encoded in C++
+- 'vertex[:<model>]'     the Gemini tokenizer shipped with the Vertex AI SDK,
+                         downloaded once and then used offline
+"""
+import math
+import random
+import re
+from collections import Counter
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+class WhitespaceTokenCounter:
+    """Counts whitespace-separated words."""
+    name = "whitespace"
+
+    def count_batch(self, texts):
+        return [len(text.split()) for text in texts]
+
+
+class ApproximateTokenCounter:
+    """
+    Estimates subword tokens without a tokenizer model: every punctuation mark is
+    one token and words cost one token per `chars_per_token` characters.
+    """
+    name = "approx"
+
+    def __init__(self, chars_per_token=4):
+        self.chars_per_token = chars_per_token
+
+    def count_batch(self, texts):
+        per_token = self.chars_per_token
+        return [
+            sum(math.ceil(len(piece) / per_token) for piece in _PIECES.findall(text))
+            for text in texts
+        ]
+
+
+class SentencePieceTokenCounter:
+    """Counts tokens with a local SentencePiece model, encoding each batch in one call."""
+
+    def __init__(self, model_file, num_threads=-1):
+        try:
+            import sentencepiece
+        except ImportError as e:
+            raise ImportError("The 'sentencepiece' package is required for the sentencepiece counter.") from e
+        self.name = f"sentencepiece:{model_file}"
+        self._processor = sentencepiece.SentencePieceProcessor(model_file=model_file)
+        self._num_threads = num_threads
+
+    def count_batch(self, texts):
+        return [len(ids) for ids in self._processor.encode(list(texts), num_threads=self._num_threads)]
+
+
+class VertexTokenCounter:
+    """Counts tokens with the Gemini tokenizer from the Vertex AI SDK (local, no API calls)."""
+
+    def __init__(self, model_name="gemini-1.5-flash-002"):
+        try:
+            from vertexai.preview import tokenization
+            self._tokenizer = tokenization.get_tokenizer_for_model(model_name)
+        except ImportError as e:
+            raise ImportError("The Vertex AI local tokenizer needs the 'sentencepiece' package.") from e
+        self.name = f"vertex:{model_name}"
+
+    def count_batch(self, texts):
+        result = self._tokenizer.compute_tokens(list(texts))
+        return [len(info.token_ids) for info in result.tokens_info]
+
+
+def get_token_counter(spec="approx"):
+    """
+    Builds a token counter from a spec such as 'approx', 'whitespace',
+    'sentencepiece:/path/to/tokenizer.model' or 'vertex:gemini-1.5-flash-002'.
+    """
+    name, _, argument = spec.partition(":")
+    if name == "whitespace":
+        return WhitespaceTokenCounter()
+    if name == "approx":
+        return ApproximateTokenCounter()
+    if name == "sentencepiece":
+        if not argument:
+            raise ValueError("sentencepiece counter needs a model file: 'sentencepiece:<path>'")
+        return SentencePieceTokenCounter(argument)
+    if name == "vertex":
+        return VertexTokenCounter(argument) if argument else VertexTokenCounter()
+    raise ValueError(f"Unknown token counter: {spec!r}")
+
+
+class ReservoirSampler:
+    """
+    Keeps a uniform random sample of at most k items from a stream of unknown length,
+    in O(k) memory (Algorithm R). The same seed and stream give the same sample.
+    """
+
+    def __init__(self, k, seed=None):
+        self.k = k
+        self.seen = 0
+        self.items = []
+        self._random = random.Random(seed)
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.k:
+            self.items.append(item)
+            return
+        slot = self._random.randrange(self.seen)
+        if slot < self.k:
+            self.items[slot] = item
+
+
+class StratifiedReservoirSampler:
+    """
+    Samples k items so that each stratum (e.g. a length bucket) keeps its share of
+    the stream. One reservoir of size k is kept per stratum, so memory is bounded
+    by k times the number of strata.
+    """
+
+    def __init__(self, k, seed=None):
+        self.k = k
+        self._seed = seed
+        self._reservoirs = {}
+
+    @property
+    def seen(self):
+        return sum(reservoir.seen for reservoir in self._reservoirs.values())
+
+    def add(self, stratum, item):
+        reservoir = self._reservoirs.get(stratum)
+        if reservoir is None:
+            seed = None if self._seed is None else f"{self._seed}:{stratum}"
+            reservoir = self._reservoirs[stratum] = ReservoirSampler(self.k, seed)
+        reservoir.add(item)
+
+    @property
+    def items(self):
+        """
+        Returns the sample, allocating k proportionally to how often each stratum was seen.
+        """
+        total = self.seen
+        if total <= self.k:
+            return [item for reservoir in self._reservoirs.values() for item in reservoir.items]
+
+        # Largest-remainder allocation so the quotas add up to exactly k.
+        quotas = {stratum: self.k * reservoir.seen / total for stratum, reservoir in self._reservoirs.items()}
+        allocation = {stratum: int(quota) for stratum, quota in quotas.items()}
+        remainder = self.k - sum(allocation.values())
+        for stratum in sorted(quotas, key=lambda s: quotas[s] - allocation[s], reverse=True)[:remainder]:
+            allocation[stratum] += 1
+        # A prefix of a reservoir is not a random sample: below k it is in stream order,
+        # and Algorithm R's early slots favour early items. Subsample at random instead.
+        rng = random.Random(None if self._seed is None else f"{self._seed}:allocation")
+        return [
+            item
+            for stratum, reservoir in self._reservoirs.items()
+            for item in rng.sample(reservoir.items, allocation[stratum])
+        ]
+
+
+class LengthHistogram:
+    """Counts token lengths into fixed-width buckets."""
+
+    def __init__(self, bucket_width=10):
+        self.bucket_width = bucket_width
+        self.counts = Counter()
+        self.total = 0
+        self.max_length = 0
+
+    def add(self, length):
+        self.counts[length // self.bucket_width] += 1
+        self.total += 1
+        self.max_length = max(self.max_length, length)
+
+    def to_dict(self):
+        width = self.bucket_width
+        return {
+            "bucket_width": width,
+            "total": self.total,
+            "max": self.max_length,
+            "buckets": {f"{b * width}-{(b + 1) * width - 1}": self.counts[b] for b in sorted(self.counts)},
+        }
+
+    def render(self, bar_width=40):
+        """
+        Returns a text bar chart of the histogram.
+        """
+        if not self.counts:
+            return "(empty)"
+        peak = max(self.counts.values())
+        lines = []
+        for bucket in range(min(self.counts), max(self.counts) + 1):
+            count = self.counts[bucket]
+            label = f"{bucket * self.bucket_width:>5}-{(bucket + 1) * self.bucket_width - 1:<5}"
+            lines.append(f"{label} {'#' * max(1 if count else 0, round(bar_width * count / peak)):<{bar_width}} {count}")
+        return "\n".join(lines)
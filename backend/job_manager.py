@@ -1,2 +1,288 @@
 # To track fine tuned model (Used at the start of the project only !!!)
+import os
+import re
+import threading
+import time
+from model.socketio_instance import socketio
+from model.tuning_job_registry import TERMINAL_STATES, tuning_job_registry
+from model.tuning_services import get_tuning_service, is_not_found_error
+from model.vertex_model_registry import VertexModelRegistry
+from utils.services import prepare_tuning_job, tuning_config
+from utils.tuning_sweep import SweepScheduler
+
 tuning_job_instance = None
+
+# Where tuning jobs are submitted: the Gemini API, or a local fake (TUNING_SERVICE=fake)
+tuning_service = get_tuning_service()
+
+_ENDPOINT_PATTERN = re.compile(r"projects/([^/]+)/locations/([^/]+)/endpoints/([^/]+)")
+
+
+def _state_name(state):
+    # The SDK reports states as enums; clients only need the plain name.
+    return getattr(state, "name", None) or str(state or "UNKNOWN")
+
+
+class TuningJobRunner:
+    """
+    Submits a fine-tuning job off the request thread and keeps its state fresh.
+
+    The job is created in a background task and then polled with exponential
+    backoff until it reaches a terminal state. Every state transition is pushed to
+    Socket.IO clients as a 'tuning_job_update' event, and snapshot() returns the
+    latest known state without touching the network.
+
+    With a registry, each request is fingerprinted first (see prepare_tuning_job).
+    Fingerprinting reads the whole dataset, so it also runs in the background task,
+    while the job is in the PREPARING state. A request that matches a job the
+    registry knows to be running or finished reuses that job, even across restarts,
+    instead of submitting a new one. The reused job is fetched again, and success
+    listeners run for it as for a new one.
+    """
+
+    def __init__(self, submit=None, refresh=None, emit=None, spawn=None, sleep=None,
+                 initial_delay=5.0, max_delay=300.0, backoff=2.0, registry=None, prepare=None,
+                 validate=None, max_resume_attempts=5):
+        self._submit = submit or tuning_service.submit
+        self._refresh = refresh or tuning_service.get
+        self._registry = registry
+        # Jobs are fingerprinted with the service they run on, so one service never reuses another's jobs.
+        self._prepare = prepare or (lambda overrides: prepare_tuning_job(overrides, service=tuning_service.name))
+        # Checks the overrides on the request thread without reading the dataset.
+        self._validate = validate or tuning_config
+        self._fingerprint = None
+        self._emit = emit or socketio.emit
+        self._spawn = spawn or socketio.start_background_task
+        self._sleep = sleep or socketio.sleep
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.max_resume_attempts = max_resume_attempts
+        self._lock = threading.Lock()
+        self._running = False
+        self._snapshot = {"status": "No tuning job found.", "state": None, "ready": False}
+        self._success_listeners = []
+
+    def snapshot(self):
+        """
+        Returns the cached job state. Never blocks on the tuning API.
+        """
+        return self._snapshot
+
+    def is_active(self):
+        """
+        Returns True while a job is being submitted or polled.
+        """
+        return self._running
+
+    def has_job(self):
+        """
+        Returns True while a job is running or once one has succeeded.
+        A failed or cancelled job can be replaced by starting a new one.
+        """
+        return self._running or self._snapshot.get("state") == "JOB_STATE_SUCCEEDED"
+
+    def start(self, overrides=None):
+        """
+        Starts submitting and polling a tuning job in the background.
+
+        Args:
+            overrides (dict, optional): Per-request tuning settings (see tuning_config);
+                only used with a registry.
+
+        Returns:
+            tuple: (snapshot, started) where started is False if a job already exists.
+                With a registry, whether a registered job matches the request is only
+                known once it is prepared: later snapshots then have 'reused' set.
+
+        Raises:
+            ValueError: If the overrides are invalid.
+        """
+        if self._registry is None:
+            with self._lock:
+                if self.has_job():
+                    return self._snapshot, False
+                self._running = True
+                self._publish({"status": "Submitting tuning job.", "state": "SUBMITTING", "ready": False})
+            self._spawn(self._run)
+            return self._snapshot, True
+
+        with self._lock:
+            if self._running:
+                # One job is polled at a time, whatever it was started for.
+                return self._snapshot, False
+            config, _ = self._validate(overrides)
+            self._running = True
+            self._fingerprint = None
+            self._publish({"status": "Preparing tuning job.", "state": "PREPARING", "ready": False, "config": config})
+        self._spawn(self._prepare_and_run, overrides)
+        return self._snapshot, True
+
+    def add_success_listener(self, listener):
+        """
+        Registers a callable invoked with the finished job when tuning succeeds.
+        """
+        self._success_listeners.append(listener)
+
+    def _prepare_and_run(self, overrides):
+        try:
+            plan = self._prepare(overrides)
+        except Exception as e:
+            print(f"Error preparing tuning job: {e}")
+            self._publish({"status": "Tuning job preparation failed.", "state": "JOB_STATE_FAILED",
+                           "ready": False, "error": str(e)})
+            self._running = False
+            return
+
+        self._fingerprint = plan["fingerprint"]
+        entry = self._registry.find_reusable(self._fingerprint)
+        if entry is not None:
+            self._publish(dict(self._entry_snapshot(entry), reused=True))
+            # Possibly recorded by an earlier process: fetch the job again, and keep polling it
+            # if it is still running, so tuning_job_instance and the success listeners follow it.
+            self._resume(entry["job_id"])
+            return
+        self._publish({"status": "Submitting tuning job.", "state": "SUBMITTING", "ready": False,
+                       "fingerprint": self._fingerprint, "config": plan["config"]})
+        self._run(plan)
+
+    def _run(self, plan=None):
+        global tuning_job_instance
+        try:
+            job = self._submit(plan) if plan is not None else self._submit()
+        except Exception as e:
+            print(f"Error creating tuning job: {e}")
+            self._publish({"status": "Tuning job submission failed.", "state": "JOB_STATE_FAILED",
+                           "ready": False, "error": str(e), "fingerprint": self._fingerprint})
+            self._running = False
+            return
+
+        tuning_job_instance = job
+        print("Created tuning job instance:", job)
+        if plan is not None:
+            self._registry.record(plan["fingerprint"], job_id=job.name, service=plan["service"], config=plan["config"],
+                                  dataset=plan["dataset"])
+        self._record(job)
+        self._poll(job)
+
+    def _resume(self, job_name):
+        global tuning_job_instance
+        delay = self.initial_delay
+        for attempt in range(1, self.max_resume_attempts + 1):
+            try:
+                job = self._refresh(job_name)
+                break
+            except Exception as e:
+                print(f"Error polling tuning job {job_name}: {e}")
+                if is_not_found_error(e) or attempt == self.max_resume_attempts:
+                    # Deleted, or recorded by another service or project: the job can never be reused.
+                    error = f"Could not resume tuning job {job_name}: {e}"
+                    self._registry.record(self._fingerprint, job_id=job_name, state="JOB_STATE_FAILED", error=error)
+                    self._publish({"job_id": job_name, "status": "Tuning job could not be resumed.",
+                                   "state": "JOB_STATE_FAILED", "ready": False, "error": error,
+                                   "fingerprint": self._fingerprint})
+                    self._running = False
+                    return
+                self._sleep(delay)
+                delay = min(delay * self.backoff, self.max_delay)
+        tuning_job_instance = job
+        self._record(job)
+        self._poll(job)
+
+    def _poll(self, job):
+        global tuning_job_instance
+        delay = self.initial_delay
+        while _state_name(job.state) not in TERMINAL_STATES:
+            self._sleep(delay)
+            delay = min(delay * self.backoff, self.max_delay)
+            try:
+                job = self._refresh(job.name)
+            except Exception as e:
+                # Transient API errors only delay the next poll.
+                print(f"Error polling tuning job {job.name}: {e}")
+                continue
+            tuning_job_instance = job
+            self._record(job)
+
+        self._running = False
+        if _state_name(job.state) == "JOB_STATE_SUCCEEDED":
+            for listener in list(self._success_listeners):
+                try:
+                    listener(job)
+                except Exception as e:
+                    print(f"Error in tuning job success listener: {e}")
+
+    def _record(self, job):
+        state = _state_name(job.state)
+        tuned_model = getattr(job, "tuned_model", None)
+        snapshot = {
+            "job_id": getattr(job, "name", None),
+            "state": state,
+            "ready": state == "JOB_STATE_SUCCEEDED",
+            "fine_tuned_model": getattr(tuned_model, "model", None),
+            "endpoint": getattr(tuned_model, "endpoint", None),
+        }
+        error = getattr(job, "error", None)
+        if error:
+            snapshot["error"] = str(error)
+        if self._fingerprint is not None and self._registry is not None:
+            snapshot["fingerprint"] = self._fingerprint
+        if state != self._snapshot.get("state"):
+            if "fingerprint" in snapshot:
+                self._registry.record(self._fingerprint, job_id=snapshot["job_id"], state=state,
+                                      fine_tuned_model=snapshot["fine_tuned_model"], endpoint=snapshot["endpoint"],
+                                      error=snapshot.get("error"))
+            self._publish(snapshot)
+        else:
+            self._snapshot = dict(self._snapshot, checked_at=time.time())
+
+    @staticmethod
+    def _entry_snapshot(entry):
+        state = entry.get("state")
+        return {
+            "job_id": entry.get("job_id"),
+            "state": state,
+            "ready": state == "JOB_STATE_SUCCEEDED",
+            "fine_tuned_model": entry.get("fine_tuned_model"),
+            "endpoint": entry.get("endpoint"),
+            "fingerprint": entry["fingerprint"],
+            "config": entry.get("config"),
+        }
+
+    def _publish(self, snapshot):
+        snapshot["updated_at"] = time.time()
+        # Replace rather than mutate, so readers always see a consistent dict.
+        self._snapshot = snapshot
+        try:
+            self._emit("tuning_job_update", snapshot)
+        except Exception as e:
+            print(f"Error emitting tuning job update: {e}")
+
+
+def activate_tuned_endpoint(job):
+    """
+    Points the chat model registry at the endpoint of a successfully tuned model.
+    """
+    match = _ENDPOINT_PATTERN.search(getattr(job.tuned_model, "endpoint", None) or "")
+    if match:
+        project, location, endpoint_id = match.groups()
+        VertexModelRegistry.get_instance().set_endpoint(project, location, endpoint_id)
+        print(f"✅ Chat now uses tuned endpoint {match.group(0)}")
+
+
+tuning_job_runner = TuningJobRunner(
+    initial_delay=float(os.getenv("TUNING_POLL_INITIAL_DELAY", "5")),
+    max_delay=float(os.getenv("TUNING_POLL_MAX_DELAY", "300")),
+    registry=tuning_job_registry,
+)
+if os.getenv("TUNING_AUTO_ACTIVATE", "false").lower() == "true":
+    tuning_job_runner.add_success_listener(activate_tuned_endpoint)
+
+# Hyperparameter sweeps share the tuning service and the job registry with the runner.
+sweep_scheduler = SweepScheduler.from_env(
+    tuning_service,
+    registry=tuning_job_registry,
+    emit=lambda event, payload: socketio.emit(event, payload),
+    spawn=lambda func: socketio.start_background_task(func),
+    sleep=lambda seconds: socketio.sleep(seconds),
+)
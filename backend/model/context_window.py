@@ -0,0 +1,167 @@
+import os
+import threading
+from data.token_counting import ApproximateTokenCounter
+
+
+class ContextPlan:
+    """The history and document context chosen for one model call, with their token usage."""
+    __slots__ = ("history", "context", "usage")
+
+    def __init__(self, history, context, usage):
+        self.history = history
+        self.context = context
+        self.usage = usage
+
+
+class ContextWindow:
+    """
+    Fits chat history and document context into a token budget before each model call.
+
+    The question is always sent. Of the tokens it leaves, the document context may
+    claim up to `document_share`; the history gets the rest, keeping the most recent
+    user/model exchanges and dropping older ones whole. Whatever the history does
+    not use goes back to the document context, which is cut at a word boundary if
+    it still does not fit. Dropped exchanges are replaced by a short note listing
+    the earlier questions, up to `summary_tokens`.
+
+    Turns carry their token count from when they were recorded, so only the
+    question and document context are counted per call.
+    """
+
+    def __init__(self, max_tokens=8192, response_tokens=1024, document_share=0.5, summary_tokens=128, counter=None):
+        self.max_tokens = max_tokens
+        self.response_tokens = response_tokens
+        self.document_share = document_share
+        self.summary_tokens = summary_tokens
+        self.counter = counter or ApproximateTokenCounter()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._trimmed_requests = 0
+        self._dropped_turns = 0
+        self._truncated_contexts = 0
+        self._input_tokens = 0
+        self._max_input_tokens = 0
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a context window sized from the CONTEXT_* environment variables.
+        """
+        return cls(
+            max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "8192")),
+            response_tokens=int(os.getenv("CONTEXT_RESPONSE_TOKENS", "1024")),
+            document_share=float(os.getenv("CONTEXT_DOCUMENT_SHARE", "0.5")),
+            summary_tokens=int(os.getenv("CONTEXT_SUMMARY_TOKENS", "128")),
+        )
+
+    @property
+    def input_budget(self):
+        """Tokens available for the history, document context and question."""
+        return max(self.max_tokens - self.response_tokens, 0)
+
+    def fit(self, history, question, context=""):
+        """
+        Chooses what to send with a question.
+
+        Args:
+            history (list[ConversationTurn]): The session history, oldest first, in user/model pairs.
+            question (str): The user's question; always sent in full.
+            context (str, optional): Document context retrieved for the question.
+
+        Returns:
+            ContextPlan: The history to send, the (possibly shortened) context and the token usage.
+        """
+        context = context or ""
+        question_tokens, context_tokens = self.counter.count_batch([question, context])
+        available = max(self.input_budget - question_tokens, 0)
+
+        context_claim = min(context_tokens, int(available * self.document_share))
+        kept, dropped = self._recent_exchanges(history, available - context_claim)
+        history_tokens = sum(turn.tokens for turn in kept)
+
+        truncated = False
+        if context_tokens > available - history_tokens:
+            context, context_tokens = self._truncate(context, available - history_tokens)
+            truncated = True
+
+        summary_tokens = 0
+        room = available - history_tokens - context_tokens
+        if dropped and self.summary_tokens and room > 0:
+            summary, summary_tokens = self._summarize(dropped, min(self.summary_tokens, room))
+            if summary:
+                context = f"{summary}\n{context}" if context else summary
+
+        input_tokens = question_tokens + history_tokens + context_tokens + summary_tokens
+        usage = {
+            "budget": self.input_budget,
+            "question_tokens": question_tokens,
+            "history_tokens": history_tokens,
+            "context_tokens": context_tokens,
+            "summary_tokens": summary_tokens,
+            "input_tokens": input_tokens,
+            "history_turns": len(kept),
+            "dropped_turns": len(dropped),
+            "context_truncated": truncated,
+        }
+        self._record(usage)
+        return ContextPlan(kept, context, usage)
+
+    def _recent_exchanges(self, history, budget):
+        # Walk back one user/model exchange at a time so the history still starts with a user turn.
+        start = len(history)
+        used = 0
+        while start >= 2:
+            cost = history[start - 2].tokens + history[start - 1].tokens
+            if used + cost > budget:
+                break
+            used += cost
+            start -= 2
+        return history[start:], history[:start]
+
+    def _truncate(self, text, max_tokens):
+        if max_tokens <= 0:
+            return "", 0
+        words = text.split(" ")
+        used = 0
+        kept = 0
+        for tokens in self.counter.count_batch(words):
+            if used + tokens > max_tokens:
+                break
+            used += tokens
+            kept += 1
+        return " ".join(words[:kept]), used
+
+    def _summarize(self, dropped, max_tokens):
+        questions = [turn.text.strip() for turn in dropped if turn.role == "user" and turn.text.strip()]
+        if not questions:
+            return "", 0
+        return self._truncate("Earlier in this conversation the user asked: " + "; ".join(questions), max_tokens)
+
+    def _record(self, usage):
+        with self._lock:
+            self._requests += 1
+            self._input_tokens += usage["input_tokens"]
+            self._max_input_tokens = max(self._max_input_tokens, usage["input_tokens"])
+            if usage["dropped_turns"] or usage["context_truncated"]:
+                self._trimmed_requests += 1
+            self._dropped_turns += usage["dropped_turns"]
+            self._truncated_contexts += usage["context_truncated"]
+
+    def stats(self):
+        """
+        Returns the budget and how much of it requests have used so far.
+        """
+        with self._lock:
+            return {
+                "budget": self.input_budget,
+                "requests": self._requests,
+                "trimmed_requests": self._trimmed_requests,
+                "dropped_turns": self._dropped_turns,
+                "truncated_contexts": self._truncated_contexts,
+                "mean_input_tokens": round(self._input_tokens / self._requests, 1) if self._requests else 0.0,
+                "max_input_tokens": self._max_input_tokens,
+            }
+
+
+# Shared budget used by the chat endpoints
+context_window = ContextWindow.from_env()
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from data.token_counting import ApproximateTokenCounter
+
+_token_counter = ApproximateTokenCounter()
+
+
+class ConversationTurn:
+    """A single message in a chat session."""
+    __slots__ = ("role", "text", "size", "tokens", "content")
+
+    def __init__(self, role, text, tokens=None):
+        self.role = role
+        self.text = text
+        self.size = len(text.encode("utf-8"))
+        # Counted once when the turn is recorded, so fitting a context window never re-counts history.
+        self.tokens = _token_counter.count_batch([text])[0] if tokens is None else tokens
+        # Converted SDK object, filled in lazily the first time the turn is sent.
+        self.content = None
+
+
+class _Session:
+    __slots__ = ("turns", "size", "tokens", "last_access")
+
+    def __init__(self):
+        self.turns = deque()
+        self.size = 0
+        self.tokens = 0
+        self.last_access = time.monotonic()
+
+
+class ConversationStore:
+    """
+    Keeps chat history per session with bounded memory.
+
+    Each session holds at most `max_turns` turns and `max_session_bytes` of text;
+    the oldest user/model exchanges are dropped first. Sessions are kept in LRU
+    order: idle sessions expire after `idle_ttl` seconds, and the least recently
+    used sessions are evicted whenever `max_sessions` or `max_total_bytes` is exceeded.
+    """
+
+    def __init__(self, max_turns=20, max_session_bytes=64 * 1024, max_sessions=1000,
+                 max_total_bytes=16 * 1024 * 1024, idle_ttl=1800, clock=time.monotonic):
+        self.max_turns = max_turns
+        self.max_session_bytes = max_session_bytes
+        self.max_sessions = max_sessions
+        self.max_total_bytes = max_total_bytes
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._sessions = OrderedDict()
+        self._total_bytes = 0
+        self._evicted_sessions = 0
+        self._trimmed_turns = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a store sized from the CONVERSATION_* environment variables.
+        """
+        return cls(
+            max_turns=int(os.getenv("CONVERSATION_MAX_TURNS", "20")),
+            max_session_bytes=int(os.getenv("CONVERSATION_MAX_SESSION_BYTES", str(64 * 1024))),
+            max_sessions=int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000")),
+            max_total_bytes=int(os.getenv("CONVERSATION_MAX_TOTAL_BYTES", str(16 * 1024 * 1024))),
+            idle_ttl=float(os.getenv("CONVERSATION_IDLE_TTL", "1800")),
+        )
+
+    def get_history(self, session_id, max_turns=None):
+        """
+        Returns the most recent turns of a session, oldest first.
+
+        Args:
+            session_id (str): The chat session identifier.
+            max_turns (int, optional): Only return this many of the latest turns.
+
+        Returns:
+            list[ConversationTurn]: A snapshot of the session history.
+        """
+        with self._lock:
+            self._expire_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            self._touch(session_id, session)
+            turns = session.turns
+            if max_turns is not None and len(turns) > max_turns:
+                # Keep whole exchanges so the history still starts with a user turn.
+                max_turns -= max_turns % 2
+                return list(turns)[len(turns) - max_turns:]
+            return list(turns)
+
+    def append_exchange(self, session_id, user_text, model_text):
+        """
+        Records a completed user/model exchange and enforces every size limit.
+        """
+        user_tokens, model_tokens = _token_counter.count_batch([user_text, model_text])
+        exchange = (ConversationTurn("user", user_text, user_tokens), ConversationTurn("model", model_text, model_tokens))
+        with self._lock:
+            self._expire_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session()
+            self._touch(session_id, session)
+            for turn in exchange:
+                session.turns.append(turn)
+                session.size += turn.size
+                session.tokens += turn.tokens
+                self._total_bytes += turn.size
+            self._trim_session(session)
+            self._enforce_global_limits(session_id)
+
+    def clear(self, session_id):
+        """
+        Drops a session and its history.
+        """
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._total_bytes -= session.size
+
+    def stats(self):
+        """
+        Returns counters describing how much the store currently holds.
+        """
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "turns": sum(len(session.turns) for session in self._sessions.values()),
+                "bytes": self._total_bytes,
+                "tokens": sum(session.tokens for session in self._sessions.values()),
+                "max_total_bytes": self.max_total_bytes,
+                "evicted_sessions": self._evicted_sessions,
+                "trimmed_turns": self._trimmed_turns,
+            }
+
+    def _touch(self, session_id, session):
+        session.last_access = self._clock()
+        self._sessions.move_to_end(session_id)
+
+    def _trim_session(self, session):
+        # Drop whole exchanges from the front until the session fits its caps.
+        turns = session.turns
+        while turns and (len(turns) > self.max_turns or session.size > self.max_session_bytes):
+            for _ in range(min(2, len(turns))):
+                turn = turns.popleft()
+                session.size -= turn.size
+                session.tokens -= turn.tokens
+                self._total_bytes -= turn.size
+                self._trimmed_turns += 1
+
+    def _enforce_global_limits(self, keep_session_id):
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._total_bytes > self.max_total_bytes
+        ):
+            oldest_id = next(iter(self._sessions))
+            if oldest_id == keep_session_id:
+                break
+            self._evict(oldest_id)
+
+    def _expire_idle(self):
+        deadline = self._clock() - self.idle_ttl
+        # Sessions are in LRU order, so the idle ones are all at the front.
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if oldest.last_access > deadline:
+                break
+            self._evict(oldest_id)
+
+    def _evict(self, session_id):
+        session = self._sessions.pop(session_id)
+        self._total_bytes -= session.size
+        self._evicted_sessions += 1
+
+
+# Shared store used by the chat endpoints
+conversation_store = ConversationStore.from_env()
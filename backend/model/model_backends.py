@@ -0,0 +1,149 @@
+"""
+Backends the VertexModelRegistry builds its model client from.
+
+A backend is a callable (project, location, model_name) -> model. The model
+must offer the subset of the Vertex AI GenerativeModel API the app uses:
+
+- start_chat(history) -> chat, where chat.send_message(text, stream=False)
+  returns a response, or an iterator of chunks when stream=True
+- generate_content(prompt) -> response
+- optionally make_content(role, text), building one chat history entry
+  (Vertex AI Content objects are used when it is missing)
+
+Responses and chunks expose the answer as .text.
+
+MODEL_BACKEND selects the backend: 'vertex' (the default) or 'stub', a local
+model whose latency and failure rate come from the STUB_* environment
+variables. The stub makes it possible to load-test the Flask/Socket.IO stack
+offline.
+"""
+import os
+import random
+import threading
+import time
+
+
+def vertex_backend(project, location, model_name):
+    """
+    Initializes Vertex AI and builds the GenerativeModel for the tuned endpoint.
+    """
+    # Imported here so that importing the app does not load the Vertex AI SDK.
+    import vertexai
+    from vertexai.generative_models import GenerativeModel
+
+    vertexai.init(project=project, location=location)
+    return GenerativeModel(model_name=model_name)
+
+
+class StubModelError(RuntimeError):
+    """A failure injected by the stub model."""
+
+
+class _StubResponse:
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class StubChat:
+    def __init__(self, model, history):
+        self._model = model
+        self.history = list(history or [])
+
+    def send_message(self, text, stream=False):
+        if stream:
+            return self._model._stream(text)
+        return self._model.generate_content(text)
+
+
+class StubModel:
+    """
+    A local stand-in for the tuned model.
+
+    Every call waits latency_ms (plus up to jitter_ms) before answering, and fails
+    with StubModelError at failure_rate. Streamed answers are split into words,
+    chunk_delay_ms apart. The answer is answers[prompt] when given, otherwise a
+    short echo of the prompt.
+    """
+
+    def __init__(self, latency_ms=50.0, jitter_ms=0.0, failure_rate=0.0, chunk_delay_ms=0.0, answers=None,
+                 seed=None, name="stub"):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.chunk_delay_ms = chunk_delay_ms
+        self.answers = answers or {}
+        self.name = name
+        self.calls = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _begin(self, prompt):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency_ms + (self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+            failed = self.failure_rate and self._random.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        if delay:
+            time.sleep(delay / 1000)
+        if failed:
+            raise StubModelError("Injected stub model failure")
+        return self.answers.get(prompt) or f"Stub answer to: {prompt.splitlines()[-1] if prompt else ''}"
+
+    def make_content(self, role, text):
+        # History entries stay plain tuples; the stub never loads the Vertex AI SDK.
+        return (role, text)
+
+    def start_chat(self, history=None):
+        return StubChat(self, history)
+
+    def generate_content(self, prompt):
+        return _StubResponse(self._begin(prompt))
+
+    def _stream(self, prompt):
+        words = self._begin(prompt).split(" ")
+        for index, word in enumerate(words):
+            if index and self.chunk_delay_ms:
+                time.sleep(self.chunk_delay_ms / 1000)
+            yield _StubResponse(word if index == 0 else " " + word)
+
+
+class StubBackend:
+    """Builds StubModels that share one latency and failure configuration."""
+
+    def __init__(self, **options):
+        self.options = options
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """
+        Builds a stub backend configured from the STUB_* environment variables.
+        """
+        options = {
+            "latency_ms": float(os.getenv("STUB_LATENCY_MS", "50")),
+            "jitter_ms": float(os.getenv("STUB_JITTER_MS", "0")),
+            "failure_rate": float(os.getenv("STUB_FAILURE_RATE", "0")),
+            "chunk_delay_ms": float(os.getenv("STUB_CHUNK_DELAY_MS", "0")),
+        }
+        options.update(overrides)
+        return cls(**options)
+
+    def __call__(self, project, location, model_name):
+        return StubModel(name=f"stub:{model_name}", **self.options)
+
+
+def get_model_backend(spec=None):
+    """
+    Returns the backend for a spec: 'vertex', 'stub' or 'stub:<latency ms>'.
+    Defaults to the MODEL_BACKEND environment variable.
+    """
+    spec = spec or os.getenv("MODEL_BACKEND", "vertex")
+    name, _, argument = spec.partition(":")
+    if name == "vertex":
+        return vertex_backend
+    if name == "stub":
+        return StubBackend.from_env(**({"latency_ms": float(argument)} if argument else {}))
+    raise ValueError(f"Unknown model backend: {spec!r}")
@@ -1,3 +1,21 @@
 from flask_socketio import SocketIO
+from utils.metrics import socketio_emits
 
-socketio = SocketIO(cors_allowed_origins="*")
+
+class InstrumentedSocketIO(SocketIO):
+    """A SocketIO server that counts the events it emits for /metrics."""
+
+    def emit(self, event, *args, **kwargs):
+        socketio_emits.labels(event).inc()
+        return super().emit(event, *args, **kwargs)
+
+    def connected_clients(self):
+        """
+        Returns how many clients are connected to the default namespace of this worker.
+        """
+        if self.server is None:
+            return 0
+        return sum(1 for _ in self.server.manager.get_participants("/", None))
+
+
+socketio = InstrumentedSocketIO(cors_allowed_origins="*")
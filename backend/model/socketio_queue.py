@@ -0,0 +1,110 @@
+"""
+Message-queue fan-out for Socket.IO, so several backend workers can serve one
+set of clients.
+
+With SOCKETIO_MESSAGE_QUEUE set, every worker publishes its emits and room
+changes to the queue and delivers the ones addressed to its own clients, so a
+transcription received by one worker reaches a browser connected to another.
+
+- redis://, rediss://, kafka://, zmq+tcp:// or any Kombu URL (amqp:// ...)
+  use the managers that ship with python-socketio (their client libraries
+  have to be installed)
+- local://<name> uses LocalBroker, an in-process stand-in that lets tests run
+  several Socket.IO servers against one queue without a broker
+"""
+import json
+import os
+import queue
+import threading
+
+import socketio as python_socketio
+
+_CLOSED = object()
+
+
+class LocalBroker:
+    """
+    An in-process pub/sub broker. Messages go through JSON like they would on the
+    wire, and every subscriber of a channel gets every message published to it.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, channel):
+        """
+        Returns a queue that receives the messages published to a channel from now on.
+        """
+        subscriber = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(subscriber)
+        return subscriber
+
+    def publish(self, channel, message):
+        payload = json.dumps(message)
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+            self.published += 1
+        for subscriber in subscribers:
+            subscriber.put(payload)
+
+    def close(self):
+        """
+        Ends every subscription, which stops the listeners of the managers using the broker.
+        """
+        with self._lock:
+            subscribers = [s for channel in self._subscribers.values() for s in channel]
+            self._subscribers.clear()
+        for subscriber in subscribers:
+            subscriber.put(_CLOSED)
+
+
+_local_brokers = {}
+_local_brokers_lock = threading.Lock()
+
+
+def get_local_broker(name=""):
+    """
+    Returns the process-wide LocalBroker registered under a name.
+    """
+    with _local_brokers_lock:
+        return _local_brokers.setdefault(name, LocalBroker())
+
+
+class LocalBrokerManager(python_socketio.PubSubManager):
+    """A Socket.IO client manager that shares emits and rooms through a LocalBroker."""
+    name = "local"
+
+    def __init__(self, url="local://", channel="flask-socketio", write_only=False, logger=None, json=None,
+                 broker=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.broker = broker or get_local_broker(url.partition("://")[2])
+        # Subscribing up front keeps messages published before the listener starts.
+        self._subscription = None if write_only else self.broker.subscribe(channel)
+
+    def _publish(self, data):
+        self.broker.publish(self.channel, data)
+
+    def _listen(self):
+        while True:
+            message = self._subscription.get()
+            if message is _CLOSED:
+                return
+            yield message
+
+
+def message_queue_options(url=None, channel=None):
+    """
+    Returns the SocketIO.init_app options for a message queue, read from
+    SOCKETIO_MESSAGE_QUEUE and SOCKETIO_CHANNEL by default. Without a queue URL the
+    server keeps its clients to itself.
+    """
+    url = url if url is not None else os.getenv("SOCKETIO_MESSAGE_QUEUE", "")
+    channel = channel or os.getenv("SOCKETIO_CHANNEL", "flask-socketio")
+    if not url:
+        return {}
+    if url.startswith("local://"):
+        return {"client_manager": LocalBrokerManager(url, channel=channel)}
+    return {"message_queue": url, "channel": channel}
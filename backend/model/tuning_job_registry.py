@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from data.atomic_files import atomic_open
+
+DEFAULT_REGISTRY_PATH = os.path.join(os.path.dirname(__file__), "../data/tuning-jobs.json")
+# Version 2 added the tuning service to the fingerprint; older entries are dropped.
+REGISTRY_VERSION = 2
+
+# States after which a job will not produce a model; a new request may replace it.
+UNUSABLE_STATES = {"JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+# States after which a job no longer changes.
+TERMINAL_STATES = UNUSABLE_STATES | {"JOB_STATE_SUCCEEDED"}
+
+
+def tuning_fingerprint(dataset_sha256, config, service="gemini"):
+    """
+    Identifies a tuning run by the service it runs on, the examples it trains on and
+    the settings that shape the tuned model (base model and hyperparameters, not the
+    display name). Jobs of one service are never reused by another.
+
+    Args:
+        dataset_sha256 (str): Fingerprint of the streamed training examples.
+        config (dict): The resolved tuning configuration.
+        service (str): Name of the tuning service, e.g. 'gemini' or 'fake'.
+    """
+    shaping = {key: value for key, value in config.items() if key != "display_name"}
+    payload = json.dumps({"service": service, "dataset": dataset_sha256, "config": shaping}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TuningJobRegistry:
+    """
+    Remembers every tuning job submitted, keyed by its fingerprint, in a JSON file.
+
+    Entries are written atomically on every change, so the registry survives
+    restarts and a request that matches an earlier job can reuse its running or
+    finished model instead of tuning again.
+    """
+
+    def __init__(self, path=DEFAULT_REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._jobs = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+                if data.get("version") == REGISTRY_VERSION:
+                    self._jobs = data.get("jobs", {})
+            except (OSError, ValueError) as e:
+                print(f"Could not read tuning job registry {path}, starting empty: {e}")
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a registry stored at TUNING_JOB_REGISTRY_PATH; an empty value keeps it in memory only.
+        """
+        return cls(os.getenv("TUNING_JOB_REGISTRY_PATH", DEFAULT_REGISTRY_PATH))
+
+    def get(self, fingerprint):
+        """
+        Returns a copy of the entry for a fingerprint, or None.
+        """
+        with self._lock:
+            entry = self._jobs.get(fingerprint)
+            return dict(entry) if entry else None
+
+    def find_reusable(self, fingerprint):
+        """
+        Returns the entry for a fingerprint if its job is running or has succeeded.
+        """
+        entry = self.get(fingerprint)
+        if entry and entry.get("job_id") and entry.get("state") not in UNUSABLE_STATES:
+            return entry
+        return None
+
+    def record(self, fingerprint, **fields):
+        """
+        Creates or updates the entry for a fingerprint and saves the registry.
+
+        Returns:
+            dict: A copy of the updated entry.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._jobs.setdefault(fingerprint, {"fingerprint": fingerprint, "created_at": now})
+            entry.update(fields, updated_at=now)
+            snapshot = dict(entry)
+            self._save()
+        return snapshot
+
+    def entries(self):
+        """
+        Returns copies of all entries, most recently updated first.
+        """
+        with self._lock:
+            jobs = [dict(entry) for entry in self._jobs.values()]
+        return sorted(jobs, key=lambda entry: entry.get("updated_at", 0), reverse=True)
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with atomic_open(self.path) as file:
+                json.dump({"version": REGISTRY_VERSION, "jobs": self._jobs}, file, indent=2)
+        except OSError as e:
+            print(f"Could not save tuning job registry {self.path}: {e}")
+
+
+# Shared registry used by the tuning job runner
+tuning_job_registry = TuningJobRegistry.from_env()
@@ -0,0 +1,158 @@
+"""
+Services that tuning jobs are submitted to and polled from.
+
+A tuning service offers:
+
+- submit(plan) -> job, where plan comes from prepare_tuning_job()
+- get(job_name) -> job
+
+Jobs expose .name, .state (a JOB_STATE_* name or enum), .tuned_model (with
+.model and .endpoint once the job has succeeded) and optionally .error.
+
+TUNING_SERVICE selects the service: 'gemini' (the default) submits real jobs,
+'fake' or 'fake:<seconds per epoch>' runs them locally for a simulated time, so
+tuning sweeps can be scheduled and tested offline.
+"""
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+
+class GeminiTuningService:
+    """Submits jobs to the Gemini tuning API."""
+
+    name = "gemini"
+
+    def submit(self, plan=None):
+        from utils.services import create_finetuning_job
+
+        return create_finetuning_job(plan)
+
+    def get(self, job_name):
+        from utils.services import get_tuning_job
+
+        return get_tuning_job(job_name)
+
+
+class FakeQuotaError(RuntimeError):
+    """Raised by the fake service when too many jobs are active, like a 429 from the real API."""
+
+
+class FakeTuningService:
+    """
+    A local tuning service whose jobs take a simulated amount of time.
+
+    A job is queued for queue_seconds, then runs for seconds_per_epoch per epoch
+    (plus up to jitter_seconds) and then succeeds, or fails at failure_rate.
+    Submitting while max_active jobs are unfinished raises FakeQuotaError. The
+    clock is injectable, so tests can move time forward instead of waiting.
+    """
+
+    def __init__(self, seconds_per_epoch=60.0, queue_seconds=0.0, jitter_seconds=0.0, failure_rate=0.0,
+                 max_active=None, clock=time.monotonic, seed=None):
+        self.seconds_per_epoch = seconds_per_epoch
+        self.queue_seconds = queue_seconds
+        self.jitter_seconds = jitter_seconds
+        self.failure_rate = failure_rate
+        self.max_active = max_active
+        self.name = "fake"
+        self.submitted = 0
+        self.peak_active = 0
+        self._clock = clock
+        self._random = random.Random(seed)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """
+        Builds a fake service configured from the FAKE_TUNING_* environment variables.
+        """
+        max_active = os.getenv("FAKE_TUNING_MAX_ACTIVE")
+        options = {
+            "seconds_per_epoch": float(os.getenv("FAKE_TUNING_SECONDS_PER_EPOCH", "60")),
+            "queue_seconds": float(os.getenv("FAKE_TUNING_QUEUE_SECONDS", "0")),
+            "jitter_seconds": float(os.getenv("FAKE_TUNING_JITTER_SECONDS", "0")),
+            "failure_rate": float(os.getenv("FAKE_TUNING_FAILURE_RATE", "0")),
+            "max_active": int(max_active) if max_active else None,
+        }
+        options.update(overrides)
+        return cls(**options)
+
+    def _finished(self, job, now):
+        return now - job["submitted_at"] >= self.queue_seconds + job["duration"]
+
+    def active_jobs(self):
+        """
+        Returns how many submitted jobs have not finished yet.
+        """
+        now = self._clock()
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not self._finished(job, now))
+
+    def submit(self, plan=None):
+        epochs = (plan or {}).get("config", {}).get("epoch_count", 1)
+        now = self._clock()
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if not self._finished(job, now))
+            if self.max_active is not None and active >= self.max_active:
+                raise FakeQuotaError("429 RESOURCE_EXHAUSTED: too many concurrent tuning jobs")
+            self.submitted += 1
+            name = f"tuningJobs/fake-{self.submitted}"
+            self._jobs[name] = {
+                "number": self.submitted,
+                "submitted_at": now,
+                "duration": self.seconds_per_epoch * epochs + self._random.uniform(0, self.jitter_seconds),
+                "fails": self.failure_rate and self._random.random() < self.failure_rate,
+                "plan": plan,
+            }
+            self.peak_active = max(self.peak_active, active + 1)
+        return self.get(name)
+
+    def get(self, job_name):
+        with self._lock:
+            job = self._jobs.get(job_name)
+        if job is None:
+            raise KeyError(f"Unknown tuning job {job_name}")
+        elapsed = self._clock() - job["submitted_at"]
+        tuned_model, error = None, None
+        if elapsed < self.queue_seconds:
+            state = "JOB_STATE_QUEUED"
+        elif elapsed < self.queue_seconds + job["duration"]:
+            state = "JOB_STATE_RUNNING"
+        elif job["fails"]:
+            state, error = "JOB_STATE_FAILED", "Simulated tuning failure"
+        else:
+            state = "JOB_STATE_SUCCEEDED"
+            tuned_model = SimpleNamespace(
+                model=f"tunedModels/fake-{job['number']}",
+                endpoint=f"projects/fake/locations/local/endpoints/{job['number']}",
+            )
+        return SimpleNamespace(name=job_name, state=state, tuned_model=tuned_model, error=error)
+
+
+def is_not_found_error(error):
+    """
+    Tells whether an error raised by get() means the job does not exist or is not
+    visible to this service (e.g. it belongs to another project), so polling it
+    again will never succeed.
+    """
+    if isinstance(error, KeyError):
+        return True
+    return getattr(error, "code", None) == 404 or "NOT_FOUND" in str(error)
+
+
+def get_tuning_service(spec=None):
+    """
+    Returns the service for a spec: 'gemini', 'fake' or 'fake:<seconds per epoch>'.
+    Defaults to the TUNING_SERVICE environment variable.
+    """
+    spec = spec or os.getenv("TUNING_SERVICE", "gemini")
+    name, _, argument = spec.partition(":")
+    if name == "gemini":
+        return GeminiTuningService()
+    if name == "fake":
+        return FakeTuningService.from_env(**({"seconds_per_epoch": float(argument)} if argument else {}))
+    raise ValueError(f"Unknown tuning service: {spec!r}")
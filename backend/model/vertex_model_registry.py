@@ -0,0 +1,148 @@
+import os
+import threading
+from model.model_backends import get_model_backend
+
+# Defaults match the endpoint the fine-tuned LIU model is deployed to.
+DEFAULT_VERTEX_PROJECT = "988399269486"
+DEFAULT_VERTEX_LOCATION = "us-central1"
+DEFAULT_VERTEX_ENDPOINT_ID = "8693984675871326208"
+
+
+class VertexModelRegistry:
+    """
+    A process-wide singleton that keeps one warm GenerativeModel client per worker.
+
+    The model (and the prediction client / gRPC channel it owns) is built once and
+    shared by every request thread. It is rebuilt automatically when the endpoint
+    configuration, the credentials file or the worker process changes.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        """
+        Returns the singleton instance of VertexModelRegistry.
+        If no instance exists, it initializes one.
+        """
+        if VertexModelRegistry._instance is None:
+            with VertexModelRegistry._instance_lock:
+                if VertexModelRegistry._instance is None:
+                    VertexModelRegistry._instance = VertexModelRegistry()
+        return VertexModelRegistry._instance
+
+    def __init__(self, model_factory=None):
+        """
+        Args:
+            model_factory (callable, optional): Builds a model from
+                (project, location, model_name). Defaults to the backend
+                selected by MODEL_BACKEND (Vertex AI unless set).
+        """
+        self._model_factory = model_factory or get_model_backend()
+        self._lock = threading.Lock()
+        self._key = None
+        self._model = None
+        self._endpoint_override = {}
+        self._rebuild_listeners = []
+        self.build_count = 0
+
+    def endpoint_config(self):
+        """
+        Returns the active (project, location, endpoint_id) triple.
+        Explicit overrides win over environment variables, which win over defaults.
+        """
+        return (
+            self._endpoint_override.get("project") or os.getenv("VERTEX_PROJECT", DEFAULT_VERTEX_PROJECT),
+            self._endpoint_override.get("location") or os.getenv("VERTEX_LOCATION", DEFAULT_VERTEX_LOCATION),
+            self._endpoint_override.get("endpoint_id") or os.getenv("VERTEX_ENDPOINT_ID", DEFAULT_VERTEX_ENDPOINT_ID),
+        )
+
+    def model_name(self):
+        """
+        Returns the fully qualified endpoint resource name of the active model.
+        """
+        project, location, endpoint_id = self.endpoint_config()
+        return f"projects/{project}/locations/{location}/endpoints/{endpoint_id}"
+
+    def _credentials_fingerprint(self):
+        # A changed path or a rewritten credentials file both require a new client.
+        path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS") or ""
+        try:
+            return path, os.stat(path).st_mtime_ns
+        except (OSError, ValueError):
+            return path, None
+
+    def _current_key(self):
+        # The pid guards against reusing a gRPC channel inherited through fork().
+        return self.endpoint_config(), self._credentials_fingerprint(), os.getpid()
+
+    def get_model(self):
+        """
+        Returns the shared GenerativeModel, building it on first use or after
+        the endpoint, credentials or worker process changed.
+
+        Returns:
+            GenerativeModel: The warm model client for the tuned endpoint.
+        """
+        key = self._current_key()
+        model = self._model
+        if model is not None and self._key == key:
+            return model
+
+        with self._lock:
+            # Another thread may have rebuilt the model while we waited.
+            if self._model is not None and self._key == key:
+                return self._model
+            project, location, _ = key[0]
+            previous_key = self._key
+            self._model = self._model_factory(project, location, self.model_name())
+            self._key = key
+            self.build_count += 1
+            model = self._model
+
+        if previous_key is not None and previous_key[0] != key[0]:
+            self._notify_rebuild()
+        return model
+
+    def warm_up(self):
+        """
+        Builds the model ahead of the first request and opens its prediction client,
+        so credential resolution and channel creation stay off the request path.
+        """
+        model = self.get_model()
+        # The Vertex SDK creates its prediction client lazily; touching it here
+        # resolves credentials and opens the gRPC channel up front.
+        getattr(model, "_prediction_client", None)
+        print(f"✅ Vertex AI model client ready: {self.model_name()}")
+        return model
+
+    def set_endpoint(self, project=None, location=None, endpoint_id=None):
+        """
+        Points the registry at a different tuned model endpoint.
+        The next call to get_model() rebuilds the client.
+        """
+        with self._lock:
+            for name, value in (("project", project), ("location", location), ("endpoint_id", endpoint_id)):
+                if value:
+                    self._endpoint_override[name] = value
+
+    def add_rebuild_listener(self, listener):
+        """
+        Registers a callable invoked after the model is rebuilt for a new endpoint.
+        """
+        self._rebuild_listeners.append(listener)
+
+    def _notify_rebuild(self):
+        for listener in list(self._rebuild_listeners):
+            try:
+                listener(self.model_name())
+            except Exception as e:
+                print(f"Error in model rebuild listener: {e}")
+
+    def reset(self):
+        """
+        Drops the cached model so the next request builds a fresh client.
+        """
+        with self._lock:
+            self._model = None
+            self._key = None
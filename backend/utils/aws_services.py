@@ -1,11 +1,13 @@
+import hashlib
+import math
+import mimetypes
 import os
+import threading
 import uuid
-import boto3
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
+from flask import request, jsonify
 from werkzeug.utils import secure_filename
-
-app = Flask(__name__)
+from utils.metrics import instrument_boto_client
 
 # AWS Configuration using environment variables
 load_dotenv()
@@ -16,13 +18,56 @@ AWS_Secret_Access_Key = os.getenv("AWS_SECRET_ACCESS_KEY")
 INPUT_PREFIX = "uploads/"
 OUTPUT_PREFIX = "processed/"
 
-# Initialize the S3 client with the specified AWS credentials and region.
-s3_client = boto3.client(
-    "s3", 
-    region_name=AWS_REGION, 
-    aws_access_key_id=AWS_Access_Key, 
-    aws_secret_access_key=AWS_Secret_Access_Key
-)
+# Multipart upload settings. S3 needs parts of at least 5 MiB (except the last)
+# and allows at most 10,000 parts per upload.
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+MULTIPART_PART_SIZE = max(int(os.getenv("S3_MULTIPART_PART_SIZE", str(8 * 1024 * 1024))), MIN_PART_SIZE)
+MULTIPART_CONCURRENCY = int(os.getenv("S3_MULTIPART_CONCURRENCY", "8"))
+PRESIGNED_PART_EXPIRY = int(os.getenv("S3_PRESIGNED_PART_EXPIRY", "3600"))
+
+# Binary output of the model (e.g. generated images) is served from S3 instead of inlined in responses.
+RESPONSE_MEDIA_PREFIX = "responses/"
+RESPONSE_MEDIA_EXPIRY = int(os.getenv("S3_RESPONSE_MEDIA_EXPIRY", "3600"))
+
+# boto3 is imported and the clients are built on first use, not at import time.
+_s3_client = None
+_transfer_config = None
+_client_lock = threading.Lock()
+
+def get_s3_client():
+    """
+    Returns the shared S3 client, creating it on first use.
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _client_lock:
+            if _s3_client is None:
+                import boto3
+                # Initialize the S3 client with the specified AWS credentials and region.
+                _s3_client = instrument_boto_client(boto3.client(
+                    "s3",
+                    region_name=AWS_REGION,
+                    aws_access_key_id=AWS_Access_Key,
+                    aws_secret_access_key=AWS_Secret_Access_Key
+                ), "s3")
+    return _s3_client
+
+def get_transfer_config():
+    """
+    Returns the TransferConfig for server-side uploads, which read and send one
+    part at a time on several threads.
+    """
+    global _transfer_config
+    if _transfer_config is None:
+        from boto3.s3.transfer import TransferConfig
+        _transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_PART_SIZE,
+            multipart_chunksize=MULTIPART_PART_SIZE,
+            max_concurrency=MULTIPART_CONCURRENCY,
+            use_threads=True,
+        )
+    return _transfer_config
 
 def generate_presigned_url(filename, filetype):
     """
@@ -47,7 +92,7 @@ def generate_presigned_url(filename, filetype):
 
     try:
         # Generate a presigned URL for the S3 PUT operation (expires in 300 seconds).
-        presigned_url = s3_client.generate_presigned_url(
+        presigned_url = get_s3_client().generate_presigned_url(
             "put_object",
             Params={
                 "Bucket": S3_BUCKET, 
@@ -58,9 +103,164 @@ def generate_presigned_url(filename, filetype):
         )
         return presigned_url, s3_key
     except Exception as e:
-        app.logger.error(f"Error generating presigned URL: {e}")
+        print(f"Error generating presigned URL: {e}")
         return None, None
 
+def upload_response_media(data, content_type):
+    """
+    Stores binary model output in S3 and returns a presigned URL to download it.
+
+    Objects are keyed by their content hash, so the same image is stored once.
+
+    Args:
+        data (bytes): The object's contents.
+        content_type (str): Its MIME type, e.g. 'image/png'.
+
+    Returns:
+        str: A GET URL valid for RESPONSE_MEDIA_EXPIRY seconds.
+    """
+    extension = mimetypes.guess_extension(content_type) or ""
+    s3_key = f"{RESPONSE_MEDIA_PREFIX}{hashlib.sha256(data).hexdigest()}{extension}"
+    client = get_s3_client()
+    client.put_object(Bucket=S3_BUCKET, Key=s3_key, Body=data, ContentType=content_type)
+    return client.generate_presigned_url(
+        "get_object", Params={"Bucket": S3_BUCKET, "Key": s3_key}, ExpiresIn=RESPONSE_MEDIA_EXPIRY
+    )
+
+def new_upload_key(filename):
+    """
+    Returns a unique S3 key under INPUT_PREFIX for an uploaded file.
+    """
+    return f"{INPUT_PREFIX}{uuid.uuid4().hex}_{secure_filename(filename)}"
+
+def is_upload_key(s3_key):
+    """
+    Checks that a client-supplied key points into the uploads prefix.
+    """
+    return isinstance(s3_key, str) and s3_key.startswith(INPUT_PREFIX) and ".." not in s3_key
+
+def part_size_for(file_size=None):
+    """
+    Picks a part size that keeps an upload of file_size bytes within MAX_PARTS parts.
+    """
+    if not file_size:
+        return MULTIPART_PART_SIZE
+    needed = math.ceil(file_size / MAX_PARTS)
+    # Round up to whole MiB so part boundaries are easy to compute on the client.
+    needed = math.ceil(needed / (1024 * 1024)) * 1024 * 1024
+    return max(MULTIPART_PART_SIZE, needed)
+
+def start_multipart_upload(filename, content_type, file_size=None):
+    """
+    Starts a multipart upload that the client fills with presigned part URLs.
+
+    Args:
+        filename (str): The original name of the file.
+        content_type (str): The MIME type of the file.
+        file_size (int, optional): Size in bytes, used to choose the part size.
+
+    Returns:
+        dict: The upload id, the S3 key, the part size, the number of parts (when the
+              size is known) and how many parts the client should upload at once.
+    """
+    s3_key = new_upload_key(filename)
+    response = get_s3_client().create_multipart_upload(Bucket=S3_BUCKET, Key=s3_key, ContentType=content_type)
+    part_size = part_size_for(file_size)
+    upload = {
+        "upload_id": response["UploadId"],
+        "s3_key": s3_key,
+        "part_size": part_size,
+        "max_concurrency": MULTIPART_CONCURRENCY,
+    }
+    if file_size:
+        upload["part_count"] = math.ceil(file_size / part_size)
+    return upload
+
+def presign_upload_parts(s3_key, upload_id, part_numbers, expires_in=PRESIGNED_PART_EXPIRY):
+    """
+    Generates a presigned PUT URL for each requested part number.
+
+    Signing happens locally, so presigning many parts needs no round trips to S3.
+
+    Returns:
+        list[dict]: {"part_number", "url"} for every part, in the requested order.
+    """
+    if len(part_numbers) > MAX_PARTS:
+        raise ValueError(f"At most {MAX_PARTS} parts can be presigned, got {len(part_numbers)}")
+    s3_client = get_s3_client()
+    urls = []
+    for number in part_numbers:
+        if not 1 <= number <= MAX_PARTS:
+            raise ValueError(f"Part numbers must be between 1 and {MAX_PARTS}, got {number}")
+        url = s3_client.generate_presigned_url(
+            "upload_part",
+            Params={"Bucket": S3_BUCKET, "Key": s3_key, "UploadId": upload_id, "PartNumber": number},
+            ExpiresIn=expires_in,
+        )
+        urls.append({"part_number": number, "url": url})
+    return urls
+
+def list_uploaded_parts(s3_key, upload_id):
+    """
+    Lists the parts S3 already holds for an upload, so an interrupted client can resume.
+
+    Returns:
+        list[dict]: {"part_number", "etag", "size"} for every uploaded part, by part number.
+    """
+    parts = []
+    paginator = get_s3_client().get_paginator("list_parts")
+    for page in paginator.paginate(Bucket=S3_BUCKET, Key=s3_key, UploadId=upload_id):
+        for part in page.get("Parts", ()):
+            parts.append({"part_number": part["PartNumber"], "etag": part["ETag"], "size": part["Size"]})
+    return sorted(parts, key=lambda part: part["part_number"])
+
+def complete_multipart_upload(s3_key, upload_id, parts=None):
+    """
+    Assembles the uploaded parts into the final object.
+
+    Args:
+        parts (list[dict], optional): {"part_number", "etag"} pairs reported by the client.
+            When omitted, the parts S3 has received are used.
+    """
+    if not parts:
+        parts = list_uploaded_parts(s3_key, upload_id)
+    if not parts:
+        raise ValueError("No parts have been uploaded")
+    ordered = sorted(
+        ({"PartNumber": int(part["part_number"]), "ETag": part["etag"]} for part in parts),
+        key=lambda part: part["PartNumber"],
+    )
+    get_s3_client().complete_multipart_upload(
+        Bucket=S3_BUCKET, Key=s3_key, UploadId=upload_id, MultipartUpload={"Parts": ordered}
+    )
+    return {"s3_key": s3_key, "parts": len(ordered)}
+
+def abort_multipart_upload(s3_key, upload_id):
+    """
+    Cancels a multipart upload and frees the parts S3 has stored for it.
+    """
+    get_s3_client().abort_multipart_upload(Bucket=S3_BUCKET, Key=s3_key, UploadId=upload_id)
+
+def upload_stream_to_S3(stream, filename, content_type):
+    """
+    Uploads a file-like stream to S3 under the 'uploads/' prefix.
+
+    The stream is read one part at a time and the parts are uploaded concurrently,
+    so the whole file is never held in memory.
+
+    Returns:
+        str: The S3 key of the uploaded object.
+    """
+    s3_key = new_upload_key(filename)
+    get_s3_client().upload_fileobj(
+        Fileobj=stream,
+        Bucket=S3_BUCKET,
+        Key=s3_key,
+        ExtraArgs={"ContentType": content_type},
+        Config=get_transfer_config(),
+    )
+    return s3_key
+
 def upload_file_to_S3():
     """
     Uploads a file directly to S3 under the 'uploads/' prefix.
@@ -81,19 +281,9 @@ def upload_file_to_S3():
     if file.filename == "":
         return jsonify({"error": "No selected file"}), 400
 
-    # Generate a unique, secure filename.
-    unique_filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
-    # Construct the S3 key using the defined uploads prefix.
-    s3_key = f"{INPUT_PREFIX}{unique_filename}"
-
     try:
-        # Upload the file to S3 with the specified content type.
-        s3_client.upload_fileobj(
-            Fileobj=file,
-            Bucket=S3_BUCKET,
-            Key=s3_key,
-            ExtraArgs={"ContentType": file.content_type},
-        )
+        # Upload the file to S3 in concurrent parts with the specified content type.
+        s3_key = upload_stream_to_S3(file.stream, file.filename, file.content_type)
         return jsonify({"message": "File uploaded successfully", "s3_key": s3_key})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import tracemalloc
+from data.compiled_dataset import CompiledDataset, is_compiled_dataset
+from data.gemini_schema import example_texts, validate_example
+
+_READ_SIZE = 64 * 1024
+_decoder = json.JSONDecoder()
+
+
+def _iter_json_array(file):
+    """
+    Yields (record, size) for each element of a top-level JSON array without
+    loading the whole array into memory.
+    """
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        # Skip whitespace, the opening bracket and separators between elements.
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            buffer = file.read(_READ_SIZE)
+            position = 0
+            eof = not buffer
+        if position >= len(buffer):
+            return
+        if not started:
+            if buffer[position] != "[":
+                raise ValueError("JSON dataset must be an array of examples")
+            started = True
+            position += 1
+            continue
+        if buffer[position] == "]":
+            return
+
+        while True:
+            try:
+                record, end = _decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The element is split across reads; keep the tail and read more.
+                chunk = file.read(_READ_SIZE)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+        yield record, end - position
+        position = end
+        if position > _READ_SIZE:
+            buffer = buffer[position:]
+            position = 0
+
+
+def _iter_jsonl(file):
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line), len(line)
+        except json.JSONDecodeError as e:
+            print(f"Skipping malformed JSON on line {line_number}: {e}")
+
+
+def _iter_compiled(path, start=0, step=1, stats=None):
+    with CompiledDataset(path) as dataset:
+        if stats is not None:
+            stats["records"] = len(dataset)
+        for index in range(start, len(dataset), step):
+            raw = dataset.raw(index)
+            yield json.loads(raw), len(raw)
+
+
+def iter_dataset_records(path):
+    """
+    Lazily yields (record, size) from a JSON-array, JSONL or compiled dataset file.
+    The size is in characters for text files and in bytes for compiled datasets.
+    Text formats are detected from the first non-whitespace character.
+    """
+    if is_compiled_dataset(path):
+        yield from _iter_compiled(path)
+        return
+    with open(path, "r", encoding="utf-8") as file:
+        head = file.read(1)
+        while head and head.isspace():
+            head = file.read(1)
+        file.seek(0)
+        if head == "[":
+            yield from _iter_json_array(file)
+        else:
+            yield from _iter_jsonl(file)
+
+
+def record_to_pair(record):
+    """
+    Extracts (text_input, output) from a record in either supported format.
+
+    Supports the legacy {"text_input", "output"} objects and Gemini
+    systemInstruction/contents records.
+
+    Returns:
+        tuple: (text_input, output), or None if the record is unusable.
+    """
+    if not isinstance(record, dict):
+        return None
+    if "contents" in record:
+        if validate_example(record) is not None:
+            return None
+        return example_texts(record)
+    text_input = record.get("text_input")
+    output = record.get("output")
+    if text_input and output:
+        return text_input, output
+    return None
+
+
+def _iter_shard(path, shard_index, num_shards, stats):
+    if is_compiled_dataset(path):
+        # The index locates each shard's records directly, so other shards are never read.
+        yield from _iter_compiled(path, shard_index, num_shards, stats)
+        return
+    for index, (record, size) in enumerate(iter_dataset_records(path)):
+        stats["records"] += 1
+        if index % num_shards == shard_index:
+            yield record, size
+
+
+def iter_training_pairs(path, shard_index=0, num_shards=1, max_examples=None, max_bytes=None, stats=None):
+    """
+    Lazily yields (text_input, output) pairs from a dataset file.
+
+    Args:
+        path (str): JSON-array, JSONL or compiled dataset file.
+        shard_index (int): Which shard to read, in [0, num_shards).
+        num_shards (int): Split the dataset round-robin into this many shards.
+        max_examples (int, optional): Stop after this many usable examples.
+        max_bytes (int, optional): Stop once this much example text was read.
+        stats (dict, optional): Filled in with 'records', 'examples', 'skipped' and 'bytes'.
+    """
+    if not 0 <= shard_index < num_shards:
+        raise ValueError("shard_index must be in [0, num_shards)")
+    stats = stats if stats is not None else {}
+    stats.update(records=0, examples=0, skipped=0, bytes=0)
+
+    for record, size in _iter_shard(path, shard_index, num_shards, stats):
+        pair = record_to_pair(record)
+        if pair is None:
+            stats["skipped"] += 1
+            continue
+        if max_bytes is not None and stats["bytes"] + size > max_bytes:
+            return
+        stats["bytes"] += size
+        stats["examples"] += 1
+        yield pair
+        if max_examples is not None and stats["examples"] >= max_examples:
+            return
+
+
+def dataset_fingerprint(path, **options):
+    """
+    Hashes the (text_input, output) pairs a dataset file streams, so two files that
+    train on the same examples get the same fingerprint whatever their format.
+
+    Args:
+        path (str): JSON-array, JSONL or compiled dataset file.
+        **options: Sharding and size limits passed to iter_training_pairs().
+
+    Returns:
+        tuple: (sha256_hex, stats) with stats as described in iter_training_pairs().
+    """
+    digest = hashlib.sha256()
+    stats = {}
+    for pair in iter_training_pairs(path, stats=stats, **options):
+        digest.update(json.dumps(pair, ensure_ascii=False).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest(), stats
+
+
+def iter_batches(items, batch_size):
+    """
+    Groups an iterator into lists of at most batch_size items.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_tuning_example_batches(path, example_factory, batch_size=500, stats=None, **options):
+    """
+    Lazily yields lists of tuning examples, converting one batch of pairs at a time.
+
+    Args:
+        path (str): JSON-array, JSONL or compiled dataset file.
+        example_factory (callable): Builds one tuning example from (text_input, output).
+        batch_size (int): How many pairs are converted at a time.
+        stats (dict, optional): Filled in as described in iter_training_pairs().
+        **options: Sharding and size limits passed to iter_training_pairs().
+    """
+    for batch in iter_batches(iter_training_pairs(path, stats=stats, **options), batch_size):
+        yield [example_factory(text_input, output) for text_input, output in batch]
+
+
+def load_tuning_examples(path, example_factory, batch_size=500, report_memory=False, **options):
+    """
+    Streams a dataset file into tuning examples, converting them batch by batch.
+
+    Only the file is streamed: the examples are returned as one list, so memory
+    grows with the number of examples selected. Limit it with the sharding and
+    size options, or use iter_tuning_example_batches() to consume batches directly.
+
+    Args:
+        path (str): JSON-array, JSONL or compiled dataset file.
+        example_factory (callable): Builds one tuning example from (text_input, output).
+        batch_size (int): How many pairs are converted at a time.
+        report_memory (bool): Measure the peak memory allocated while loading.
+        **options: Sharding and size limits passed to iter_training_pairs().
+
+    Returns:
+        tuple: (examples, stats) where stats also holds 'peak_memory_bytes' when measured.
+    """
+    stats = {}
+    if report_memory:
+        tracemalloc.start()
+    try:
+        examples = []
+        for batch in iter_tuning_example_batches(path, example_factory, batch_size, stats=stats, **options):
+            examples.extend(batch)
+    finally:
+        if report_memory:
+            stats["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    stats["file_bytes"] = os.path.getsize(path)
+    return examples, stats
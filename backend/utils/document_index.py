@@ -0,0 +1,115 @@
+import math
+import re
+from collections import Counter
+
+_TOKEN = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+# Very common words carry no signal for lexical retrieval.
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have how i in is it its of on or that the this
+to was were what when where which who why will with you your do does did can
+""".split())
+
+
+def tokenize(text):
+    """
+    Lowercases text and splits it into word tokens, dropping stopwords.
+    """
+    return [token for token in _TOKEN.findall(text.casefold()) if token not in STOPWORDS]
+
+
+def chunk_text(text, chunk_words=120, overlap_words=20):
+    """
+    Splits a document into overlapping chunks of roughly chunk_words words,
+    breaking on sentence boundaries where possible.
+
+    Returns:
+        list[str]: The chunks in document order.
+    """
+    sentences = [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence and sentence.strip()]
+    chunks = []
+    current = []
+    current_words = 0
+    for sentence in sentences:
+        words = sentence.split()
+        # Very long sentences (e.g. OCR output without punctuation) are cut by word count.
+        while len(words) > chunk_words:
+            if current:
+                chunks.append(" ".join(current))
+                current, current_words = [], 0
+            chunks.append(" ".join(words[:chunk_words]))
+            words = words[chunk_words - overlap_words:]
+        if current_words + len(words) > chunk_words and current:
+            chunks.append(" ".join(current))
+            # Carry the tail of the previous chunk over for context.
+            tail = " ".join(current).split()[-overlap_words:] if overlap_words else []
+            current, current_words = ([" ".join(tail)], len(tail)) if tail else ([], 0)
+        current.append(" ".join(words))
+        current_words += len(words)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class BM25Index:
+    """
+    An Okapi BM25 index over the chunks of one document, built once at ingest time.
+    """
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self._term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+        self._lengths = [sum(freqs.values()) for freqs in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        document_freqs = Counter()
+        for freqs in self._term_freqs:
+            document_freqs.update(freqs.keys())
+        count = len(chunks)
+        self._idf = {
+            term: math.log(1 + (count - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_freqs.items()
+        }
+        # Postings let a query touch only the chunks that contain its terms.
+        self._postings = {}
+        for position, freqs in enumerate(self._term_freqs):
+            for term in freqs:
+                self._postings.setdefault(term, []).append(position)
+
+    def search(self, query, k=3):
+        """
+        Returns up to k (chunk_index, score) pairs, best first.
+        """
+        scores = Counter()
+        k1, b, avg_length = self.k1, self.b, self._avg_length or 1.0
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for position in self._postings[term]:
+                freq = self._term_freqs[position][term]
+                norm = k1 * (1 - b + b * self._lengths[position] / avg_length)
+                scores[position] += idf * freq * (k1 + 1) / (freq + norm)
+        return scores.most_common(k)
+
+
+class IndexedDocument:
+    """A stored document together with its chunk index."""
+
+    def __init__(self, key, text, chunk_words=120, overlap_words=20, tokens=None):
+        self.key = key
+        self.text = text
+        # Token count of the whole text, counted once at ingestion rather than per question.
+        self.tokens = tokens
+        self.index = BM25Index(chunk_text(text, chunk_words, overlap_words))
+
+    def top_chunks(self, query, k=3):
+        """
+        Returns the k most relevant chunks for a query, in document order.
+        Falls back to the opening chunks when nothing in the document matches.
+        """
+        hits = self.index.search(query, k)
+        positions = sorted(position for position, _ in hits) or list(range(min(k, len(self.index.chunks))))
+        return [self.index.chunks[position] for position in positions]
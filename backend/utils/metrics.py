@@ -0,0 +1,337 @@
+"""
+A small, thread-safe metrics registry rendered in the Prometheus text exposition format.
+
+Counters, gauges and histograms keep one child per label combination. Recording
+a value is a dict lookup plus an increment under a per-child lock, and
+cumulative bucket counts are only computed when /metrics is scraped.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers fast control-plane routes up to slow model calls.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """
+        Returns the child for one combination of label values, creating it on first use.
+        """
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._samples():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """A monotonically increasing count."""
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+def _fixed_value(value):
+    child = _GaugeChild()
+    child.value = value
+    return child
+
+
+class Gauge(_Metric):
+    """
+    A value that can go up and down.
+
+    With a callback, the value is read when the metrics are rendered. The
+    callback returns a number, or a dict of label-value tuples to numbers.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self._callback = callback
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def _samples(self):
+        if self._callback is None:
+            return super()._samples()
+        try:
+            value = self._callback()
+        except Exception:
+            return []
+        if isinstance(value, dict):
+            return [(tuple(str(v) for v in key), _fixed_value(number)) for key, number in value.items()]
+        return [((), _fixed_value(value))]
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("counts", "sum", "_upper_bounds", "_lock")
+
+    def __init__(self, upper_bounds):
+        self._upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    """Counts observations into fixed buckets, plus their sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds the metrics of the process and renders them for /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+http_requests = metrics_registry.counter(
+    "http_requests_total", "HTTP requests by blueprint, route, method and status.",
+    ("blueprint", "route", "method", "status"))
+http_request_duration = metrics_registry.histogram(
+    "http_request_duration_seconds", "Time until the response headers were ready, by route.",
+    ("blueprint", "route", "method"))
+upstream_duration = metrics_registry.histogram(
+    "upstream_request_duration_seconds", "Latency of calls to Vertex AI, S3 and Textract.",
+    ("service", "operation"))
+chat_tokens = metrics_registry.histogram(
+    "chat_tokens", "Approximate token usage of chat calls by part: prompt, history, input (total) and response.",
+    ("kind",), TOKEN_BUCKETS)
+socketio_emits = metrics_registry.counter(
+    "socketio_emits_total", "Socket.IO events emitted by the server.", ("event",))
+errors = metrics_registry.counter(
+    "errors_total", "Errors by where they happened and their type.", ("source", "type"))
+
+
+def record_error(source, error):
+    """
+    Counts an error under its source (e.g. 'vertex', 's3', 'http') and exception type.
+    """
+    errors.labels(source, error if isinstance(error, str) else type(error).__name__).inc()
+
+
+@contextmanager
+def track_upstream(service, operation):
+    """
+    Times a call to an upstream service and counts it as an error if it raises.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_error(service, e)
+        raise
+    finally:
+        upstream_duration.labels(service, operation).observe(time.perf_counter() - started)
+
+
+def instrument_boto_client(client, service):
+    """
+    Times every API call a boto3 client makes through botocore's event hooks.
+
+    botocore only emits after-call-error for transport exceptions. Error responses
+    (4xx/5xx, raised afterwards as ClientError) go through after-call, so they are
+    counted there by their error code.
+    """
+    def before_call(model, context, **kwargs):
+        context["metrics_started"] = time.perf_counter()
+
+    def after_call(model, context, http_response=None, parsed=None, **kwargs):
+        started = context.get("metrics_started")
+        if started is not None:
+            upstream_duration.labels(service, model.name).observe(time.perf_counter() - started)
+        status = getattr(http_response, "status_code", None)
+        if status is not None and status >= 300:
+            record_error(service, (parsed or {}).get("Error", {}).get("Code") or f"HTTP{status}")
+
+    def after_call_error(model, context, exception=None, **kwargs):
+        after_call(model, context)
+        record_error(service, exception or "Error")
+
+    events = client.meta.events
+    events.register("before-call", before_call)
+    events.register("after-call", after_call)
+    events.register("after-call-error", after_call_error)
+    return client
+
+
+def instrument_app(app):
+    """
+    Records request counts and latencies per route and counts unhandled exceptions.
+
+    An unhandled exception is counted once, by its type; the 500 response it turns
+    into is not counted again.
+    """
+    from flask import g, got_request_exception, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("metrics_started", None)
+        rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        blueprint = request.blueprint or "app"
+        http_requests.labels(blueprint, rule, request.method, response.status_code).inc()
+        if started is not None:
+            http_request_duration.labels(blueprint, rule, request.method).observe(time.perf_counter() - started)
+        if response.status_code >= 500 and not g.pop("metrics_exception_recorded", False):
+            record_error("http", f"HTTP{response.status_code}")
+        return response
+
+    def _record_exception(sender, exception, **extra):
+        record_error("http", exception)
+        g.metrics_exception_recorded = True
+
+    # weak=False keeps the handler alive; the app holds no other reference to it.
+    got_request_exception.connect(_record_exception, app, weak=False)
+    return app
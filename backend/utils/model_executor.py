@@ -0,0 +1,421 @@
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorBusy(Exception):
+    """
+    Raised when a model call is turned away to protect the server.
+
+    status is 429 when the wait queue is full and 503 when the call waited in the
+    queue for longer than queue_timeout; retry_after is the suggested delay in seconds.
+    """
+
+    def __init__(self, message, retry_after, status=429):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+
+class ModelCallTimeout(Exception):
+    """Raised when a running model call takes longer than call_timeout."""
+
+
+class _Task:
+    __slots__ = ("enqueued", "started", "cancelled", "finished")
+
+    def __init__(self, enqueued):
+        self.enqueued = enqueued
+        self.started = None
+        self.cancelled = False
+        # Set by the worker when the call has finished, to wake the waiting caller.
+        self.finished = threading.Event()
+
+
+_DONE = object()
+
+
+class ModelExecutor:
+    """
+    Runs blocking model calls on a dedicated, size-bounded thread pool.
+
+    At most max_workers calls run at once and at most max_queue more wait for a
+    worker; anything beyond that is rejected right away with ExecutorBusy instead
+    of tying up a request worker. Workers signal an event as soon as a result or
+    a streamed item is ready, and callers block on it with the injected wait
+    (see _cooperative_wait), so a result is picked up without polling delay while
+    other requests and Socket.IO heartbeats keep running.
+
+    Calls still queued after queue_timeout are cancelled. A running call cannot be
+    interrupted from outside its thread, so after call_timeout the caller stops
+    waiting and the result is discarded when the call returns; until then it keeps
+    counting against the pool, which keeps the number of threads bounded.
+    """
+
+    def __init__(self, max_workers=4, max_queue=16, queue_timeout=30.0, call_timeout=60.0, wait=None,
+                 poll_interval=0.01, max_wait=1.0, clock=time.monotonic, history=1000):
+        """
+        Args:
+            wait (callable, optional): (event, timeout) -> None; blocks until the
+                threading.Event is set or timeout seconds pass. Defaults to event.wait.
+            poll_interval (float): First delay before retrying admission when map_unordered finds the executor full.
+            max_wait (float): Longest single wait, so timeouts are checked at least this often.
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self._wait = wait or (lambda event, timeout: event.wait(timeout))
+        self._poll_interval = poll_interval
+        self._max_wait = max_wait
+        self._clock = clock
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-call")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._wait_ms = deque(maxlen=history)
+        self._run_ms = deque(maxlen=history)
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0,
+                          "queue_timeouts": 0, "call_timeouts": 0}
+
+    @classmethod
+    def from_env(cls, wait=None):
+        """
+        Builds an executor sized from the MODEL_* environment variables.
+        """
+        return cls(
+            max_workers=int(os.getenv("MODEL_MAX_WORKERS", "4")),
+            max_queue=int(os.getenv("MODEL_MAX_QUEUE", "16")),
+            queue_timeout=float(os.getenv("MODEL_QUEUE_TIMEOUT", "30")),
+            call_timeout=float(os.getenv("MODEL_CALL_TIMEOUT", "60")),
+            wait=wait,
+        )
+
+    def retry_after(self):
+        """
+        Estimates in whole seconds when a rejected caller should try again:
+        the queued work divided over the workers, at the recent mean call time.
+        """
+        with self._lock:
+            mean_run = (sum(self._run_ms) / len(self._run_ms) / 1000) if self._run_ms else 1.0
+            backlog = max(self._pending - self.max_workers, 0) + 1
+        return max(1, math.ceil(mean_run * backlog / self.max_workers))
+
+    def _admit(self):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._counters["rejected"] += 1
+                admitted = False
+            else:
+                self._pending += 1
+                self._counters["submitted"] += 1
+                admitted = True
+        if not admitted:
+            raise ExecutorBusy("Too many model requests are waiting; try again later.", self.retry_after(), 429)
+
+    def _execute(self, task, fn, args, kwargs):
+        with self._lock:
+            if task.cancelled:
+                self._pending -= 1
+                return None
+            task.started = self._clock()
+            self._running += 1
+            self._wait_ms.append((task.started - task.enqueued) * 1000)
+        outcome = "failed"
+        try:
+            result = fn(*args, **kwargs)
+            outcome = "completed"
+            return result
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._pending -= 1
+                self._counters[outcome] += 1
+                self._run_ms.append((self._clock() - task.started) * 1000)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues fn(*args, **kwargs) without waiting for it.
+
+        Returns:
+            tuple: (future, task) to pass to wait().
+
+        Raises:
+            ExecutorBusy: When the wait queue is full.
+        """
+        self._admit()
+        task = _Task(self._clock())
+        future = self._pool.submit(self._execute, task, fn, args, kwargs)
+        future.add_done_callback(lambda _: task.finished.set())
+        return future, task
+
+    def _cancel_if_queued(self, task):
+        # The task is dropped by its worker if it has not started yet.
+        with self._lock:
+            if task.started is None:
+                task.cancelled = True
+                self._counters["queue_timeouts"] += 1
+                return True
+            return False
+
+    def _check_timeouts(self, task, call_timeout, since=None):
+        """
+        Raises ExecutorBusy for a call queued longer than queue_timeout (cancelling it)
+        and ModelCallTimeout for one running longer than call_timeout.
+        The call timeout counts from since, when given, rather than from the start of the call.
+        """
+        now = self._clock()
+        started = task.started
+        if started is None and now - task.enqueued > self.queue_timeout:
+            if self._cancel_if_queued(task):
+                raise ExecutorBusy("The model is busy; the request waited too long in the queue.",
+                                   self.retry_after(), 503)
+        elif started is not None and call_timeout is not None and now - max(started, since or started) > call_timeout:
+            with self._lock:
+                self._counters["call_timeouts"] += 1
+            raise ModelCallTimeout(f"The model call did not finish within {call_timeout}s")
+
+    def _until_timeout(self, task, call_timeout, since=None):
+        # Seconds until _check_timeouts could next raise for this task, bounded by max_wait.
+        now = self._clock()
+        if task.started is None:
+            remaining = self.queue_timeout - (now - task.enqueued)
+        elif call_timeout is not None:
+            remaining = call_timeout - (now - max(task.started, since or task.started))
+        else:
+            remaining = self._max_wait
+        return min(max(remaining, 0.001), self._max_wait)
+
+    def _wait_for(self, event, task, call_timeout, since=None):
+        """
+        Blocks until the event is set, enforcing the queue and call timeouts.
+        """
+        while not event.is_set():
+            self._check_timeouts(task, call_timeout, since)
+            self._wait(event, self._until_timeout(task, call_timeout, since))
+
+    def wait(self, submitted, timeout=None):
+        """
+        Waits for a submitted call and returns its result or raises its exception.
+
+        Args:
+            submitted (tuple): What submit() returned.
+            timeout (float, optional): Overrides call_timeout for this call.
+        """
+        future, task = submitted
+        self._wait_for(task.finished, task, self.call_timeout if timeout is None else timeout)
+        return future.result()
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """
+        Runs fn(*args, **kwargs) on the pool and waits for the result.
+        """
+        return self.wait(self.submit(fn, *args, **kwargs), timeout)
+
+    def stream(self, fn, *args, timeout=None, **kwargs):
+        """
+        Runs the generator function fn(*args, **kwargs) on the pool.
+
+        The call is admitted (or rejected with ExecutorBusy) before this returns.
+        The returned iterator yields the items as the worker produces them;
+        timeout bounds the wait for each item. Closing the iterator, or dropping
+        it without iterating, stops the worker and closes fn's generator.
+        """
+        items = queue.Queue()
+        arrived = threading.Event()
+        stopped = threading.Event()
+
+        def put(item):
+            items.put(item)
+            arrived.set()
+
+        def produce():
+            generator = None
+            try:
+                if stopped.is_set():
+                    return
+                generator = fn(*args, **kwargs)
+                for item in generator:
+                    if stopped.is_set():
+                        break
+                    put(item)
+            except BaseException as e:
+                put(e)
+            finally:
+                try:
+                    close = getattr(generator, "close", None)
+                    if close is not None:
+                        close()
+                finally:
+                    put(_DONE)
+
+        _, task = self.submit(produce)
+        return _ItemStream(self, items, arrived, stopped, task, self.call_timeout if timeout is None else timeout)
+
+    def _next_item(self, items, arrived, task, timeout, since):
+        while True:
+            # Cleared before looking, so an item put after the look always wakes the wait.
+            arrived.clear()
+            try:
+                return items.get_nowait()
+            except queue.Empty:
+                pass
+            self._check_timeouts(task, timeout, since)
+            self._wait(arrived, self._until_timeout(task, timeout, since))
+
+    def map_unordered(self, fn, items, max_concurrency=None, timeout=None):
+        """
+        Runs fn(item) for every item with at most max_concurrency calls in flight.
+
+        Results are yielded as the calls finish, not in input order. An item that
+        finds the executor full waits for room, up to queue_timeout, instead of
+        failing straight away.
+
+        Yields:
+            tuple: (item, result, error) where error is None on success.
+        """
+        limit = max(1, min(max_concurrency or self.max_workers, self.max_workers + self.max_queue))
+        call_timeout = self.call_timeout if timeout is None else timeout
+        items = iter(items)
+        next_item = next(items, _DONE)
+        blocked_since = None
+        in_flight = []
+        interval = self._poll_interval
+        finished_any = threading.Event()
+        while in_flight or next_item is not _DONE:
+            while next_item is not _DONE and len(in_flight) < limit:
+                try:
+                    future, task = self.submit(fn, next_item)
+                except ExecutorBusy as e:
+                    blocked_since = blocked_since or self._clock()
+                    if self._clock() - blocked_since > self.queue_timeout:
+                        yield next_item, None, e
+                        next_item, blocked_since = next(items, _DONE), None
+                        continue
+                    break
+                future.add_done_callback(lambda _: finished_any.set())
+                in_flight.append((next_item, future, task))
+                next_item, blocked_since = next(items, _DONE), None
+
+            # Cleared before looking, so a call finishing after the look always wakes the wait.
+            finished_any.clear()
+            finished = []
+            for entry in in_flight:
+                item, future, task = entry
+                if future.done():
+                    finished.append(entry)
+                    error = future.exception()
+                    yield item, (None if error else future.result()), error
+                    continue
+                try:
+                    self._check_timeouts(task, call_timeout)
+                except (ExecutorBusy, ModelCallTimeout) as e:
+                    finished.append(entry)
+                    yield item, None, e
+            if finished:
+                in_flight = [entry for entry in in_flight if entry not in finished]
+                interval = self._poll_interval
+            elif in_flight or next_item is not _DONE:
+                # Woken by the next call to finish; when the executor is full of other
+                # callers' work, admission is retried with backoff.
+                delay = min((self._until_timeout(task, call_timeout) for _, _, task in in_flight), default=self._max_wait)
+                if next_item is not _DONE and len(in_flight) < limit:
+                    delay = min(delay, interval)
+                    interval = min(interval * 2, 0.05)
+                self._wait(finished_any, delay)
+
+    def shutdown(self, wait=True):
+        """
+        Stops the worker threads once the calls already submitted have finished.
+        """
+        self._pool.shutdown(wait=wait)
+
+    def stats(self):
+        """
+        Returns the pool size, queue depth, counters and recent wait/run times.
+        """
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                **self._counters,
+                "wait_ms": _summary(self._wait_ms),
+                "run_ms": _summary(self._run_ms),
+            }
+
+
+def _summary(samples):
+    if not samples:
+        return {"mean": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    return {
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p95": round(ordered[max(int(len(ordered) * 0.95) - 1, 0)], 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+class _ItemStream:
+    """
+    Iterates over the items a stream() worker produces.
+
+    Closing it stops the worker. So does dropping it, even if it was never
+    iterated, which a plain generator's finally block could not guarantee.
+    """
+
+    def __init__(self, executor, items, arrived, stopped, task, timeout):
+        self._executor = executor
+        self._items = items
+        self._arrived = arrived
+        self._stopped = stopped
+        self._task = task
+        self._timeout = timeout
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._stopped.is_set():
+            raise StopIteration
+        try:
+            # Each item restarts the call timeout, so it bounds the gap between chunks.
+            item = self._executor._next_item(self._items, self._arrived, self._task, self._timeout,
+                                             self._executor._clock())
+        except BaseException:
+            self.close()
+            raise
+        if item is _DONE:
+            self.close()
+            raise StopIteration
+        if isinstance(item, BaseException):
+            self.close()
+            raise item
+        return item
+
+    def close(self):
+        self._stopped.set()
+
+    def __del__(self):
+        self._stopped.set()
+
+
+def _cooperative_wait(event, timeout):
+    # Blocks until a worker sets the event. Once the Socket.IO server is set up under
+    # eventlet, the blocking wait runs on eventlet's native thread pool, which wakes
+    # this green thread as soon as the event is set and lets the hub serve others meanwhile.
+    # Socket.IO is imported here so offline scripts using the executor don't load Flask.
+    from model.socketio_instance import socketio
+    if socketio.server is not None and socketio.async_mode == "eventlet":
+        from eventlet import tpool
+        tpool.execute(event.wait, timeout)
+    else:
+        event.wait(timeout)
+
+
+model_executor = ModelExecutor.from_env(wait=_cooperative_wait)
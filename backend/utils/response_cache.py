@@ -0,0 +1,179 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt):
+    """
+    Normalizes a question so trivially different spellings share a cache entry.
+    Case, surrounding whitespace, repeated spaces and trailing punctuation are ignored.
+    """
+    return _WHITESPACE.sub(" ", prompt).strip().rstrip("?!.").strip().casefold()
+
+
+class _Flight:
+    """An upstream call that other callers with the same key are waiting on."""
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    A thread-safe TTL + LRU cache for model answers with request coalescing.
+
+    Concurrent misses for the same key are collapsed into one upstream call:
+    the first caller computes the answer and the others wait for its result.
+    """
+
+    def __init__(self, max_entries=512, ttl=3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0}
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a cache sized from the RESPONSE_CACHE_* environment variables.
+        """
+        return cls(
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512")),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+        )
+
+    @staticmethod
+    def make_key(prompt, context, endpoint, history=()):
+        """
+        Builds the cache key for a question asked against a document context, model
+        endpoint and conversation history. A follow-up such as "and the second one?"
+        means something else in every conversation, so the history is part of the key.
+
+        Args:
+            prompt (str): The user's question.
+            context (str): The document context sent along with the question.
+            endpoint (str): The model endpoint answering the question.
+            history (list, optional): The session's earlier turns, with .role and .text.
+
+        Returns:
+            str: A hex digest identifying the request.
+        """
+        context_hash = hashlib.sha256((context or "").encode("utf-8")).hexdigest()
+        history_hash = hashlib.sha256()
+        for turn in history:
+            history_hash.update(f"{turn.role}\x1e{turn.text}\x1f".encode("utf-8"))
+        material = "\x1f".join((normalize_prompt(prompt), context_hash, history_hash.hexdigest(), endpoint))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached value for a key, or None if it is missing or expired.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            self._counters["hits" if value is not None else "misses"] += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores a value, evicting the least recently used entries beyond max_entries.
+        """
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached value for a key, computing it at most once across threads.
+
+        Args:
+            key (str): The cache key.
+            compute (callable): Produces the value on a miss.
+
+        Returns:
+            tuple: (value, status) where status is 'hit', 'miss' or 'coalesced'.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self._counters["hits"] += 1
+                return value, "hit"
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _Flight()
+                self._counters["misses"] += 1
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, "coalesced"
+
+        try:
+            flight.value = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._store(key, flight.value)
+                self._in_flight.pop(key, None)
+            flight.done.set()
+        return flight.value, "miss"
+
+    def clear(self):
+        """
+        Drops every cached answer, e.g. after the tuned model changed.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the hit/miss/coalesce counters and the current size.
+        """
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"] + self._counters["coalesced"]
+            return dict(
+                self._counters,
+                entries=len(self._entries),
+                in_flight=len(self._in_flight),
+                hit_rate=(self._counters["hits"] / lookups) if lookups else 0.0,
+            )
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self._counters["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        self._entries[key] = (value, self._clock() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+
+# Shared cache used by the chat endpoints
+response_cache = ResponseCache.from_env()
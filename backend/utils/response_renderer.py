@@ -0,0 +1,206 @@
+"""
+Renders model responses incrementally as they stream in.
+
+A StreamingRenderer turns response chunks (or plain text pieces) into escaped
+HTML, Markdown or plain text deltas. Only the new input is processed for each
+chunk, so rendering a response costs time proportional to its length, and the
+deltas concatenate to the rendering of the whole response.
+
+Inline images larger than inline_image_limit bytes are handed to store_image,
+which uploads them and returns a URL, instead of being embedded as data URIs.
+"""
+import base64
+import html
+import os
+
+FORMATS = ("text", "html", "markdown")
+INLINE_IMAGE_LIMIT = int(os.getenv("RESPONSE_INLINE_IMAGE_BYTES", str(16 * 1024)))
+
+
+def parse_format(value, default="text"):
+    """
+    Validates a requested response format.
+
+    Raises:
+        ValueError: If the format is not one of FORMATS.
+    """
+    value = value or default
+    if value not in FORMATS:
+        raise ValueError(f"Unknown response format {value!r}; expected one of {', '.join(FORMATS)}")
+    return value
+
+
+def _field(obj, name):
+    # SDK parts raise instead of returning None for fields they do not carry.
+    try:
+        return getattr(obj, name, None)
+    except (AttributeError, ValueError):
+        return None
+
+
+class StreamingRenderer:
+    """
+    Keeps the state needed to render a response one chunk at a time.
+
+    Text is rendered as it arrives; in HTML, paragraphs are separated by blank
+    lines and single newlines become <br/>. A newline at the end of a chunk is
+    held back until the next chunk shows whether it starts a new paragraph.
+    Code, code execution results and images are rendered as separate blocks.
+    """
+
+    def __init__(self, format="html", store_image=None, inline_image_limit=INLINE_IMAGE_LIMIT):
+        self.format = parse_format(format)
+        self.inline_image_limit = inline_image_limit
+        self._store_image = store_image
+        self._in_paragraph = False
+        self._newlines = 0
+        self._blocks = 0
+        self.images_offloaded = 0
+
+    def feed(self, chunk):
+        """
+        Renders a response chunk: a string, an object with .text, or a response
+        with candidates[0].content.parts.
+
+        Returns:
+            str: The markup added by this chunk.
+        """
+        if isinstance(chunk, str):
+            return self.feed_text(chunk)
+        candidates = _field(chunk, "candidates")
+        if candidates:
+            content = _field(candidates[0], "content")
+            return "".join(self.feed_part(part) for part in (_field(content, "parts") or ()))
+        return self.feed_text(_field(chunk, "text") or "")
+
+    def feed_part(self, part):
+        """
+        Renders one content part: text, executable code, a code execution result or inline data.
+        """
+        out = []
+        text = _field(part, "text")
+        if text:
+            out.append(self.feed_text(text))
+        code = _field(_field(part, "executable_code"), "code")
+        if code and code.strip():
+            out.append(self._code_block(code.strip(), "python"))
+        output = _field(_field(part, "code_execution_result"), "output")
+        if output and output.strip():
+            out.append(self._code_block(output.strip(), ""))
+        inline_data = _field(part, "inline_data")
+        data = _field(inline_data, "data")
+        if data:
+            out.append(self._image(data, _field(inline_data, "mime_type") or "image/png"))
+        return "".join(out)
+
+    def feed_text(self, text):
+        if not text:
+            return ""
+        if self.format != "html":
+            if self._in_paragraph:
+                return text
+            prefix = self._end_paragraph()
+            self._in_paragraph = True
+            return prefix + text.lstrip("\n")
+        out = []
+        for index, line in enumerate(text.split("\n")):
+            if index:
+                self._newlines += 1
+            if not line:
+                continue
+            if not self._in_paragraph:
+                # Newlines before the first words of a block are dropped.
+                out.append("<hr/><p>" if self._blocks else "<p>")
+                self._in_paragraph = True
+                self._blocks += 1
+            elif self._newlines >= 2:
+                out.append("</p><p>")
+            elif self._newlines:
+                out.append("<br/>")
+            self._newlines = 0
+            out.append(html.escape(line, quote=False))
+        return "".join(out)
+
+    def close(self):
+        """
+        Returns the markup that ends the response, such as a closing </p>.
+        """
+        tail = "</p>" if self.format == "html" and self._in_paragraph else ""
+        self._in_paragraph = False
+        self._newlines = 0
+        return tail
+
+    def _end_paragraph(self):
+        closing = self.close()
+        separator = ""
+        if self._blocks:
+            separator = {"html": "<hr/>", "markdown": "\n\n", "text": "\n"}[self.format]
+        self._blocks += 1
+        return closing + separator
+
+    def _code_block(self, code, language):
+        prefix = self._end_paragraph()
+        if self.format == "html":
+            return f"{prefix}<pre>{html.escape(code, quote=False)}</pre>"
+        if self.format == "markdown":
+            return f"{prefix}```{language}\n{code}\n```"
+        return prefix + code
+
+    def _image(self, data, mime_type):
+        source = self._image_source(data, mime_type)
+        if source is None:
+            return ""
+        prefix = self._end_paragraph()
+        if self.format == "html":
+            return f'{prefix}<img src="{html.escape(source)}" alt="Image result"/>'
+        if self.format == "markdown":
+            return f"{prefix}![Image result]({source})"
+        return prefix + source
+
+    def _image_source(self, data, mime_type):
+        # Parts carry raw bytes; a string is taken to be base64 already.
+        raw = data if isinstance(data, (bytes, bytearray)) else None
+        encoded = None if raw is not None else data.strip()
+        size = len(raw) if raw is not None else len(encoded) * 3 // 4
+        if not size or encoded in ("b''", '""'):
+            return None
+        if self._store_image is not None and size > self.inline_image_limit:
+            try:
+                url = self._store_image(bytes(raw) if raw is not None else base64.b64decode(encoded), mime_type)
+                self.images_offloaded += 1
+                return url
+            except Exception as e:
+                print(f"Could not offload response image, embedding it instead: {e}")
+        if encoded is None:
+            encoded = base64.b64encode(raw).decode("ascii")
+        return f"data:{mime_type};base64,{encoded}"
+
+
+def render_stream(chunks, format="html", store_image=None):
+    """
+    Renders a stream of chunks, yielding each non-empty delta.
+
+    Closing the returned generator also closes the source stream.
+    """
+    renderer = StreamingRenderer(format, store_image)
+    try:
+        for chunk in chunks:
+            delta = renderer.feed(chunk)
+            if delta:
+                yield delta
+        tail = renderer.close()
+        if tail:
+            yield tail
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def render_response(response, format="html", store_image=None):
+    """
+    Renders a complete response (or a list of chunks) in one call.
+    """
+    renderer = StreamingRenderer(format, store_image)
+    chunks = response if isinstance(response, (list, tuple)) else [response]
+    return "".join(renderer.feed(chunk) for chunk in chunks) + renderer.close()
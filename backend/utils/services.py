@@ -1,61 +1,68 @@
 import os
 import json
-import google.generativeai as genai
-from google.generativeai import types
-from vertexai.generative_models import GenerativeModel
-from vertexai.generative_models import Content, Part
-import vertexai
-
-def display_chatbot_execution_result(response):
-    html_parts = []
-    for part in response.candidates[0].content.parts:
-        part_content = ""
-        # Add text if present and non-empty.
-        if part.text and part.text.strip():
-            part_content += f"<p>{part.text.strip()}</p>"
-        # Add executable code if present and non-empty.
-        if part.executable_code and part.executable_code.code and part.executable_code.code.strip():
-            part_content += f"<pre>{part.executable_code.code.strip()}</pre>"
-        # Add code execution result if present and non-empty.
-        if part.code_execution_result and part.code_execution_result.output and part.code_execution_result.output.strip():
-            part_content += f"<pre>{part.code_execution_result.output.strip()}</pre>"
-        # Add inline image if there is valid base64 data.
-        if part.inline_data and part.inline_data.data:
-            inline_data = part.inline_data.data
-            if isinstance(inline_data, bytes):
-                inline_data = inline_data.decode("utf-8")
-            # Only add image if the data is not just empty or a placeholder.
-            if inline_data.strip() and inline_data.strip() != "b''":
-                part_content += f'<img src="data:image/png;base64,{inline_data.strip()}" alt="Image result"/>'
-        # Only add the part if there's any content.
-        if part_content:
-            html_parts.append(part_content)
-    # Join all parts with an <hr/> separator.
-    return "<hr/>".join(html_parts)
-
-def load_training_dataset():
-    file_path = os.path.join(os.path.dirname(__file__), "../data/dataset.json")
+import threading
+from model.vertex_model_registry import VertexModelRegistry
+from model.conversation_store import conversation_store
+from model.context_window import context_window
+from model.tuning_job_registry import tuning_fingerprint
+from utils.response_cache import response_cache
+from utils.dataset_loader import dataset_fingerprint, load_tuning_examples
+from utils.metrics import chat_tokens, track_upstream
+from utils.response_renderer import render_response
+from utils.aws_services import upload_response_media
+from data.token_counting import ApproximateTokenCounter
+
+def display_chatbot_execution_result(response, format="html", store_image=upload_response_media):
+    """
+    Renders every part of a model response (text, code, code execution results
+    and images) as escaped HTML or Markdown. Large images are uploaded to S3 and
+    linked instead of being embedded.
+    """
+    return render_response(response, format, store_image)
+
+DEFAULT_TRAINING_DATASET_PATH = os.path.join(os.path.dirname(__file__), "../data/filtered-training-dataset.jsonl")
+
+def load_training_dataset(path=None, shard_index=0, num_shards=1, max_examples=None, max_bytes=None, report_memory=False):
+    """
+    Streams a JSON-array, Gemini-format JSONL or compiled dataset into a tuning dataset.
+
+    Records are parsed lazily and converted to TuningExample objects in batches,
+    so the raw file contents are never held in memory at once. The examples
+    themselves are: the Gemini API takes them inline, in one request, so every
+    selected example is kept until the job is submitted. Bound that with the
+    shard, max_examples and max_bytes options; uploading a file and passing its
+    URI instead is only supported by Vertex AI clients, not the API-key client.
+
+    Args:
+        path (str, optional): Dataset file; defaults to TRAINING_DATASET_PATH or the filtered training set.
+        shard_index (int): Which round-robin shard of the dataset to load.
+        num_shards (int): How many shards the dataset is split into.
+        max_examples (int, optional): Stop after this many examples.
+        max_bytes (int, optional): Stop once this much example text was read.
+        report_memory (bool): Print the peak memory used while loading.
+    """
+    from google.genai import types
+
+    file_path = path or os.getenv("TRAINING_DATASET_PATH", DEFAULT_TRAINING_DATASET_PATH)
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)  # load entire JSON array
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        examples, stats = load_tuning_examples(
+            file_path,
+            lambda text_input, output: types.TuningExample(text_input=text_input, output=output),
+            report_memory=report_memory,
+            shard_index=shard_index,
+            num_shards=num_shards,
+            max_examples=max_examples,
+            max_bytes=max_bytes,
+        )
+    except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
         print(f"Error loading dataset: {e}")
         return None
 
-    # Build the list of examples from the JSON array
-    examples = []
-    for item in data:
-        text_input = item.get("text_input")
-        output = item.get("output")
-        if text_input and output:
-            examples.append(
-                types.TuningExample(
-                    text_input=text_input,
-                    output=output,
-                )
-            )
-        else:
-            print(f"Skipping item due to missing keys: {item}")
+    if stats["skipped"]:
+        print(f"Skipped {stats['skipped']} records with missing or invalid fields.")
+    if report_memory:
+        print(f"Loaded {stats['examples']} examples from {file_path} "
+              f"(peak memory {stats['peak_memory_bytes'] / 1024 / 1024:.1f} MiB)")
 
     # Check if we have at least one example
     if not examples:
@@ -65,61 +72,288 @@ def load_training_dataset():
     return training_dataset
 
 
-def create_finetuning_job():
+_tuning_clients = {}
+_tuning_clients_lock = threading.Lock()
+
+def get_tuning_client():
+    """
+    Returns a client for the tuning API, configured from the environment.
+    The client is built on first use and shared until the API key changes.
+    """
+    # Get Gemini API from enviroment
+    api_key = os.getenv("GEMINI_API_KEY")
+    client = _tuning_clients.get(api_key)
+    if client is None:
+        with _tuning_clients_lock:
+            client = _tuning_clients.get(api_key)
+            if client is None:
+                # The SDK is slow to import, so it is loaded the first time a client is needed.
+                from google import genai
+                client = _tuning_clients[api_key] = genai.Client(api_key=api_key)
+    return client
+
+# Tuning settings a request may override, with their types and defaults.
+TUNING_PARAMETERS = {
+    "base_model": (str, lambda: os.getenv("TUNING_BASE_MODEL", "models/gemini-1.5-flash-001-tuning")),
+    "epoch_count": (int, lambda: int(os.getenv("TUNING_EPOCH_COUNT", "1"))),
+    "batch_size": (int, lambda: int(os.getenv("TUNING_BATCH_SIZE", "4"))),
+    "learning_rate": (float, lambda: float(os.getenv("TUNING_LEARNING_RATE", "1"))),
+    "display_name": (str, lambda: os.getenv("TUNING_DISPLAY_NAME", "Fine Tuned LIU ChatBot Model")),
+}
+# Dataset options a request may override; they change which examples are streamed.
+TUNING_DATASET_OPTIONS = ("shard_index", "num_shards", "max_examples")
+
+def tuning_config(overrides=None):
+    """
+    Resolves the tuning settings: environment defaults, then per-request overrides.
+
+    Args:
+        overrides (dict, optional): Values for keys of TUNING_PARAMETERS or TUNING_DATASET_OPTIONS.
+
+    Returns:
+        tuple: (config, dataset_options)
+
+    Raises:
+        ValueError: If an override is unknown or has the wrong type or range.
+    """
+    overrides = dict(overrides or {})
+    unknown = set(overrides) - set(TUNING_PARAMETERS) - set(TUNING_DATASET_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown tuning parameters: {', '.join(sorted(unknown))}")
+
+    config = {}
+    for key, (kind, default) in TUNING_PARAMETERS.items():
+        value = overrides.get(key)
+        if value is None:
+            config[key] = default()
+            continue
+        if kind is str and not (isinstance(value, str) and value.strip()):
+            raise ValueError(f"{key} must be a non-empty string")
+        if kind is not str:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or (kind is int and value != int(value)):
+                raise ValueError(f"{key} must be a {kind.__name__}")
+            if value <= 0:
+                raise ValueError(f"{key} must be positive")
+        config[key] = kind(value)
+
+    dataset_options = {}
+    for key in TUNING_DATASET_OPTIONS:
+        value = overrides.get(key)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"{key} must be a non-negative integer")
+        dataset_options[key] = value
+    return config, dataset_options
+
+def prepare_tuning_job(overrides=None, dataset_path=None, service=None):
+    """
+    Resolves the settings of a tuning request and fingerprints it.
+
+    The dataset is streamed once to hash the examples it would train on, so the
+    same examples and settings on the same service always give the same fingerprint.
+
+    Args:
+        overrides (dict, optional): Per-request tuning settings (see tuning_config).
+        dataset_path (str, optional): Training dataset; defaults to TRAINING_DATASET_PATH.
+        service (str, optional): Name of the tuning service; defaults to the one TUNING_SERVICE selects.
+
+    Returns:
+        dict: The 'fingerprint', the 'service', the resolved 'config' and the 'dataset' path, options and hash.
+    """
+    config, dataset_options = tuning_config(overrides)
+    service = service or os.getenv("TUNING_SERVICE", "gemini").partition(":")[0]
+    path = dataset_path or os.getenv("TRAINING_DATASET_PATH", DEFAULT_TRAINING_DATASET_PATH)
+    dataset_sha256, stats = dataset_fingerprint(path, **dataset_options)
+    return {
+        "fingerprint": tuning_fingerprint(dataset_sha256, dict(config, **dataset_options), service),
+        "service": service,
+        "config": config,
+        "dataset": {"path": path, "options": dataset_options, "sha256": dataset_sha256, "examples": stats["examples"]},
+    }
+
+def create_finetuning_job(plan=None):
     """
     Creates a fine-tuning job using the fine-tuning dataset.
+
+    Args:
+        plan (dict, optional): A request prepared by prepare_tuning_job(); defaults to the environment settings.
     """
+    from google.genai import types
+
+    plan = plan or prepare_tuning_job()
+    config = plan["config"]
+
     # Load the training dataset
-    training_dataset = load_training_dataset()
+    training_dataset = load_training_dataset(plan["dataset"]["path"], **plan["dataset"]["options"])
 
-    # Get Gemini API from enviroment
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    client = get_tuning_client()
     
     # Create the fine-tuning job using the specified configuration
     tuning_job = client.tunings.tune(
-        base_model='models/gemini-1.5-flash-001-tuning',
+        base_model=config["base_model"],
         training_dataset=training_dataset,
         config=types.CreateTuningJobConfig(
-            epoch_count=1,
-            batch_size=4,
-            learning_rate=1,
-            tuned_model_display_name="Fine Tuned LIU ChatBot Model"
+            epoch_count=config["epoch_count"],
+            batch_size=config["batch_size"],
+            learning_rate=config["learning_rate"],
+            tuned_model_display_name=config["display_name"]
         )
     )
     
     return tuning_job
 
-def generate_fine_tuned_chat_response(user_text, conversation_history):
+def get_tuning_job(job_name):
+    """
+    Fetches the latest state of a fine-tuning job.
+
+    Args:
+        job_name (str): The resource name returned when the job was created.
+    """
+    return get_tuning_client().tunings.get(name=job_name)
+
+def _vertex_content(role, text):
+    from vertexai.generative_models import Content, Part
+
+    return Content(role=role, parts=[Part.from_text(text)])
+
+def _to_contents(turns, model=None):
+    """
+    Converts stored conversation turns to the model's history objects
+    (Vertex AI Content objects unless the backend provides make_content).
+    Each turn is converted once and the result is reused on later requests.
+    """
+    make_content = getattr(model, "make_content", None) or _vertex_content
+    contents = []
+    for turn in turns:
+        if turn.content is None:
+            turn.content = make_content(turn.role, turn.text)
+        contents.append(turn.content)
+    return contents
+
+def build_prompt(user_text, context=""):
+    """
+    Prefixes the user's message with the active document context, if any.
+    """
+    return ((context or "") + "\n" + user_text).strip()
+
+_token_counter = ApproximateTokenCounter()
+
+def _observe_tokens(usage, answer):
+    # Per-call token usage, for capacity planning
+    chat_tokens.labels("prompt").observe(usage["question_tokens"] + usage["context_tokens"] + usage["summary_tokens"])
+    chat_tokens.labels("history").observe(usage["history_tokens"])
+    chat_tokens.labels("input").observe(usage["input_tokens"])
+    chat_tokens.labels("response").observe(_token_counter.count_batch([answer])[0])
+
+def _start_chat(user_text, session_id, store, context, window):
+    """
+    Fits the session history and document context into the token budget and
+    opens a chat with what was kept.
+
+    Returns:
+        tuple: (chat, prompt, usage)
+    """
+    plan = window.fit(store.get_history(session_id), user_text, context)
+    model = VertexModelRegistry.get_instance().get_model()
+    chat = model.start_chat(history=_to_contents(plan.history, model))
+    return chat, build_prompt(user_text, plan.context), plan.usage
+
+def _send_chat_message(user_text, session_id, store, context, window):
+    chat, prompt, usage = _start_chat(user_text, session_id, store, context, window)
+    with track_upstream("vertex", "send_message"):
+        text = chat.send_message(prompt).text
+    _observe_tokens(usage, text)
+    return text
+
+def _cache_key(cache, user_text, session_id, store, context):
+    # Answers depend on the conversation so far, so each history gets its own entries.
+    return cache.make_key(user_text, context, VertexModelRegistry.get_instance().model_name(),
+                          store.get_history(session_id))
+
+def generate_fine_tuned_chat_response(user_text, session_id, store=conversation_store, context="", cache=response_cache,
+                                      window=context_window):
     """
     Generates a chat response using the fine-tuned Gemini model deployed to Vertex AI.
+
+    Answers are cached by normalized question, document context, session history
+    and model endpoint, and concurrent identical questions share a single upstream call. The history
+    and document context sent with the question are fitted into the token budget
+    of `window`.
+
+    Args:
+        user_text (str): The user's question.
+        session_id (str): Identifies the conversation whose history is used.
+        store (ConversationStore, optional): Where the session history is kept.
+        context (str, optional): Document text to prefix the question with.
+        cache (ResponseCache, optional): Cache for answers; None disables caching.
+        window (ContextWindow, optional): The token budget for the model input.
+
+    Returns:
+        str: The answer as the model wrote it, without any markup added.
     """
+    if cache is None:
+        text = _send_chat_message(user_text, session_id, store, context, window)
+    else:
+        key = _cache_key(cache, user_text, session_id, store, context)
+        text, _ = cache.get_or_compute(key, lambda: _send_chat_message(user_text, session_id, store, context, window))
 
-    # Initialize Vertex AI
-    vertexai.init(
-        project="988399269486",
-        location="us-central1"
-    )
+    # Record the completed exchange in the session history. The document context is
+    # retrieved again for every question, so only the question itself is kept.
+    store.append_exchange(session_id, user_text, text)
 
-    # Initialize the GenerativeModel with the tuned model name
-    model = GenerativeModel(
-        model_name="projects/988399269486/locations/us-central1/endpoints/8693984675871326208"
-    )
+    # Formatting is left to the caller; see utils.response_renderer.
+    return text
 
-    # Convert conversation history to a list of Content objects
-    chat_history = [
-        Content(role=msg["role"], parts=[Part.from_text(msg["content"])])
-        for msg in conversation_history
-    ]
+def stream_fine_tuned_chat_response(user_text, session_id, store=conversation_store, context="", cache=response_cache,
+                                    window=context_window):
+    """
+    Streams a chat response from the fine-tuned model as text chunks.
+
+    A cached answer is yielded as a single chunk. The exchange is only recorded in
+    the session history (and the cache) once the model has finished answering; if
+    the consumer stops early (client disconnect or abort), both are left untouched
+    so the next turn does not see a partial answer.
 
-    # Start a chat session with the formatted history
-    chat = model.start_chat(history=chat_history)
+    Args:
+        user_text (str): The user's question.
+        session_id (str): Identifies the conversation whose history is used.
+        store (ConversationStore, optional): Where the session history is kept.
+        context (str, optional): Document text to prefix the question with.
+        cache (ResponseCache, optional): Cache for answers; None disables caching.
+        window (ContextWindow, optional): The token budget for the model input.
+
+    Yields:
+        str: Text chunks in the order the model produces them.
+    """
+    key = None
+    if cache is not None:
+        key = _cache_key(cache, user_text, session_id, store, context)
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            store.append_exchange(session_id, user_text, cached)
+            return
 
-    # Send the user's message and get the response
-    response = chat.send_message(user_text)
+    chat, prompt, usage = _start_chat(user_text, session_id, store, context, window)
 
-    # Append the assistant's response to the conversation history
-    conversation_history.append({"role": "assistant", "content": response.text})
+    pieces = []
+    # Times the whole stream; a consumer that stops early is recorded with the time until it stopped.
+    with track_upstream("vertex", "send_message_stream"):
+        for chunk in chat.send_message(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks that only carry finish metadata have no text part.
+                continue
+            if text:
+                pieces.append(text)
+                yield text
 
-    return f"<strong>Fine-Tuned LIU ChatBot:</strong><br/>{response.text}"
+    answer = "".join(pieces)
+    _observe_tokens(usage, answer)
+    if cache is not None:
+        cache.put(key, answer)
+    store.append_exchange(session_id, user_text, answer)
 
 generate_chat_response = generate_fine_tuned_chat_response
\ No newline at end of file
@@ -0,0 +1,286 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError, EndpointConnectionError
+from utils.metrics import instrument_boto_client
+from utils.aws_services import AWS_REGION, AWS_Access_Key, AWS_Secret_Access_Key, OUTPUT_PREFIX, S3_BUCKET, get_s3_client
+
+# S3 rejects multipart parts smaller than 5 MiB (except the last one).
+MIN_PART_SIZE = 5 * 1024 * 1024
+RETRYABLE_ERRORS = {
+    "ThrottlingException",
+    "ProvisionedThroughputExceededException",
+    "InternalServerError",
+    "ServiceUnavailable",
+    "SlowDown",
+    "RequestTimeout",
+}
+
+_textract_client = None
+_textract_client_lock = threading.Lock()
+
+
+def get_textract_client():
+    """
+    Returns the shared Textract client, creating it on first use.
+    """
+    global _textract_client
+    if _textract_client is None:
+        with _textract_client_lock:
+            if _textract_client is None:
+                import boto3
+                _textract_client = instrument_boto_client(boto3.client(
+                    "textract",
+                    region_name=AWS_REGION,
+                    aws_access_key_id=AWS_Access_Key,
+                    aws_secret_access_key=AWS_Secret_Access_Key
+                ), "textract")
+    return _textract_client
+
+
+def call_with_retry(fn, retries=5, base_delay=0.5, max_delay=8.0, sleep=time.sleep, **kwargs):
+    """
+    Calls an AWS API, retrying throttling and transient errors with exponential backoff.
+    """
+    delay = base_delay
+    for attempt in range(retries + 1):
+        try:
+            return fn(**kwargs)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in RETRYABLE_ERRORS or attempt == retries:
+                raise
+        except EndpointConnectionError:
+            if attempt == retries:
+                raise
+        sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def iter_result_pages(job_id, textract=None, max_results=1000, wait_timeout=600, poll_interval=2.0, sleep=time.sleep):
+    """
+    Yields the result pages of a finished text detection job, following NextToken.
+
+    Waits for a job that is still IN_PROGRESS, up to wait_timeout seconds.
+    """
+    textract = textract or get_textract_client()
+    request = {"JobId": job_id, "MaxResults": max_results}
+    deadline = time.monotonic() + wait_timeout
+    while True:
+        page = call_with_retry(textract.get_document_text_detection, sleep=sleep, **request)
+        status = page.get("JobStatus", "SUCCEEDED")
+        if status == "IN_PROGRESS" and "NextToken" not in request:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Textract job {job_id} did not finish within {wait_timeout}s")
+            sleep(poll_interval)
+            continue
+        if status not in ("SUCCEEDED", "PARTIAL_SUCCESS"):
+            raise RuntimeError(f"Textract job {job_id} ended with status {status}: {page.get('StatusMessage', '')}")
+        yield page
+        next_token = page.get("NextToken")
+        if not next_token:
+            return
+        request["NextToken"] = next_token
+
+
+def _prefetch(pages, depth):
+    """
+    Runs a page iterator on a background thread, keeping up to depth pages ready.
+
+    Pages are chained by NextToken and must be requested in order, so the
+    concurrency comes from overlapping the next request with processing the current page.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        # Give up once the consumer has gone away instead of blocking forever.
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for page in pages:
+                if not put(page):
+                    return
+            put(done)
+        except BaseException as e:
+            put(e)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+class S3TextWriter:
+    """
+    Streams text to one S3 object as a multipart upload with bounded concurrency.
+
+    Text is buffered until a part is full, parts are uploaded on a thread pool with
+    at most max_concurrency in flight, and output that never fills a part is
+    written with a single put_object.
+    """
+
+    def __init__(self, key, bucket=S3_BUCKET, s3=None, part_size=MIN_PART_SIZE, max_concurrency=4,
+                 content_type="text/plain; charset=utf-8"):
+        self.key = key
+        self.bucket = bucket
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.content_type = content_type
+        self.bytes_written = 0
+        self._s3 = s3 or get_s3_client()
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self._buffer += data
+        self.bytes_written += len(data)
+        if len(self._buffer) >= self.part_size:
+            self._flush_part()
+
+    def _flush_part(self):
+        if self._upload_id is None:
+            self._upload_id = call_with_retry(
+                self._s3.create_multipart_upload, Bucket=self.bucket, Key=self.key, ContentType=self.content_type
+            )["UploadId"]
+        body, self._buffer = bytes(self._buffer), bytearray()
+        number = len(self._parts) + 1
+        # Blocks when max_concurrency parts are already uploading.
+        self._slots.acquire()
+        future = self._pool.submit(self._upload_part, number, body)
+        self._parts.append((number, future))
+
+    def _upload_part(self, number, body):
+        try:
+            response = call_with_retry(
+                self._s3.upload_part, Bucket=self.bucket, Key=self.key,
+                UploadId=self._upload_id, PartNumber=number, Body=body
+            )
+            return {"PartNumber": number, "ETag": response["ETag"]}
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """
+        Uploads what is left and completes the object.
+        """
+        try:
+            if self._upload_id is None:
+                call_with_retry(self._s3.put_object, Bucket=self.bucket, Key=self.key,
+                                Body=bytes(self._buffer), ContentType=self.content_type)
+                return
+            if self._buffer:
+                self._flush_part()
+            parts = [future.result() for _, future in self._parts]
+            call_with_retry(self._s3.complete_multipart_upload, Bucket=self.bucket, Key=self.key,
+                            UploadId=self._upload_id, MultipartUpload={"Parts": parts})
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._pool.shutdown(wait=True)
+
+    def abort(self):
+        """
+        Cancels an unfinished multipart upload so S3 does not keep its parts.
+        """
+        if self._upload_id is not None:
+            try:
+                self._s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception as e:
+                print(f"Error aborting multipart upload for {self.key}: {e}")
+            self._upload_id = None
+        self._pool.shutdown(wait=True)
+
+
+def output_key_for(source_key):
+    """
+    Maps an uploaded document key to its text output key under OUTPUT_PREFIX.
+    """
+    return f"{OUTPUT_PREFIX}{os.path.basename(source_key)}.txt"
+
+
+def extract_text_to_s3(job_id, source_key, textract=None, s3=None, prefetch_pages=4, part_size=MIN_PART_SIZE,
+                       max_concurrency=4, keep_text=False, sleep=time.sleep):
+    """
+    Fetches the LINE blocks of a Textract job and streams them to S3 under OUTPUT_PREFIX.
+
+    Args:
+        job_id (str): The Textract text detection job id.
+        source_key (str): S3 key of the uploaded document the job ran on.
+        prefetch_pages (int): How many result pages are fetched ahead of processing.
+        part_size (int): Multipart part size in bytes (at least 5 MiB).
+        max_concurrency (int): Parts uploaded to S3 at the same time.
+        keep_text (bool): Also return the full text. Otherwise only the pages being
+            fetched and the parts being uploaded are held in memory.
+
+    Returns:
+        dict: The output key and page/line/byte counts, plus the 'text' with keep_text.
+    """
+    writer = S3TextWriter(output_key_for(source_key), s3=s3, part_size=part_size, max_concurrency=max_concurrency)
+    lines = [] if keep_text else None
+    line_count = 0
+    pages = 0
+    try:
+        for page in _prefetch(iter_result_pages(job_id, textract, sleep=sleep), prefetch_pages):
+            pages += 1
+            page_lines = [block["Text"] for block in page.get("Blocks", ()) if block.get("BlockType") == "LINE"]
+            if page_lines:
+                writer.write("\n".join(page_lines) + "\n")
+                line_count += len(page_lines)
+                if keep_text:
+                    lines.extend(page_lines)
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+    result = {
+        "output_key": writer.key,
+        "pages": pages,
+        "lines": line_count,
+        "bytes": writer.bytes_written,
+    }
+    if keep_text:
+        result["text"] = "\n".join(lines)
+    return result
+
+
+def extract_documents(jobs, max_documents=4, **options):
+    """
+    Extracts several Textract jobs concurrently.
+
+    Args:
+        jobs (dict): Maps Textract job ids to the S3 keys of their source documents.
+        max_documents (int): How many jobs are processed at the same time.
+
+    Returns:
+        dict: Maps job ids to the result of extract_text_to_s3() or the raised exception.
+    """
+    with ThreadPoolExecutor(max_workers=max_documents) as pool:
+        futures = {job_id: pool.submit(extract_text_to_s3, job_id, key, **options) for job_id, key in jobs.items()}
+    results = {}
+    for job_id, future in futures.items():
+        try:
+            results[job_id] = future.result()
+        except Exception as e:
+            results[job_id] = e
+    return results
@@ -1,2 +1,101 @@
-# Global transcription cache
+# Per-document transcription store
+import os
+import threading
+import time
+from collections import OrderedDict
+from data.token_counting import ApproximateTokenCounter
+from utils.document_index import IndexedDocument
+
+# Key used when a transcription arrives without the S3 key of its upload
+DEFAULT_DOCUMENT_KEY = "latest"
+
+# Kept for callers that only need the newest transcription text
 latest_transcription = ""
+latest_document_key = None
+
+_token_counter = ApproximateTokenCounter()
+
+
+class DocumentStore:
+    """
+    Holds transcribed documents keyed by the S3 key of their upload.
+
+    Each document is chunked and indexed when it is ingested, so answering a
+    question only needs a lookup of its most relevant chunks. The least recently
+    used documents are dropped beyond max_documents.
+    """
+
+    def __init__(self, max_documents=100, top_k=3, chunk_words=120, overlap_words=20):
+        self.max_documents = max_documents
+        self.top_k = top_k
+        self.chunk_words = chunk_words
+        self.overlap_words = overlap_words
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ingest(self, key, text):
+        """
+        Chunks, indexes and stores a document, replacing any previous version.
+        """
+        document = IndexedDocument(key, text, self.chunk_words, self.overlap_words,
+                                   tokens=_token_counter.count_batch([text])[0])
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+        return document
+
+    def get(self, key):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+            return document
+
+    def retrieve(self, key, question, k=None):
+        """
+        Returns the document context to send with a question, plus retrieval stats.
+
+        Returns:
+            tuple: (context, info). context is "" and info is None when the document is unknown.
+        """
+        document = self.get(key)
+        if document is None:
+            return "", None
+        started = time.perf_counter()
+        chunks = document.top_chunks(question, k or self.top_k)
+        context = "\n".join(chunks)
+        retrieval_ms = (time.perf_counter() - started) * 1000
+        context_tokens = _token_counter.count_batch([context])[0]
+        document_tokens = document.tokens
+        return context, {
+            "document": key,
+            "chunks": len(chunks),
+            "total_chunks": len(document.index.chunks),
+            "context_tokens": context_tokens,
+            "document_tokens": document_tokens,
+            "saved_tokens": max(document_tokens - context_tokens, 0),
+            "retrieval_ms": round(retrieval_ms, 3),
+        }
+
+    def __len__(self):
+        return len(self._documents)
+
+
+document_store = DocumentStore(
+    max_documents=int(os.getenv("DOCUMENT_STORE_MAX_DOCUMENTS", "100")),
+    top_k=int(os.getenv("DOCUMENT_RETRIEVAL_TOP_K", "3")),
+)
+
+
+def store_transcription(text, key=None):
+    """
+    Stores a new transcription and makes it the default document for chat.
+    """
+    global latest_transcription, latest_document_key
+    key = key or DEFAULT_DOCUMENT_KEY
+    document_store.ingest(key, text)
+    latest_transcription = text
+    latest_document_key = key
+    return key
@@ -0,0 +1,103 @@
+"""
+Delivers transcription events to the Socket.IO room of the upload they belong to.
+
+Clients join the room of an upload by emitting 'subscribe_transcription' with
+its s3_key, so an update only reaches the browsers waiting for that document
+instead of every connected client.
+"""
+import os
+import threading
+from model.socketio_instance import socketio
+from utils.transcription_cache import DEFAULT_DOCUMENT_KEY
+
+
+def transcription_room(s3_key):
+    return f"transcription:{s3_key}"
+
+
+class TranscriptionNotifier:
+    """
+    Sends 'transcription_update' events, coalescing bursts per upload.
+
+    The first update for an s3_key starts a window of `window` seconds; updates
+    arriving during the window replace the pending text, and when it ends a single
+    event carries the latest text plus how many updates it stands for. A
+    transcription replaces the previous one for its document, so nothing is lost.
+    Transcriptions without an s3_key have no room and go to every client.
+    """
+
+    def __init__(self, window=0.25, emit=None, spawn=None, sleep=None):
+        self.window = window
+        self._emit = emit or socketio.emit
+        self._spawn = spawn or socketio.start_background_task
+        self._sleep = sleep or socketio.sleep
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.received = 0
+        self.sent = 0
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """
+        Builds a notifier whose window is TRANSCRIPTION_COALESCE_MS milliseconds (0 disables coalescing).
+        """
+        return cls(window=float(os.getenv("TRANSCRIPTION_COALESCE_MS", "250")) / 1000, **kwargs)
+
+    def publish(self, s3_key, text):
+        """
+        Queues a transcription for the clients subscribed to its upload.
+        """
+        with self._lock:
+            self.received += 1
+            pending = self._pending.get(s3_key)
+            if pending is not None:
+                pending["text"] = text
+                pending["updates"] += 1
+                return
+            if self.window > 0:
+                self._pending[s3_key] = {"text": text, "updates": 1}
+        if self.window > 0:
+            self._spawn(self._flush_later, s3_key)
+        else:
+            self._send(s3_key, {"text": text, "updates": 1})
+
+    def error(self, s3_key, payload):
+        """
+        Sends a 'transcription_error' to the upload's room, after any update still pending for it.
+        """
+        self.flush(s3_key)
+        self._emit_to(s3_key, "transcription_error", dict(payload, s3_key=s3_key))
+
+    def flush(self, s3_key=None):
+        """
+        Sends the pending update of one upload, or of all uploads, right away.
+        """
+        with self._lock:
+            keys = list(self._pending) if s3_key is None else [s3_key]
+            ready = [(key, self._pending.pop(key)) for key in keys if key in self._pending]
+        for key, pending in ready:
+            self._send(key, pending)
+
+    def _flush_later(self, s3_key):
+        self._sleep(self.window)
+        self.flush(s3_key)
+
+    def _send(self, s3_key, pending):
+        with self._lock:
+            self.sent += 1
+        self._emit_to(s3_key, "transcription_update", {"text": pending["text"], "s3_key": s3_key,
+                                                       "updates": pending["updates"]})
+
+    def _emit_to(self, s3_key, event, payload):
+        if s3_key == DEFAULT_DOCUMENT_KEY:
+            self._emit(event, payload)
+        else:
+            self._emit(event, payload, to=transcription_room(s3_key))
+
+    def stats(self):
+        with self._lock:
+            return {"received": self.received, "sent": self.sent, "pending": len(self._pending),
+                    "window_ms": self.window * 1000}
+
+
+transcription_notifier = TranscriptionNotifier.from_env()
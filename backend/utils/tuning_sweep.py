@@ -0,0 +1,528 @@
+"""
+Runs hyperparameter sweeps: many tuning jobs, scheduled under a concurrency limit.
+
+A sweep is a grid or random search over epoch_count, batch_size, learning_rate
+and the dataset variant. Each resulting trial is queued and submitted to a
+tuning service (see model.tuning_services) while fewer than max_concurrent
+trials are running. When the service reports a quota error, the trial stays
+queued and is retried with backoff. Trials matching a registered job that is
+running or has succeeded reuse it (see model.tuning_job_registry).
+
+Every trial that succeeds is evaluated on a validation set in a background task
+of its own, so scheduling never waits on the evaluation, and the finished
+trials of a sweep are ranked by an evaluation metric. The state of each sweep is
+written atomically to a JSON file after every step, so progress survives
+restarts and resumes from where it stopped.
+"""
+import copy
+import itertools
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from data.atomic_files import atomic_open
+from model.tuning_job_registry import UNUSABLE_STATES
+from model.tuning_services import is_not_found_error
+
+DEFAULT_SWEEP_DIR = os.path.join(os.path.dirname(__file__), "../data/tuning-sweeps")
+DEFAULT_VALIDATION_DATASET = os.path.join(os.path.dirname(__file__), "../data/filtered-validation-dataset.jsonl")
+DEFAULT_DATASET_VARIANTS = {
+    "filtered": os.path.join(os.path.dirname(__file__), "../data/filtered-training-dataset.jsonl"),
+    "complete": os.path.join(os.path.dirname(__file__), "../data/complete-training-dataset.jsonl"),
+}
+SWEEP_PARAMETERS = ("epoch_count", "batch_size", "learning_rate", "dataset")
+SWEEP_MAX_TRIALS = int(os.getenv("SWEEP_MAX_TRIALS", "50"))
+RANK_METRICS = ("f1", "exact_match", "keyword_hit_rate")
+
+# Trial states; 'completed' and 'failed' are final.
+FINAL_TRIAL_STATES = {"completed", "failed"}
+_QUOTA_ERROR = re.compile(r"429|RESOURCE_EXHAUSTED|quota", re.IGNORECASE)
+_ENDPOINT_PATTERN = re.compile(r"projects/([^/]+)/locations/([^/]+)/endpoints/([^/]+)")
+
+
+def _state_name(state):
+    return getattr(state, "name", None) or str(state or "UNKNOWN")
+
+
+def _sample_value(values, rng):
+    if isinstance(values, list):
+        return rng.choice(values)
+    low, high = values["min"], values["max"]
+    if isinstance(low, int) and isinstance(high, int) and not values.get("log"):
+        return rng.randint(low, high)
+    if values.get("log"):
+        return math.exp(rng.uniform(math.log(low), math.log(high)))
+    return rng.uniform(low, high)
+
+
+def expand_search(search, space, trials=None, seed=None):
+    """
+    Turns a search space into the overrides of each trial.
+
+    Args:
+        search (str): 'grid' for every combination, or 'random' for `trials` samples.
+        space (dict): Values per parameter of SWEEP_PARAMETERS. Grid search needs lists;
+            random search also accepts {"min", "max", "log"} ranges.
+        trials (int, optional): How many random samples to draw.
+        seed (int, optional): Seed for reproducible random search.
+
+    Returns:
+        list[dict]: One dict of parameter values per distinct trial.
+
+    Raises:
+        ValueError: If the search or the space is malformed.
+    """
+    if not isinstance(space, dict) or not space:
+        raise ValueError("space must be an object of parameter values")
+    unknown = set(space) - set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {', '.join(sorted(unknown))}")
+    for key, values in space.items():
+        if isinstance(values, list):
+            if not values:
+                raise ValueError(f"{key} needs at least one value")
+        elif search != "random" or not (isinstance(values, dict) and {"min", "max"} <= set(values)) or key == "dataset":
+            raise ValueError(f"{key} must be a list of values" + (" or a {min, max} range" if search == "random" else ""))
+
+    keys = sorted(space)
+    if search == "grid":
+        combinations = [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+    elif search == "random":
+        if not isinstance(trials, int) or trials < 1:
+            raise ValueError("random search needs a positive number of trials")
+        rng = random.Random(seed)
+        combinations = [{key: _sample_value(space[key], rng) for key in keys} for _ in range(trials)]
+    else:
+        raise ValueError("search must be 'grid' or 'random'")
+
+    distinct = []
+    for combination in combinations:
+        if combination not in distinct:
+            distinct.append(combination)
+    if len(distinct) > SWEEP_MAX_TRIALS:
+        raise ValueError(f"A sweep may have at most {SWEEP_MAX_TRIALS} trials, got {len(distinct)}")
+    return distinct
+
+
+def evaluate_tuned_model(job, sweep, backend=None):
+    """
+    Evaluates the model of a finished job on the sweep's validation set.
+
+    Args:
+        job: The finished tuning job; its tuned_model.endpoint names the model.
+        sweep (dict): The sweep, for its validation_dataset and eval_max_examples.
+        backend (str, optional): Model backend spec; defaults to TUNING_EVAL_BACKEND or MODEL_BACKEND.
+
+    Returns:
+        dict: The evaluation summary (see data.evaluate_model.evaluate).
+    """
+    from data.evaluate_model import evaluate
+    from model.model_backends import get_model_backend
+
+    match = _ENDPOINT_PATTERN.search(getattr(job.tuned_model, "endpoint", None) or "")
+    if not match:
+        raise ValueError(f"Tuning job {job.name} has no endpoint to evaluate")
+    project, location, _ = match.groups()
+    model = get_model_backend(backend or os.getenv("TUNING_EVAL_BACKEND"))(project, location, match.group(0))
+    return evaluate(sweep["validation_dataset"], model, concurrency=int(os.getenv("TUNING_EVAL_CONCURRENCY", "4")),
+                    max_examples=sweep.get("eval_max_examples"))
+
+
+class SweepScheduler:
+    """
+    Schedules the trials of every active sweep under one concurrency limit.
+
+    A single background loop calls step() every poll_interval seconds until all
+    sweeps have finished; step() can also be called directly, e.g. in tests.
+    Updates are pushed to Socket.IO clients as 'tuning_sweep_update' events.
+    """
+
+    def __init__(self, service, state_dir=DEFAULT_SWEEP_DIR, registry=None, evaluate=None, prepare=None,
+                 datasets=None, validation_dataset=DEFAULT_VALIDATION_DATASET, max_concurrent=2,
+                 poll_interval=30.0, max_backoff=600.0, max_poll_errors=10, emit=None, spawn=None, sleep=None,
+                 clock=time.time):
+        """
+        Args:
+            service: The tuning service jobs are submitted to (see model.tuning_services).
+            state_dir (str, optional): Directory for one JSON file per sweep; None keeps sweeps in memory.
+            registry (TuningJobRegistry, optional): Lets trials reuse registered jobs.
+            evaluate (callable, optional): (job, sweep) -> metrics; defaults to evaluate_tuned_model.
+            prepare (callable, optional): (overrides, dataset_path, service_name) -> plan; defaults to prepare_tuning_job.
+            datasets (dict, optional): Dataset variant names and their paths; the first
+                is used by sweeps that do not vary the dataset.
+            validation_dataset (str): Default validation set for the evaluation pass.
+            max_concurrent (int): Trials running at once, across all sweeps.
+            poll_interval (float): Seconds between steps of the background loop.
+            max_backoff (float): Longest wait before retrying a trial after a quota error.
+            max_poll_errors (int): Consecutive errors polling a job after which its trial fails.
+            spawn (callable, optional): Runs a function in the background; used for the loop
+                and for each evaluation. Defaults to a daemon thread.
+        """
+        if prepare is None:
+            from utils.services import prepare_tuning_job as prepare
+        self.service = service
+        self.state_dir = state_dir
+        self.max_concurrent = max_concurrent
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.max_poll_errors = max_poll_errors
+        self.datasets = dict(datasets or DEFAULT_DATASET_VARIANTS)
+        self.validation_dataset = validation_dataset
+        self._registry = registry
+        self._evaluate = evaluate or evaluate_tuned_model
+        self._prepare = prepare
+        self._emit = emit
+        self._spawn = spawn or (lambda func: threading.Thread(target=func, daemon=True).start())
+        self._sleep = sleep or time.sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._looping = False
+        self._sweeps = {}
+        self._load()
+
+    @classmethod
+    def from_env(cls, service, **options):
+        """
+        Builds a scheduler configured from the TUNING_SWEEP_* environment variables.
+        TUNING_SWEEP_DATASETS may hold a JSON object of extra dataset variants.
+        """
+        datasets = dict(DEFAULT_DATASET_VARIANTS, **json.loads(os.getenv("TUNING_SWEEP_DATASETS", "{}")))
+        settings = {
+            "state_dir": os.getenv("TUNING_SWEEP_DIR", DEFAULT_SWEEP_DIR) or None,
+            "datasets": datasets,
+            "max_concurrent": int(os.getenv("TUNING_SWEEP_MAX_CONCURRENT", "2")),
+            "poll_interval": float(os.getenv("TUNING_SWEEP_POLL_INTERVAL", "30")),
+        }
+        settings.update(options)
+        return cls(service, **settings)
+
+    # ---- Sweeps ----
+
+    def create(self, spec):
+        """
+        Validates a sweep request and queues its trials. Call start() to run them.
+
+        Args:
+            spec (dict): 'search' ('grid' or 'random'), 'space', and optionally 'trials',
+                'seed', 'rank_by' (one of RANK_METRICS), 'eval_max_examples' and
+                'overrides' applied to every trial (e.g. base_model).
+
+        Returns:
+            dict: A copy of the new sweep.
+
+        Raises:
+            ValueError: If the request is malformed.
+        """
+        from utils.services import tuning_config
+
+        if not isinstance(spec, dict):
+            raise ValueError("A sweep must be a JSON object")
+        rank_by = spec.get("rank_by", "f1")
+        if rank_by not in RANK_METRICS:
+            raise ValueError(f"rank_by must be one of {', '.join(RANK_METRICS)}")
+        shared = spec.get("overrides") or {}
+        if not isinstance(shared, dict) or set(shared) & set(SWEEP_PARAMETERS):
+            raise ValueError("overrides must be an object of tuning parameters not swept over")
+        eval_max_examples = spec.get("eval_max_examples")
+        if eval_max_examples is not None and (not isinstance(eval_max_examples, int) or eval_max_examples < 1):
+            raise ValueError("eval_max_examples must be a positive integer")
+
+        trials = []
+        for number, params in enumerate(expand_search(spec.get("search", "grid"), spec.get("space"),
+                                                      spec.get("trials"), spec.get("seed")), start=1):
+            dataset = params.get("dataset", next(iter(self.datasets)))
+            if dataset not in self.datasets:
+                raise ValueError(f"Unknown dataset variant {dataset!r}; expected one of {', '.join(self.datasets)}")
+            overrides = dict(shared, **{key: value for key, value in params.items() if key != "dataset"})
+            tuning_config(overrides)
+            trials.append({"id": f"t{number}", "params": params, "overrides": overrides, "dataset": dataset,
+                           "state": "queued", "attempts": 0})
+
+        now = self._clock()
+        sweep = {
+            "id": uuid.uuid4().hex[:12],
+            "state": "running",
+            "created_at": now,
+            "updated_at": now,
+            "search": spec.get("search", "grid"),
+            "space": spec.get("space"),
+            "rank_by": rank_by,
+            "validation_dataset": self.validation_dataset,
+            "eval_max_examples": eval_max_examples,
+            "trials": trials,
+            "ranking": [],
+        }
+        with self._lock:
+            self._sweeps[sweep["id"]] = sweep
+            self._save(sweep)
+            return copy.deepcopy(sweep)
+
+    def get(self, sweep_id):
+        """
+        Returns a copy of a sweep, or None.
+        """
+        with self._lock:
+            sweep = self._sweeps.get(sweep_id)
+            return copy.deepcopy(sweep) if sweep else None
+
+    def list(self):
+        """
+        Returns a summary of every sweep, newest first.
+        """
+        with self._lock:
+            sweeps = [self._summary(sweep) for sweep in self._sweeps.values()]
+        return sorted(sweeps, key=lambda sweep: sweep["created_at"], reverse=True)
+
+    # ---- Scheduling ----
+
+    def start(self):
+        """
+        Starts the background loop unless it is already running.
+
+        Returns:
+            bool: True if a loop was started.
+        """
+        with self._lock:
+            if self._looping:
+                return False
+            self._looping = True
+        self._spawn(self._loop)
+        return True
+
+    def _loop(self):
+        while True:
+            try:
+                self.step()
+            except Exception as e:
+                print(f"Error scheduling tuning sweeps: {e}")
+            with self._lock:
+                # Checked under the lock so a sweep created meanwhile is never left without a loop.
+                if all(sweep["state"] == "completed" for sweep in self._sweeps.values()):
+                    self._looping = False
+                    return
+            self._sleep(self.poll_interval)
+
+    def run_until_complete(self, max_steps=10000):
+        """
+        Steps the scheduler in the calling thread until every sweep has finished.
+        """
+        for _ in range(max_steps):
+            if self.step():
+                return True
+            self._sleep(self.poll_interval)
+        return False
+
+    def step(self):
+        """
+        Polls running trials, starts the evaluation of finished ones in the background,
+        submits queued ones up to the concurrency limit and ranks finished sweeps.
+
+        Returns:
+            bool: True when no sweep has unfinished trials.
+        """
+        with self._lock:
+            sweeps = [sweep for sweep in self._sweeps.values() if sweep["state"] != "completed"]
+        changed = set()
+
+        for sweep in sweeps:
+            for trial in sweep["trials"]:
+                if trial["state"] == "running" and self._poll(sweep, trial):
+                    changed.add(sweep["id"])
+
+        running = sum(trial["state"] == "running" for sweep in sweeps for trial in sweep["trials"])
+        quota_exhausted = False
+        for sweep in sorted(sweeps, key=lambda sweep: sweep["created_at"]):
+            for trial in sweep["trials"]:
+                if running >= self.max_concurrent or quota_exhausted:
+                    break
+                if trial["state"] != "queued" or trial.get("retry_at", 0) > self._clock():
+                    continue
+                outcome = self._submit(sweep, trial)
+                changed.add(sweep["id"])
+                if outcome == "running":
+                    running += 1
+                elif outcome == "quota":
+                    quota_exhausted = True
+
+        for sweep in sweeps:
+            if all(trial["state"] in FINAL_TRIAL_STATES for trial in sweep["trials"]):
+                self._rank(sweep)
+                changed.add(sweep["id"])
+            if sweep["id"] in changed:
+                self._update(sweep, updated_at=self._clock())
+                with self._lock:
+                    self._save(sweep)
+                self._publish(sweep)
+
+        with self._lock:
+            return all(sweep["state"] == "completed" for sweep in self._sweeps.values())
+
+    def _submit(self, sweep, trial):
+        try:
+            plan = self._prepare(trial["overrides"], self.datasets[trial["dataset"]], self.service.name)
+        except Exception as e:
+            self._update(trial, state="failed", error=f"Could not prepare trial: {e}")
+            return "failed"
+
+        fingerprint = plan["fingerprint"]
+        entry = self._registry.find_reusable(fingerprint) if self._registry is not None else None
+        if entry is not None:
+            self._update(trial, state="running", job_id=entry["job_id"], fingerprint=fingerprint, reused=True,
+                         started_at=self._clock())
+            return "running"
+
+        attempts = trial["attempts"] + 1
+        try:
+            job = self.service.submit(plan)
+        except Exception as e:
+            if _QUOTA_ERROR.search(str(e)):
+                # Quota is shared by every trial, so nothing else is submitted until the backoff passes.
+                delay = min(self.poll_interval * 2 ** (attempts - 1), self.max_backoff)
+                self._update(trial, attempts=attempts, retry_at=self._clock() + delay, error=str(e))
+                return "quota"
+            self._update(trial, state="failed", attempts=attempts, error=f"Submission failed: {e}")
+            return "failed"
+
+        self._update(trial, state="running", attempts=attempts, job_id=job.name, fingerprint=fingerprint,
+                     started_at=self._clock(), error=None, retry_at=None)
+        if self._registry is not None:
+            self._registry.record(fingerprint, job_id=job.name, state=_state_name(job.state), service=plan["service"],
+                                  config=plan["config"], dataset=plan["dataset"])
+        return "running"
+
+    def _poll(self, sweep, trial):
+        try:
+            job = self.service.get(trial["job_id"])
+        except Exception as e:
+            errors = trial.get("poll_errors", 0) + 1
+            if errors < self.max_poll_errors and not is_not_found_error(e):
+                # Transient API errors only delay the next poll.
+                print(f"Error polling tuning job {trial['job_id']}: {e}")
+                self._update(trial, poll_errors=errors)
+                return False
+            error = f"Could not poll tuning job: {e}"
+            print(f"Giving up on tuning job {trial['job_id']} after {errors} poll errors: {e}")
+            if self._registry is not None and trial.get("fingerprint"):
+                self._registry.record(trial["fingerprint"], job_id=trial["job_id"], state="JOB_STATE_FAILED", error=error)
+            self._update(trial, state="failed", poll_errors=errors, finished_at=self._clock(), error=error)
+            return True
+        if trial.get("poll_errors"):
+            self._update(trial, poll_errors=0)
+        state = _state_name(job.state)
+        if state != trial.get("job_state") and self._registry is not None and trial.get("fingerprint"):
+            tuned_model = getattr(job, "tuned_model", None)
+            self._registry.record(trial["fingerprint"], job_id=job.name, state=state,
+                                  fine_tuned_model=getattr(tuned_model, "model", None),
+                                  endpoint=getattr(tuned_model, "endpoint", None))
+        if state in UNUSABLE_STATES:
+            error = getattr(job, "error", None)
+            self._update(trial, state="failed", job_state=state, finished_at=self._clock(),
+                         error=str(error) if error else f"Tuning job ended in {state}")
+            return True
+        if state != "JOB_STATE_SUCCEEDED":
+            if state == trial.get("job_state"):
+                return False
+            self._update(trial, job_state=state)
+            return True
+
+        tuned_model = job.tuned_model
+        self._update(trial, state="evaluating", job_state=state, finished_at=trial.get("finished_at") or self._clock(),
+                     fine_tuned_model=getattr(tuned_model, "model", None),
+                     endpoint=getattr(tuned_model, "endpoint", None))
+        # An evaluation makes hundreds of model calls; the other trials keep being scheduled meanwhile.
+        self._spawn(lambda: self._run_evaluation(sweep, trial, job))
+        return True
+
+    def _run_evaluation(self, sweep, trial, job):
+        try:
+            summary = self._evaluate(job, sweep)
+            metrics = {key: summary[key] for key in RANK_METRICS + ("examples", "errors") if key in summary}
+            self._update(trial, state="completed", metrics=metrics)
+        except Exception as e:
+            print(f"Error evaluating tuning job {job.name}: {e}")
+            self._update(trial, state="completed", metrics=None, evaluation_error=str(e))
+        # The sweep is ranked by the next step, once all its trials are final.
+        self._update(sweep, updated_at=self._clock())
+        with self._lock:
+            self._save(sweep)
+        self._publish(sweep)
+
+    def _rank(self, sweep):
+        metric = sweep["rank_by"]
+        scored = [trial for trial in sweep["trials"] if trial.get("metrics") and trial["metrics"].get(metric) is not None]
+        # Stable sort: ties keep the trial order.
+        scored.sort(key=lambda trial: trial["metrics"][metric], reverse=True)
+        for rank, trial in enumerate(scored, start=1):
+            self._update(trial, rank=rank)
+        ranking = [{"trial": trial["id"], "params": trial["params"], metric: trial["metrics"][metric],
+                    "fine_tuned_model": trial.get("fine_tuned_model")} for trial in scored]
+        self._update(sweep, state="completed", ranking=ranking, best=ranking[0] if ranking else None)
+
+    # ---- State ----
+
+    def _update(self, record, **fields):
+        # Readers copy sweeps under the lock, so they never see a half-applied update.
+        with self._lock:
+            record.update(fields)
+
+    def _summary(self, sweep):
+        counts = {}
+        for trial in sweep["trials"]:
+            counts[trial["state"]] = counts.get(trial["state"], 0) + 1
+        return {
+            "id": sweep["id"],
+            "state": sweep["state"],
+            "created_at": sweep["created_at"],
+            "updated_at": sweep["updated_at"],
+            "trials": counts,
+            "best": sweep.get("best"),
+        }
+
+    def _publish(self, sweep):
+        if self._emit is None:
+            return
+        with self._lock:
+            summary = self._summary(sweep)
+        try:
+            self._emit("tuning_sweep_update", summary)
+        except Exception as e:
+            print(f"Error emitting tuning sweep update: {e}")
+
+    def _save(self, sweep):
+        if not self.state_dir:
+            return
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            with atomic_open(os.path.join(self.state_dir, f"{sweep['id']}.json")) as file:
+                json.dump(sweep, file, indent=2)
+        except OSError as e:
+            print(f"Could not save tuning sweep {sweep['id']}: {e}")
+
+    def _load(self):
+        if not self.state_dir or not os.path.isdir(self.state_dir):
+            return
+        for name in sorted(os.listdir(self.state_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.state_dir, name), "r", encoding="utf-8") as file:
+                    sweep = json.load(file)
+            except (OSError, ValueError) as e:
+                print(f"Could not read tuning sweep {name}: {e}")
+                continue
+            for trial in sweep["trials"]:
+                if trial["state"] == "evaluating":
+                    # Interrupted mid-evaluation: poll the finished job again to re-run the evaluation.
+                    trial["state"] = "running"
+            self._sweeps[sweep["id"]] = sweep
+
+    def has_unfinished(self):
+        """
+        Returns True if a sweep loaded or created has trials left to run.
+        """
+        with self._lock:
+            return any(sweep["state"] != "completed" for sweep in self._sweeps.values())
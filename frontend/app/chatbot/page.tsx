@@ -36,6 +36,21 @@ export default function ChatbotPage() {
   const [filePreview, setFilePreview] = useState<{ url: string, type: 'image' | 'video' | 'audio' } | null>(null);
   const [isUploading, setIsUploading] = useState(false);
   const socketRef = useRef<any>(null);
+  // Chat session id issued by the backend with the first answer and sent with every later message
+  const sessionIdRef = useRef<string | null>(null);
+
+  const postChatMessage = async (text: string) => {
+    const apiUrl = process.env.NEXT_PUBLIC_API_URL;
+    const response = await axios.post(
+      `${apiUrl}/tuning-chat?msg=${encodeURIComponent(text)}`,
+      null,
+      { headers: sessionIdRef.current ? { 'X-Session-Id': sessionIdRef.current } : {} }
+    );
+    sessionIdRef.current = response.headers['x-session-id'] || sessionIdRef.current;
+    return response;
+  };
+  // Uploads still waiting for their transcription; their rooms are rejoined on every (re)connect
+  const pendingUploadsRef = useRef<Set<string>>(new Set());
   const voiceSubMenuRef = useRef<HTMLDivElement>(null);
 
   // Update the existing useEffect for handling clicks outside
@@ -193,14 +208,20 @@ export default function ChatbotPage() {
 
     socket.on('connect', () => {
       console.log('✅ WebSocket connected');
+      pendingUploadsRef.current.forEach(s3_key => socket.emit('subscribe_transcription', { s3_key }));
     });
 
     socket.on('connect_error', (err: Error) => {
       console.error('❌ WebSocket connection error:', err.message);
     });
 
-    socket.on('transcription_update', async (data: { text: string }) => {
+    socket.on('transcription_update', async (data: { text: string; s3_key?: string }) => {
       console.log('📝 Transcription update:', data.text);
+      if (data.s3_key && data.s3_key !== 'latest') {
+        // A repeated update for an upload that was already answered is ignored
+        if (!pendingUploadsRef.current.delete(data.s3_key)) return;
+        socket.emit('unsubscribe_transcription', { s3_key: data.s3_key });
+      }
 
       // 1. Find and update the loading message
       setMessages(prev => {
@@ -236,10 +257,7 @@ export default function ChatbotPage() {
 
         try {
           // Call your API with the transcription
-          const apiUrl = process.env.NEXT_PUBLIC_API_URL;
-          const response = await axios.post(
-            `${apiUrl}/tuning-chat?msg=${encodeURIComponent(transcription)}`
-          );
+          const response = await postChatMessage(transcription);
 
           // Update bot message with response
           setMessages(prev => {
@@ -281,6 +299,15 @@ export default function ChatbotPage() {
     };
   }, [messages.length]); // Only depend on messages.length to avoid infinite loops
 
+  // Transcriptions are only sent to the clients subscribed to their upload
+  const subscribeToTranscription = (s3_key: string) => {
+    pendingUploadsRef.current.add(s3_key);
+    // While disconnected, the 'connect' handler subscribes once the socket is back
+    if (socketRef.current?.connected) {
+      socketRef.current.emit('subscribe_transcription', { s3_key });
+    }
+  };
+
   // Modify the handleSubmit function for file uploads
   const handleSubmit = async () => {
     if (isSubmitting) return;
@@ -305,6 +332,7 @@ export default function ChatbotPage() {
           filename: audioFileName,
           content_type: 'audio/mp3',
         });
+        subscribeToTranscription(presignedRes.data.s3_key);
 
         // Upload audio to S3
         await axios.put(presignedRes.data.url, audioFile, {
@@ -348,6 +376,7 @@ export default function ChatbotPage() {
           filename: fileName,
           content_type: file.type || 'application/octet-stream',
         });
+        subscribeToTranscription(presignedRes.data.s3_key);
 
         // Upload file to S3
         await axios.put(presignedRes.data.url, file, {
@@ -395,10 +424,7 @@ export default function ChatbotPage() {
       const botMessageIndex = userMessageIndex + 1;
 
       try {
-        const apiUrl = process.env.NEXT_PUBLIC_API_URL;
-        const response = await axios.post(
-          `${apiUrl}/tuning-chat?msg=${encodeURIComponent(userInput)}`
-        );
+        const response = await postChatMessage(userInput);
 
         const fullResponse = cleanBotResponse(response.data.response);
 
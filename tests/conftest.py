@@ -0,0 +1,13 @@
+import json
+import pytest
+
+
+@pytest.fixture
+def gemini_line():
+    """Returns a factory for one Gemini-format JSONL line with a user and a model turn."""
+    def make(user, model):
+        return json.dumps({
+            "systemInstruction": {"role": "system", "parts": [{"text": "You are an educational chatbot for LIU."}]},
+            "contents": [{"role": "user", "parts": [{"text": user}]}, {"role": "model", "parts": [{"text": model}]}],
+        }, ensure_ascii=False)
+    return make
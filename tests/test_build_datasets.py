@@ -0,0 +1,112 @@
+import json
+import pytest
+from data.atomic_files import atomic_open
+from data.build_datasets import build
+from data.linechecker import split_lines
+
+
+def write_lines(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def read_users(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line)["contents"][0]["parts"][0]["text"] for line in file]
+
+
+def test_rebuild_only_recompiles_changed_inputs(tmp_path, gemini_line):
+    first = write_lines(tmp_path / "first.jsonl", [gemini_line(f"q{i}", f"a{i}") for i in range(50)])
+    second = write_lines(tmp_path / "second.jsonl", [gemini_line(f"r{i}", f"b{i}") for i in range(50)] + ["{broken"])
+    out = tmp_path / "build"
+
+    report = build([first, second], str(out), validation_fraction=0.3)
+    train, validation = read_users(out / "training-dataset.jsonl"), read_users(out / "validation-dataset.jsonl")
+
+    assert report["compiled"] == [first, second] and report["split"] == "built"
+    assert len(train) + len(validation) == 100 and 10 < len(validation) < 50
+
+    report = build([first, second], str(out), validation_fraction=0.3)
+    assert report["compiled"] == [] and report["split"] == "reused"
+
+    # Changing one input recompiles only that input; every example keeps its side.
+    write_lines(tmp_path / "second.jsonl", [gemini_line(f"r{i}", f"b{i}") for i in range(60)] + [gemini_line("q1", "a1")])
+    report = build([first, second], str(out), validation_fraction=0.3)
+
+    assert report["compiled"] == [second] and report["reused"] == [first] and report["split"] == "built"
+    assert report["counts"]["duplicates"] == 1
+    assert set(train) <= set(read_users(out / "training-dataset.jsonl"))
+    assert set(validation) <= set(read_users(out / "validation-dataset.jsonl"))
+    assert len(list((out / "cache").iterdir())) == 2
+
+    # Another build's file still being written is not swept away with the stale compiled files.
+    in_progress = out / "cache" / ".other.gds.abc123.tmp"
+    in_progress.write_bytes(b"partial")
+    build([first], str(out), validation_fraction=0.3)
+    assert sorted(path.suffix for path in (out / "cache").iterdir()) == [".gds", ".tmp"]
+
+
+def test_changed_parameters_or_outputs_rerun_the_split(tmp_path, gemini_line):
+    inputs = [write_lines(tmp_path / "data.jsonl", [gemini_line(f"q{i}", "a " * (i + 1)) for i in range(20)])]
+    out = tmp_path / "build"
+    build(inputs, str(out))
+
+    report = build(inputs, str(out), min_tokens=1, max_tokens=10)
+    assert report["split"] == "built" and report["counts"]["out_of_range"] > 0
+
+    (out / "training-dataset.jsonl").write_text("edited\n")
+    assert build(inputs, str(out), min_tokens=1, max_tokens=10)["split"] == "built"
+    assert read_users(out / "training-dataset.jsonl")
+
+
+def test_outputs_may_not_overwrite_inputs(tmp_path, gemini_line):
+    out = tmp_path / "build"
+    out.mkdir()
+    source = write_lines(out / "training-dataset.jsonl", [gemini_line("q", "a")])
+
+    with pytest.raises(ValueError):
+        build([source], str(out))
+    assert read_users(source) == ["q"]
+
+
+def test_linechecker_splits_without_touching_its_input(tmp_path, gemini_line):
+    lines = [gemini_line(f"q{i}", f"a{i}") for i in range(40)] + ["not json"]
+    source = write_lines(tmp_path / "data.jsonl", lines)
+    original = (tmp_path / "data.jsonl").read_text()
+
+    counts = split_lines(source, str(tmp_path / "train.jsonl"), str(tmp_path / "val.jsonl"))
+    again = split_lines(source, str(tmp_path / "train2.jsonl"), str(tmp_path / "val2.jsonl"))
+
+    assert sum(counts) == 41 and counts == again
+    assert (tmp_path / "data.jsonl").read_text() == original
+    assert (tmp_path / "val.jsonl").read_text() == (tmp_path / "val2.jsonl").read_text()
+    with pytest.raises(ValueError):
+        split_lines(source, source, str(tmp_path / "val3.jsonl"))
+
+
+def test_failed_writes_leave_the_previous_file(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text("old\n")
+
+    with pytest.raises(RuntimeError):
+        with atomic_open(path) as file:
+            file.write("partial")
+            raise RuntimeError("disk full")
+
+    assert path.read_text() == "old\n"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_concurrent_writers_of_one_path_do_not_share_a_temporary_file(tmp_path):
+    path = tmp_path / "out.jsonl"
+
+    with atomic_open(path) as first, atomic_open(path) as second:
+        assert first.name != second.name
+        first.write("first\n")
+        second.write("second\n")
+
+    assert path.read_text() in ("first\n", "second\n")
+    assert list(tmp_path.iterdir()) == [path]
+    plain = tmp_path / "plain.txt"
+    plain.write_text("")
+    assert path.stat().st_mode == plain.stat().st_mode
@@ -0,0 +1,85 @@
+import json
+import threading
+from types import SimpleNamespace
+import pytest
+from flask import Flask
+from model.vertex_model_registry import VertexModelRegistry
+import controller.tuning_job_controller as controller
+from utils.model_executor import ModelExecutor
+from utils.response_cache import response_cache
+
+
+class FakeChat:
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def send_message(self, text, stream=False):
+        with FakeChat.lock:
+            FakeChat.active += 1
+            FakeChat.peak = max(FakeChat.peak, FakeChat.active)
+        threading.Event().wait(0.02)
+        with FakeChat.lock:
+            FakeChat.active -= 1
+        return SimpleNamespace(text=f"answer to {text}")
+
+
+class FakeModel:
+    def start_chat(self, history):
+        assert history == []
+        return FakeChat()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(VertexModelRegistry, "_instance", VertexModelRegistry(model_factory=lambda *args: FakeModel()))
+    monkeypatch.setattr(controller, "model_executor", ModelExecutor(max_workers=4, max_queue=4))
+    app = Flask(__name__)
+    app.register_blueprint(controller.tuning_bp)
+    yield app.test_client()
+    response_cache.clear()
+
+
+def test_batch_streams_every_answer_with_its_id(client):
+    prompts = [{"id": f"q{i}", "msg": f"question {i}"} for i in range(10)]
+
+    response = client.post("/tuning-chat/batch", json={"prompts": prompts + ["question 0"], "max_concurrency": 3})
+
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    answers = {line["id"]: line["response"] for line in lines if "response" in line}
+    assert response.mimetype == "application/x-ndjson"
+    assert lines[-1]["done"] and lines[-1]["count"] == 11 and lines[-1]["errors"] == 0
+    assert answers["q7"].endswith("answer to question 7")
+    assert answers[10].endswith("answer to question 0")
+    assert 1 < FakeChat.peak <= 3
+
+
+def test_invalid_batches_are_rejected(client):
+    assert client.post("/tuning-chat/batch", json={"prompts": []}).status_code == 400
+    assert client.post("/tuning-chat/batch", json={"prompts": [{"id": 1, "msg": "a"}, {"id": 1, "msg": "b"}]}).status_code == 400
+    assert client.post("/tuning-chat/batch", json={"prompts": ["x"] * (controller.BATCH_MAX_PROMPTS + 1)}).status_code == 400
+
+
+def test_batch_answers_can_be_rendered_as_html(client):
+    response = client.post("/tuning-chat/batch", json={"prompts": [{"id": "a", "msg": "<b>x</b>"}], "format": "html"})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert lines[0]["response"] == "<p>answer to &lt;b&gt;x&lt;/b&gt;</p>"
+    assert client.post("/tuning-chat/batch", json={"prompts": ["q"], "format": "pdf"}).status_code == 400
+
+
+def test_callers_without_a_session_id_are_issued_their_own(client, monkeypatch):
+    sessions = []
+    monkeypatch.setattr(controller, "generate_chat_response",
+                        lambda text, session_id, context=None: sessions.append(session_id) or "answer")
+
+    first = client.post("/tuning-chat?msg=hello")
+    other = client.application.test_client().post("/tuning-chat?msg=hello")
+    issued = first.headers["X-Session-Id"]
+    again = client.application.test_client().post("/tuning-chat?msg=again", headers={"X-Session-Id": issued})
+    by_cookie = client.post("/tuning-chat?msg=again")
+
+    assert issued and other.headers["X-Session-Id"] != issued
+    assert controller.SESSION_COOKIE + "=" + issued in first.headers["Set-Cookie"]
+    assert "X-Session-Id" not in again.headers and "X-Session-Id" not in by_cookie.headers
+    assert sessions == [issued, other.headers["X-Session-Id"], issued, issued]
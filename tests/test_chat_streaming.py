@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+import pytest
+from model.conversation_store import ConversationStore
+from model.vertex_model_registry import VertexModelRegistry
+from utils.response_cache import ResponseCache
+from utils.services import stream_fine_tuned_chat_response
+
+
+class FakeChat:
+    def send_message(self, text, stream=False):
+        return iter([SimpleNamespace(text="Hello"), SimpleNamespace(text=", "), SimpleNamespace(text="world")])
+
+
+class FakeModel:
+    def start_chat(self, history):
+        return FakeChat()
+
+
+@pytest.fixture(autouse=True)
+def fake_registry(monkeypatch):
+    monkeypatch.setattr(VertexModelRegistry, "_instance", VertexModelRegistry(model_factory=lambda *args: FakeModel()))
+
+
+def test_completed_stream_records_exchange():
+    store = ConversationStore()
+    cache = ResponseCache()
+    chunks = list(stream_fine_tuned_chat_response("hi", "s", store=store, cache=cache))
+
+    assert chunks == ["Hello", ", ", "world"]
+    assert [turn.text for turn in store.get_history("s")] == ["hi", "Hello, world"]
+    assert list(stream_fine_tuned_chat_response("Hi?", "t", store=store, cache=cache)) == ["Hello, world"]
+
+
+def test_cached_answers_are_not_shared_across_histories():
+    store = ConversationStore()
+    cache = ResponseCache()
+    store.append_exchange("s", "Which courses teach Python?", "TDDE44 and TDDE23.")
+    store.append_exchange("t", "Which libraries are open late?", "Studenthuset and Valla.")
+
+    list(stream_fine_tuned_chat_response("And the second one?", "s", store=store, cache=cache))
+    list(stream_fine_tuned_chat_response("And the second one?", "t", store=store, cache=cache))
+
+    assert cache.stats()["entries"] == 2
+
+
+def test_aborted_stream_leaves_history_untouched():
+    store = ConversationStore()
+    cache = ResponseCache()
+    stream = stream_fine_tuned_chat_response("hi", "s", store=store, cache=cache)
+
+    assert next(stream) == "Hello"
+    stream.close()
+
+    assert store.get_history("s") == []
+    assert cache.stats()["entries"] == 0
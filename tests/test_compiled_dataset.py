@@ -0,0 +1,118 @@
+import json
+import pytest
+from data.compiled_dataset import CompiledDataset, compile_jsonl, is_compiled_dataset
+from data.filter_dataset_by_quality import iter_counted_examples
+from data.token_counting import WhitespaceTokenCounter, get_token_counter
+from utils.dataset_loader import iter_training_pairs
+
+
+@pytest.fixture
+def jsonl(tmp_path, gemini_line):
+    path = tmp_path / "dataset.jsonl"
+    lines = [gemini_line(f"question {i} om Linköping", " ".join(["answer"] * (i + 1))) for i in range(20)]
+    path.write_text("\n".join(lines[:10]) + "\n\n{broken\n" + "\n".join(lines[10:]) + "\n", encoding="utf-8")
+    return path, lines
+
+
+def test_compiled_dataset_round_trips_to_jsonl(tmp_path, jsonl):
+    path, lines = jsonl
+    compiled = tmp_path / "dataset.gds"
+
+    summary = compile_jsonl([str(path)], str(compiled), WhitespaceTokenCounter())
+
+    assert summary["examples"] == 20 and summary["skipped"] == 2
+    assert is_compiled_dataset(compiled) and not is_compiled_dataset(path)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["dataset.gds", "dataset.jsonl"]
+    with CompiledDataset(compiled) as dataset:
+        assert len(dataset) == 20
+        assert dataset[3] == json.loads(lines[3])
+        assert dataset.texts(-1) == ("question 19 om Linköping", " ".join(["answer"] * 20))
+        assert dataset.lengths(4) == {"user_tokens": 4, "model_tokens": 5, "user_chars": 23, "model_chars": 34}
+        assert dataset.counter == "whitespace"
+        with pytest.raises(IndexError):
+            dataset[20]
+        dataset.write_jsonl(tmp_path / "all.jsonl")
+        dataset.write_jsonl(tmp_path / "some.jsonl", [5, 1])
+
+    assert (tmp_path / "all.jsonl").read_text(encoding="utf-8") == "\n".join(lines) + "\n"
+    assert (tmp_path / "some.jsonl").read_text(encoding="utf-8") == f"{lines[5]}\n{lines[1]}\n"
+
+
+def test_sampling_selection_and_stats_use_the_index(tmp_path, jsonl):
+    path, _ = jsonl
+    compiled = tmp_path / "dataset.gds"
+    compile_jsonl(str(path), str(compiled), WhitespaceTokenCounter())
+
+    with CompiledDataset(compiled) as dataset:
+        sample = dataset.sample(5, seed=7)
+        assert sample == dataset.sample(5, seed=7) and len(set(sample)) == 5
+        assert dataset.sample(100) == list(range(20))
+        assert dataset.select(min_tokens=4, max_tokens=6) == [3, 4, 5]
+        stats = dataset.stats()
+
+    assert stats["examples"] == 20 and stats["duplicates"] == 0
+    assert stats["model_tokens"] == {"mean": 10.5, "p50": 11, "p95": 19, "max": 20}
+
+
+def test_hash_split_is_stable_and_keeps_duplicates_together(tmp_path, gemini_line):
+    path = tmp_path / "dataset.jsonl"
+    lines = [gemini_line(f"q{i}", f"a{i}") for i in range(200)]
+    path.write_text("\n".join(lines + lines[:50]) + "\n", encoding="utf-8")
+    compile_jsonl(str(path), str(tmp_path / "full.gds"))
+    path.write_text("\n".join(lines[100:]) + "\n", encoding="utf-8")
+    compile_jsonl(str(path), str(tmp_path / "half.gds"))
+
+    with CompiledDataset(tmp_path / "full.gds") as full, CompiledDataset(tmp_path / "half.gds") as half:
+        train, validation = full.split(0.25)
+        assert len(train) + len(validation) == 250
+        assert 30 < len([i for i in validation if i < 200]) < 70
+        assert full.stats()["duplicates"] == 50
+        # The copy of example i sits at 200 + i and always lands on the same side.
+        assert all((i in validation) == (200 + i in validation) for i in range(50))
+        # The split of an example does not depend on the rest of the dataset.
+        half_validation = {full.hash(100 + i) for i in half.split(0.25)[1]}
+        assert half_validation == {full.hash(i) for i in validation if 100 <= i < 200}
+        assert full.split(0.25, salt="other")[1] != validation
+
+
+def test_loader_and_filter_read_compiled_datasets(tmp_path, jsonl):
+    path, _ = jsonl
+    compiled = tmp_path / "dataset.gds"
+    compile_jsonl(str(path), str(compiled))
+    stats = {}
+
+    pairs = list(iter_training_pairs(str(compiled), shard_index=1, num_shards=3, stats=stats))
+
+    assert [q for q, _ in pairs] == [f"question {i} om Linköping" for i in range(1, 20, 3)]
+    assert stats["records"] == 20 and stats["examples"] == 7
+    for counter in (get_token_counter("approx"), WhitespaceTokenCounter()):
+        assert list(iter_counted_examples(str(compiled), counter)) == list(iter_counted_examples(str(path), counter))
+
+
+class LongNamedCounter(WhitespaceTokenCounter):
+    name = "sentencepiece:/models/tokenizer-förbättrad.model"
+    calls = 0
+
+    def count_batch(self, texts):
+        LongNamedCounter.calls += 1
+        return super().count_batch(texts)
+
+
+def test_counts_are_reused_for_counters_with_long_names(tmp_path, jsonl):
+    path, _ = jsonl
+    compiled = tmp_path / "dataset.gds"
+    counter = LongNamedCounter()
+    compile_jsonl(str(path), str(compiled), counter)
+    calls = LongNamedCounter.calls
+
+    with CompiledDataset(compiled) as dataset:
+        assert dataset.counter == counter.name and dataset[0]["contents"][0]["parts"][0]["text"] == "question 0 om Linköping"
+    counted = list(iter_counted_examples(str(compiled), counter))
+    assert LongNamedCounter.calls == calls and counted == list(iter_counted_examples(str(path), counter))
+
+
+def test_non_compiled_files_are_rejected(tmp_path, jsonl):
+    path, _ = jsonl
+
+    with pytest.raises(ValueError):
+        CompiledDataset(path)
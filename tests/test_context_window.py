@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+from model.context_window import ContextWindow
+from model.conversation_store import ConversationStore
+from model.vertex_model_registry import VertexModelRegistry
+from utils.services import generate_fine_tuned_chat_response
+
+
+class WordCounter:
+    def count_batch(self, texts):
+        return [len(text.split()) for text in texts]
+
+
+def history_of(store, exchanges):
+    # Words of up to four characters are one token for both counters.
+    for question, answer in exchanges:
+        store.append_exchange("s", question, answer)
+    return store.get_history("s")
+
+
+def test_turns_are_counted_once_when_recorded():
+    store = ConversationStore()
+    history = history_of(store, [("How much does housing cost?", "About 5000 SEK per month.")])
+
+    assert [turn.tokens for turn in history] == [7, 8]
+    assert store.stats()["tokens"] == 15
+
+
+def test_everything_is_kept_within_budget():
+    window = ContextWindow(max_tokens=100, response_tokens=0, counter=WordCounter())
+    history = history_of(ConversationStore(), [("q1 q1", "a1 a1")])
+
+    plan = window.fit(history, "new question", "some document text")
+
+    assert plan.history == history
+    assert plan.context == "some document text"
+    assert plan.usage["input_tokens"] == 2 + 4 + 3
+    assert plan.usage["dropped_turns"] == 0 and not plan.usage["context_truncated"]
+
+
+def test_oldest_exchanges_are_dropped_and_summarized():
+    window = ContextWindow(max_tokens=40, response_tokens=0, document_share=0.5, summary_tokens=20, counter=WordCounter())
+    answer = " ".join(["word"] * 10)
+    history = history_of(ConversationStore(), [("ask one", answer), ("ask two", answer), ("ask six", answer)])
+
+    plan = window.fit(history, "q", "d1 d2 d3 d4")
+
+    # 39 tokens after the question; the document claims 4, so two 12-token exchanges fit in 35.
+    assert [turn.text for turn in plan.history] == ["ask two", answer, "ask six", answer]
+    assert plan.history[0].role == "user"
+    assert plan.context.startswith("Earlier in this conversation the user asked: ask one")
+    assert plan.context.endswith("d1 d2 d3 d4")
+    assert plan.usage["dropped_turns"] == 2
+    assert plan.usage["input_tokens"] <= window.input_budget
+
+
+def test_long_document_context_is_truncated_to_its_share():
+    window = ContextWindow(max_tokens=21, response_tokens=0, document_share=0.5, summary_tokens=0, counter=WordCounter())
+    history = history_of(ConversationStore(), [("q a", "b c")])
+    document = " ".join(f"w{i}" for i in range(100))
+
+    plan = window.fit(history, "question", document)
+
+    assert plan.history == history
+    assert plan.context == " ".join(f"w{i}" for i in range(16))
+    assert plan.usage["context_truncated"] and plan.usage["input_tokens"] == 21
+    assert window.stats()["truncated_contexts"] == 1 and window.stats()["max_input_tokens"] == 21
+
+
+class RecordingChat:
+    def __init__(self, history, sent):
+        self.history = history
+        self.sent = sent
+
+    def send_message(self, text, stream=False):
+        self.sent.append((list(self.history), text))
+        return SimpleNamespace(text="answer " * 10)
+
+
+class RecordingModel:
+    def __init__(self):
+        self.sent = []
+
+    def make_content(self, role, text):
+        return text
+
+    def start_chat(self, history):
+        return RecordingChat(history, self.sent)
+
+
+def test_chat_calls_send_only_what_fits(monkeypatch):
+    model = RecordingModel()
+    monkeypatch.setattr(VertexModelRegistry, "_instance", VertexModelRegistry(model_factory=lambda *args: model))
+    store = ConversationStore()
+    window = ContextWindow(max_tokens=40, response_tokens=0, summary_tokens=0)
+
+    for i in range(5):
+        generate_fine_tuned_chat_response(f"question {i}", "s", store=store, context="Section text.", cache=None,
+                                          window=window)
+
+    history, prompt = model.sent[-1]
+    assert prompt == "Section text.\nquestion 4"
+    assert 0 < len(history) < 8 and history[0].startswith("question")
+    # Only the question is kept in history; the document context is retrieved again per question.
+    assert store.get_history("s")[0].text == "question 0"
+    assert window.stats()["requests"] == 5 and window.stats()["dropped_turns"] > 0
@@ -0,0 +1,60 @@
+from model.conversation_store import ConversationStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sessions_are_isolated():
+    store = ConversationStore()
+    store.append_exchange("alice", "hi", "hello alice")
+    store.append_exchange("bob", "hey", "hello bob")
+
+    assert [turn.text for turn in store.get_history("alice")] == ["hi", "hello alice"]
+    assert [turn.role for turn in store.get_history("bob")] == ["user", "model"]
+    assert store.get_history("carol") == []
+
+
+def test_session_is_trimmed_by_whole_exchanges():
+    store = ConversationStore(max_turns=4)
+    for i in range(5):
+        store.append_exchange("s", f"q{i}", f"a{i}")
+
+    history = store.get_history("s")
+    assert [turn.text for turn in history] == ["q3", "a3", "q4", "a4"]
+    assert store.get_history("s", max_turns=3)[0].role == "user"
+    assert store.stats()["trimmed_turns"] == 6
+
+
+def test_idle_and_lru_eviction_keep_memory_bounded():
+    clock = FakeClock()
+    store = ConversationStore(max_sessions=2, idle_ttl=60, clock=clock)
+    store.append_exchange("a", "q", "a")
+    clock.now = 10
+    store.append_exchange("b", "q", "a")
+    clock.now = 20
+    store.get_history("a")
+    store.append_exchange("c", "q", "a")
+
+    assert store.get_history("b") == []
+    assert store.stats()["sessions"] == 2
+
+    clock.now = 200
+    assert store.stats()["sessions"] == 2
+    store.get_history("a")
+    stats = store.stats()
+    assert stats["sessions"] == 0
+    assert stats["bytes"] == 0
+
+
+def test_total_byte_ceiling_evicts_least_recently_used():
+    store = ConversationStore(max_total_bytes=30)
+    store.append_exchange("a", "x" * 10, "y" * 10)
+    store.append_exchange("b", "x" * 10, "y" * 10)
+
+    assert store.get_history("a") == []
+    assert store.stats()["bytes"] == 20
@@ -0,0 +1,35 @@
+import json
+import utils.dataset_loader as dataset_loader
+from utils.dataset_loader import iter_training_pairs, load_tuning_examples
+
+
+def gemini_record(user, model):
+    return {
+        "systemInstruction": {"role": "system", "parts": [{"text": "You are an educational chatbot for LIU."}]},
+        "contents": [{"role": "user", "parts": [{"text": user}]}, {"role": "model", "parts": [{"text": model}]}],
+    }
+
+
+def test_json_array_is_streamed_across_read_boundaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_loader, "_READ_SIZE", 7)
+    path = tmp_path / "dataset.json"
+    items = [{"text_input": f"question {i}", "output": f"answer {i}"} for i in range(20)] + [{"text_input": "no output"}]
+    path.write_text(json.dumps(items, indent=2))
+    stats = {}
+
+    pairs = list(iter_training_pairs(str(path), stats=stats))
+
+    assert pairs == [(f"question {i}", f"answer {i}") for i in range(20)]
+    assert stats["skipped"] == 1
+
+
+def test_jsonl_sharding_and_limits(tmp_path):
+    path = tmp_path / "dataset.jsonl"
+    path.write_text("\n".join(json.dumps(gemini_record(f"q{i}", f"a{i}")) for i in range(10)) + "\n{broken\n")
+
+    assert [q for q, _ in iter_training_pairs(str(path), shard_index=1, num_shards=3)] == ["q1", "q4", "q7"]
+    assert len(list(iter_training_pairs(str(path), max_examples=4))) == 4
+
+    examples, stats = load_tuning_examples(str(path), lambda q, a: (q, a), batch_size=3, report_memory=True)
+    assert len(examples) == 10
+    assert stats["peak_memory_bytes"] > 0
@@ -0,0 +1,37 @@
+import json
+from data.dataset_pipeline import run_pipeline
+from data.gemini_schema import validate_example
+
+
+def example(user="What is LIU?", model="A university.", model_role="model"):
+    return {
+        "systemInstruction": {"role": "system", "parts": [{"text": "You are an educational chatbot for LIU."}]},
+        "contents": [
+            {"role": "user", "parts": [{"text": user}]},
+            {"role": model_role, "parts": [{"text": model}]},
+        ],
+    }
+
+
+def test_validator_reports_precise_reasons():
+    assert validate_example(example()) is None
+    assert validate_example(example(model_role="assistant")) == "contents[1].role must be 'model', got 'assistant'"
+    assert validate_example(example(user="  ")) == "contents[0].parts[0].text is empty"
+    assert validate_example({"contents": []}) == "missing systemInstruction"
+
+
+def test_pipeline_writes_cleaned_rejected_and_report_in_order(tmp_path):
+    first = tmp_path / "a.jsonl"
+    second = tmp_path / "b.jsonl"
+    first.write_text("\n".join(json.dumps(example(user=f"q{i}")) for i in range(5)) + "\n\n{not json\n")
+    second.write_text(json.dumps(example(model_role="assistant")) + "\n" + json.dumps(example(user="last")) + "\n")
+    output, rejected, report_path = tmp_path / "out.jsonl", tmp_path / "rejected.jsonl", tmp_path / "report.json"
+
+    report = run_pipeline([str(first), str(second)], str(output), str(rejected), str(report_path), workers=2, chunk_size=2)
+
+    users = [json.loads(line)["contents"][0]["parts"][0]["text"] for line in output.read_text().splitlines()]
+    assert users == ["q0", "q1", "q2", "q3", "q4", "last"]
+    rejected_lines = [json.loads(line) for line in rejected.read_text().splitlines()]
+    assert [(r["line"], r["source"] == str(second)) for r in rejected_lines] == [(7, False), (1, True)]
+    assert report == json.loads(report_path.read_text())
+    assert (report["valid"], report["rejected"], report["blank"]) == (6, 2, 1)
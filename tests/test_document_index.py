@@ -0,0 +1,42 @@
+from utils.document_index import BM25Index, chunk_text
+from utils.transcription_cache import DocumentStore
+
+DOCUMENT = (
+    " ".join(f"Section {i}. The library opens early on weekdays and students may borrow books." for i in range(40))
+    + " Tuition fees for the engineering program are 5000 dollars per semester. "
+    + " ".join(f"Paragraph {i} covers campus parking rules and shuttle buses." for i in range(40))
+)
+
+
+def test_chunks_are_bounded_and_cover_the_document():
+    chunks = chunk_text(DOCUMENT, chunk_words=50, overlap_words=10)
+
+    assert len(chunks) > 1
+    assert all(len(chunk.split()) <= 60 for chunk in chunks)
+    assert any("Tuition fees" in chunk for chunk in chunks)
+
+
+def test_bm25_ranks_the_relevant_chunk_first():
+    index = BM25Index(["The library opens at 8 am.", "Tuition fees are 5000 dollars.", "Parking is free."])
+
+    assert index.search("How much are the tuition fees?", k=1)[0][0] == 1
+    assert index.search("quantum chromodynamics") == []
+
+
+def test_store_retrieves_top_chunks_per_document_and_reports_savings():
+    store = DocumentStore(max_documents=2, top_k=2, chunk_words=50, overlap_words=10)
+    store.ingest("uploads/a.pdf", DOCUMENT)
+    store.ingest("uploads/b.pdf", "A different document about admissions.")
+
+    context, info = store.retrieve("uploads/a.pdf", "What are the engineering tuition fees?")
+
+    assert "Tuition fees" in context
+    assert info["chunks"] <= 2 < info["total_chunks"]
+    assert info["saved_tokens"] > 0
+    # The document's tokens were counted once at ingestion.
+    assert info["document_tokens"] == store.get("uploads/a.pdf").tokens > info["context_tokens"]
+    assert store.retrieve("uploads/missing.pdf", "anything") == ("", None)
+
+    store.ingest("uploads/c.pdf", "Third document.")
+    assert store.get("uploads/b.pdf") is None
+    assert store.get("uploads/a.pdf") is not None
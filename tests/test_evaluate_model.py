@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from model.model_backends import StubModel
+from data.evaluate_model import evaluate, keyword_hit_rate, load_checkpoint, token_f1
+
+
+def _write_dataset(path, pairs):
+    with open(path, "w", encoding="utf-8") as f:
+        for question, answer in pairs:
+            f.write(json.dumps({
+                "systemInstruction": {"role": "system", "parts": [{"text": "You answer questions about LIU."}]},
+                "contents": [
+                    {"role": "user", "parts": [{"text": question}]},
+                    {"role": "model", "parts": [{"text": answer}]},
+                ],
+            }) + "\n")
+        f.write("not json\n")
+
+
+def test_answer_metrics():
+    assert token_f1("The library opens at 8 am.", "library opens at 8 am") == 1.0
+    assert token_f1("parking is free", "tuition is high") == pytest.approx(1 / 3)
+    assert keyword_hit_rate("Tuition is 5000 dollars", "Tuition costs 5000 dollars per semester") == pytest.approx(3 / 5)
+
+
+def test_interrupted_run_resumes_from_the_checkpoint(tmp_path):
+    dataset = tmp_path / "validation.jsonl"
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    pairs = [(f"Question {i}?", f"Answer number {i}.") for i in range(12)]
+    _write_dataset(dataset, pairs)
+    model = StubModel(latency_ms=1, answers={q: a for q, a in pairs[:6]})
+
+    first = evaluate(str(dataset), model, str(checkpoint), concurrency=4, max_examples=5)
+    assert first["examples"] == 5 and first["exact_match"] == 1.0
+
+    summary = evaluate(str(dataset), model, str(checkpoint), concurrency=4, rate=1000)
+
+    assert model.calls == 12
+    assert summary["evaluated_this_run"] == 7
+    assert summary["examples"] == 12 and summary["errors"] == 0
+    assert summary["exact_match"] == pytest.approx(6 / 12)
+    assert summary["latency_ms"]["p50"] >= 1
+    assert len(load_checkpoint(str(checkpoint))) == 12
+
+
+def test_checkpoint_lines_without_an_id_are_skipped(tmp_path, capsys):
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    checkpoint.write_text('{"id": "a", "f1": 1.0}\n{"f1": 0.5}\n[1, 2]\n\n{"id": "b", "f1": 0.0}\n{"id": "c", "f1"')
+
+    assert sorted(load_checkpoint(str(checkpoint))) == ["a", "b"]
+    assert "line 2" in capsys.readouterr().out
+
+
+def test_a_checkpoint_cut_mid_line_keeps_the_next_results(tmp_path):
+    dataset = tmp_path / "validation.jsonl"
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    pairs = [(f"Question {i}?", f"Answer number {i}.") for i in range(4)]
+    _write_dataset(dataset, pairs)
+    model = StubModel(latency_ms=1, answers=dict(pairs))
+
+    evaluate(str(dataset), model, str(checkpoint), concurrency=1, max_examples=2)
+    checkpoint.write_text(checkpoint.read_text() + '{"id": "cut sh', encoding="utf-8")
+    evaluate(str(dataset), model, str(checkpoint), concurrency=1)
+
+    assert len(load_checkpoint(str(checkpoint))) == 4
+    assert model.calls == 4
+
+
+def test_the_evaluation_script_does_not_load_socketio():
+    script = "import sys, data.evaluate_model; print('flask_socketio' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                            cwd=os.path.join(os.path.dirname(__file__), "..", "backend"))
+    assert result.stdout.strip() == "False"
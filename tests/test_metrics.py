@@ -0,0 +1,126 @@
+from types import SimpleNamespace
+import pytest
+from flask import Flask
+from controller.metrics_controller import metrics_bp
+from utils.metrics import MetricsRegistry, errors, http_requests, instrument_app, instrument_boto_client, track_upstream, upstream_duration
+
+
+def test_counters_and_histograms_render_in_the_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests.", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    requests.labels('/a"b').inc()
+    requests.labels('/a"b').inc(2)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{route="/a\\"b"} 3' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_sum 3.65" in lines
+    assert "latency_seconds_count 4" in lines
+
+
+def test_callback_gauges_are_read_at_render_time():
+    registry = MetricsRegistry()
+    depth = {"value": 1}
+    registry.gauge("queue_depth", "Depth.", callback=lambda: depth["value"])
+    registry.gauge("by_state", "States.", ("state",), callback=lambda: {("running",): 2})
+    registry.gauge("broken", "Raises.", callback=lambda: 1 / 0)
+    depth["value"] = 5
+
+    lines = registry.render().splitlines()
+
+    assert "queue_depth 5" in lines
+    assert 'by_state{state="running"} 2' in lines
+    assert not any(line.startswith("broken ") for line in lines)
+
+
+def test_wrong_label_count_and_duplicate_names_are_rejected():
+    registry = MetricsRegistry()
+    counter = registry.counter("c_total", "C.", ("a", "b"))
+    with pytest.raises(ValueError):
+        counter.labels("only-one")
+    with pytest.raises(ValueError):
+        registry.counter("c_total", "Again.")
+
+
+def test_track_upstream_times_calls_and_counts_failures():
+    before = sum(upstream_duration.labels("test", "op").counts)
+    with pytest.raises(KeyError):
+        with track_upstream("test", "op"):
+            raise KeyError("missing")
+
+    assert sum(upstream_duration.labels("test", "op").counts) == before + 1
+    assert errors.labels("test", "KeyError").value >= 1
+
+
+def test_boto_clients_are_timed_through_event_hooks():
+    handlers = {}
+    client = SimpleNamespace(meta=SimpleNamespace(events=SimpleNamespace(
+        register=lambda event, handler: handlers.__setitem__(event, handler))))
+    instrument_boto_client(client, "fake-s3")
+    context = {}
+    operation = SimpleNamespace(name="PutObject")
+
+    handlers["before-call"](model=operation, context=context)
+    handlers["after-call"](model=operation, context=context, http_response=None, parsed={})
+    handlers["after-call-error"](model=operation, context=context, exception=TimeoutError())
+    # Error responses are not exceptions yet when botocore emits after-call.
+    handlers["after-call"](model=operation, context=context, http_response=SimpleNamespace(status_code=404),
+                           parsed={"Error": {"Code": "NoSuchKey"}})
+    handlers["after-call"](model=operation, context=context, http_response=SimpleNamespace(status_code=503), parsed={})
+
+    assert sum(upstream_duration.labels("fake-s3", "PutObject").counts) == 4
+    assert errors.labels("fake-s3", "TimeoutError").value == 1
+    assert errors.labels("fake-s3", "NoSuchKey").value == 1 and errors.labels("fake-s3", "HTTP503").value == 1
+
+
+def test_metrics_route_reports_requests_by_route_and_status():
+    app = Flask(__name__)
+    instrument_app(app)
+    app.register_blueprint(metrics_bp)
+
+    @app.route("/items/<item_id>")
+    def item(item_id):
+        return "ok"
+
+    client = app.test_client()
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/missing")
+
+    response = client.get("/metrics")
+    body = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert http_requests.labels("app", "/items/<item_id>", "GET", 200).value == 2
+    assert 'http_requests_total{blueprint="app",route="unmatched",method="GET",status="404"}' in body
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert "socketio_connected_clients 0" in body
+    assert "model_executor_queued 0" in body
+
+
+def test_unhandled_exceptions_are_counted_once():
+    app = Flask(__name__)
+    instrument_app(app)
+
+    @app.route("/broken")
+    def broken():
+        raise LookupError("boom")
+
+    @app.route("/unavailable")
+    def unavailable():
+        return "down", 503
+
+    before = errors.labels("http", "HTTP500").value, errors.labels("http", "LookupError").value
+    assert app.test_client().get("/broken").status_code == 500
+    assert app.test_client().get("/unavailable").status_code == 503
+
+    assert (errors.labels("http", "HTTP500").value, errors.labels("http", "LookupError").value) == (before[0], before[1] + 1)
+    assert errors.labels("http", "HTTP503").value >= 1
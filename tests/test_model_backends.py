@@ -0,0 +1,44 @@
+import pytest
+from model.conversation_store import ConversationStore
+from model.model_backends import StubBackend, StubModel, StubModelError, get_model_backend, vertex_backend
+from model.vertex_model_registry import VertexModelRegistry
+from utils.services import generate_fine_tuned_chat_response, stream_fine_tuned_chat_response
+
+
+@pytest.fixture
+def stub_registry(monkeypatch):
+    monkeypatch.setenv("STUB_LATENCY_MS", "0")
+    registry = VertexModelRegistry(model_factory=get_model_backend("stub"))
+    monkeypatch.setattr(VertexModelRegistry, "_instance", registry)
+    return registry
+
+
+def test_backend_is_selected_from_the_environment(monkeypatch):
+    monkeypatch.setenv("MODEL_BACKEND", "stub:5")
+    backend = get_model_backend()
+
+    assert isinstance(backend, StubBackend) and backend.options["latency_ms"] == 5
+    assert get_model_backend("vertex") is vertex_backend
+    with pytest.raises(ValueError):
+        get_model_backend("mystery")
+
+
+def test_chat_runs_end_to_end_on_the_stub(stub_registry):
+    store = ConversationStore()
+
+    first = generate_fine_tuned_chat_response("When does the library open?", "s", store=store, cache=None)
+    chunks = list(stream_fine_tuned_chat_response("And on Sundays?", "s", store=store, cache=None))
+
+    assert first.endswith("Stub answer to: When does the library open?")
+    assert "".join(chunks) == "Stub answer to: And on Sundays?"
+    assert [turn.content for turn in store.get_history("s")][:2] == [
+        ("user", "When does the library open?"), ("model", "Stub answer to: When does the library open?")
+    ]
+
+
+def test_stub_injects_failures():
+    model = StubModel(latency_ms=0, failure_rate=1.0)
+
+    with pytest.raises(StubModelError):
+        model.generate_content("hello")
+    assert (model.calls, model.failures) == (1, 1)
@@ -0,0 +1,106 @@
+import gc
+import threading
+import time
+import pytest
+from utils.model_executor import ExecutorBusy, ModelCallTimeout, ModelExecutor
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    executor = ModelExecutor(max_workers=1, max_queue=1, queue_timeout=5, call_timeout=5)
+    release = threading.Event()
+    running = executor.submit(release.wait)
+    queued = executor.submit(lambda: "queued")
+
+    with pytest.raises(ExecutorBusy) as busy:
+        executor.submit(lambda: "rejected")
+
+    assert busy.value.status == 429 and busy.value.retry_after >= 1
+    stats = executor.stats()
+    assert (stats["running"], stats["queued"], stats["rejected"]) == (1, 1, 1)
+    release.set()
+    assert executor.wait(running) is True
+    assert executor.wait(queued) == "queued"
+    assert executor.stats()["completed"] == 2
+
+
+def test_call_waiting_too_long_in_the_queue_is_cancelled():
+    executor = ModelExecutor(max_workers=1, max_queue=4, queue_timeout=0.05, call_timeout=5)
+    release = threading.Event()
+    executor.submit(release.wait)
+    ran = []
+
+    with pytest.raises(ExecutorBusy) as busy:
+        executor.run(ran.append, "late")
+
+    assert busy.value.status == 503
+    release.set()
+    time.sleep(0.05)
+    assert ran == []
+    assert executor.stats()["queue_timeouts"] == 1
+    assert executor.stats()["queued"] == 0
+
+
+def test_stuck_call_times_out_and_still_counts_against_the_pool():
+    executor = ModelExecutor(max_workers=1, max_queue=0, call_timeout=0.05)
+    release = threading.Event()
+
+    with pytest.raises(ModelCallTimeout):
+        executor.run(release.wait)
+
+    with pytest.raises(ExecutorBusy):
+        executor.submit(lambda: None)
+    release.set()
+
+
+def test_stream_yields_items_and_closing_stops_the_worker():
+    executor = ModelExecutor(max_workers=1, max_queue=0, call_timeout=5)
+    closed = threading.Event()
+
+    def chunks():
+        try:
+            for i in range(1000):
+                yield f"chunk {i}"
+        finally:
+            closed.set()
+
+    stream = executor.stream(chunks)
+    assert next(stream) == "chunk 0"
+    stream.close()
+
+    assert closed.wait(1)
+    assert list(executor.stream(lambda: iter(["a", "b"]))) == ["a", "b"]
+
+
+def test_waiters_are_woken_by_the_worker_instead_of_polling():
+    waits = []
+
+    def wait(event, timeout):
+        waits.append(timeout)
+        event.wait(timeout)
+
+    executor = ModelExecutor(max_workers=1, max_queue=0, call_timeout=5, wait=wait)
+
+    assert executor.run(lambda: time.sleep(0.3) or "done") == "done"
+    assert len(waits) <= 2
+    waits.clear()
+    assert list(executor.stream(lambda: (time.sleep(0.1) or i for i in range(3)))) == [0, 1, 2]
+    assert len(waits) <= 6
+
+
+def test_a_stream_dropped_without_iterating_stops_the_worker():
+    executor = ModelExecutor(max_workers=1, max_queue=0, call_timeout=5)
+    closed = threading.Event()
+
+    def chunks():
+        try:
+            while True:
+                time.sleep(0.01)
+                yield "chunk"
+        finally:
+            closed.set()
+
+    stream = executor.stream(chunks)
+    del stream
+    gc.collect()
+
+    assert closed.wait(1)
@@ -0,0 +1,90 @@
+import pytest
+from flask import Flask
+import utils.aws_services as aws
+import controller.custom_document_processing_controller as controller
+
+
+class FakePaginator:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def paginate(self, **kwargs):
+        return iter(self.pages)
+
+
+class FakeS3:
+    def __init__(self):
+        self.completed = None
+
+    def create_multipart_upload(self, Bucket, Key, ContentType):
+        return {"UploadId": "upload-1"}
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3/{Params['Key']}?partNumber={Params['PartNumber']}&uploadId={Params['UploadId']}"
+
+    def get_paginator(self, name):
+        # Two pages, out of order, as a resumed upload might report them.
+        return FakePaginator([
+            {"Parts": [{"PartNumber": 3, "ETag": '"c"', "Size": 10}]},
+            {"Parts": [{"PartNumber": 1, "ETag": '"a"', "Size": 10}, {"PartNumber": 2, "ETag": '"b"', "Size": 10}]},
+        ])
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.completed = MultipartUpload["Parts"]
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(aws, "_s3_client", fake)
+    return fake
+
+
+def test_part_size_keeps_large_files_within_the_part_limit():
+    assert aws.part_size_for(None) == aws.MULTIPART_PART_SIZE
+    size = 200 * 1024 ** 3
+    assert size / aws.part_size_for(size) <= aws.MAX_PARTS
+
+
+def test_start_and_presign_parts(s3):
+    upload = aws.start_multipart_upload("scan.pdf", "application/pdf", file_size=3 * aws.MULTIPART_PART_SIZE + 1)
+
+    assert upload["s3_key"].startswith("uploads/") and upload["s3_key"].endswith("_scan.pdf")
+    assert upload["part_count"] == 4
+    urls = aws.presign_upload_parts(upload["s3_key"], upload["upload_id"], [2, 1])
+    assert [part["part_number"] for part in urls] == [2, 1]
+    assert "partNumber=2&uploadId=upload-1" in urls[0]["url"]
+    with pytest.raises(ValueError):
+        aws.presign_upload_parts(upload["s3_key"], upload["upload_id"], [0])
+
+
+def test_complete_uses_uploaded_parts_in_order_when_client_lost_its_etags(s3):
+    assert [part["part_number"] for part in aws.list_uploaded_parts("uploads/x", "upload-1")] == [1, 2, 3]
+
+    result = aws.complete_multipart_upload("uploads/x", "upload-1")
+
+    assert result == {"s3_key": "uploads/x", "parts": 3}
+    assert s3.completed == [{"PartNumber": 1, "ETag": '"a"'}, {"PartNumber": 2, "ETag": '"b"'}, {"PartNumber": 3, "ETag": '"c"'}]
+
+
+def test_upload_keys_must_stay_in_the_uploads_prefix():
+    assert aws.is_upload_key("uploads/abc_scan.pdf")
+    assert not aws.is_upload_key("processed/abc_scan.pdf.txt")
+    assert not aws.is_upload_key("uploads/../secrets")
+    assert not aws.is_upload_key(["uploads/abc_scan.pdf"])
+
+
+def test_presign_requests_over_the_part_limit_are_rejected_before_signing(s3, monkeypatch):
+    signed = []
+    monkeypatch.setattr(s3, "generate_presigned_url", lambda operation, Params, ExpiresIn: signed.append(Params) or "url")
+    app = Flask(__name__)
+    app.register_blueprint(controller.Custom_document_tuning_bp)
+    client = app.test_client()
+    upload = {"s3_key": "uploads/abc_scan.pdf", "upload_id": "upload-1"}
+
+    assert client.post("/multipart/presign", json={**upload, "part_count": 10 ** 9}).status_code == 400
+    assert client.post("/multipart/presign", json={**upload, "part_numbers": [1] * (aws.MAX_PARTS + 1)}).status_code == 400
+    assert client.post("/multipart/presign", json={**upload, "part_numbers": "123"}).status_code == 400
+    assert client.post("/multipart/presign", json={**upload, "s3_key": {"key": "uploads/x"}, "part_count": 1}).status_code == 400
+    assert signed == []
+    assert len(client.post("/multipart/presign", json={**upload, "part_count": 3}).get_json()["parts"]) == 3
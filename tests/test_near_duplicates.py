@@ -0,0 +1,80 @@
+import json
+import pytest
+from data.near_duplicates import MinHashIndex, contamination_report, deduplicate, main
+
+
+def write_examples(path, pairs):
+    lines = []
+    for user, model in pairs:
+        lines.append(json.dumps({
+            "systemInstruction": {"role": "system", "parts": [{"text": "You are an educational chatbot for LIU."}]},
+            "contents": [{"role": "user", "parts": [{"text": user}]}, {"role": "model", "parts": [{"text": model}]}],
+        }))
+    path.write_text("\n".join(lines) + "\n")
+
+
+ANSWER = "The School of Engineering at LIU prepares students for professional careers with strong technical skills."
+
+
+def test_near_duplicates_are_dropped_incrementally(tmp_path):
+    first, second, output = tmp_path / "a.jsonl", tmp_path / "b.jsonl", tmp_path / "out.jsonl"
+    write_examples(first, [
+        ("What is the purpose of the School of Engineering at LIU?", ANSWER),
+        ("When was LIU founded?", "LIU was founded in 1987 in Beirut, Lebanon."),
+    ])
+    write_examples(second, [
+        ("What is the purpose of the School of Engineering at LIU ?", ANSWER),
+        ("Does LIU offer scholarships to students?", "Yes, LIU offers merit and need-based scholarships."),
+    ])
+    index = MinHashIndex()
+
+    assert deduplicate([str(first)], str(output), index)["kept"] == 2
+    index.save(str(tmp_path / "index.pkl"))
+    index = MinHashIndex.load(str(tmp_path / "index.pkl"))
+    result = deduplicate([str(first), str(second)], str(output), index)
+
+    assert result["processed_files"] == [str(second)]
+    assert (result["kept"], result["dropped"]) == (1, 1)
+    assert len(output.read_text().splitlines()) == 3
+
+
+def test_contamination_report_finds_leaked_validation_examples(tmp_path):
+    train, validation = tmp_path / "train.jsonl", tmp_path / "validation.jsonl"
+    write_examples(train, [("What is the purpose of the School of Engineering at LIU?", ANSWER)])
+    write_examples(validation, [
+        ("what is the purpose of the school of engineering at LIU", ANSWER),
+        ("Where is the main LIU campus located?", "The main campus is in Beirut."),
+    ])
+
+    report = contamination_report([str(train)], [str(validation)])
+
+    assert report["contaminated"] == 1
+    assert report["pairs"][0]["validation"].endswith("validation.jsonl:1")
+
+
+def test_reruns_never_repeat_examples_in_the_output(tmp_path):
+    source, output, state = tmp_path / "a.jsonl", tmp_path / "out.jsonl", tmp_path / "index.pkl"
+    write_examples(source, [("When was LIU founded?", "LIU was founded in 1987 in Beirut, Lebanon.")])
+
+    with pytest.raises(ValueError):
+        deduplicate([str(source)], str(source))
+    deduplicate([str(source)], str(output))
+    deduplicate([str(source)], str(output))
+    assert len(output.read_text().splitlines()) == 1
+
+    assert main(["dedup", str(source), "--output", str(output), "--state", str(state)]) == 0
+    output.write_text(output.read_text() * 2)
+    with pytest.raises(ValueError):
+        main(["dedup", str(source), "--output", str(output), "--state", str(state)])
+
+
+def test_a_saved_index_uses_the_threshold_given_on_the_command_line(tmp_path):
+    source, output, state = tmp_path / "a.jsonl", tmp_path / "out.jsonl", tmp_path / "index.pkl"
+    write_examples(source, [("When was LIU founded?", "LIU was founded in 1987 in Beirut, Lebanon.")])
+    main(["dedup", str(source), "--output", str(output), "--state", str(state), "--threshold", "0.9"])
+
+    assert MinHashIndex.load(str(state)).threshold == 0.9
+    main(["dedup", str(source), "--output", str(output), "--state", str(state)])
+    assert MinHashIndex.load(str(state)).threshold == 0.9
+    main(["dedup", str(source), "--output", str(output), "--state", str(state), "--threshold", "0.7"])
+    assert MinHashIndex.load(str(state)).threshold == 0.7
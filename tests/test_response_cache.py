@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+import threading
+import time
+import pytest
+from utils.response_cache import ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_key_ignores_case_spacing_and_trailing_punctuation():
+    key = ResponseCache.make_key("What is LIU?", "", "endpoint")
+
+    assert ResponseCache.make_key("  what   is liu ", "", "endpoint") == key
+    assert ResponseCache.make_key("What is LIU?", "a document", "endpoint") != key
+    assert ResponseCache.make_key("What is LIU?", "", "other-endpoint") != key
+    turn = SimpleNamespace(role="user", text="Tell me about Linköping.")
+    assert ResponseCache.make_key("What is LIU?", "", "endpoint", [turn]) != key
+
+
+def test_entries_expire_and_lru_is_bounded():
+    clock = FakeClock()
+    cache = ResponseCache(max_entries=2, ttl=10, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    clock.now = 11
+    assert cache.get("c") is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 1
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = ResponseCache()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait()
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()["coalesced"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(status for _, status in results) == ["coalesced"] * 4 + ["miss"]
+    assert cache.get_or_compute("k", compute) == ("answer", "hit")
+
+
+def test_failed_compute_is_not_cached():
+    cache = ResponseCache()
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", fail)
+    assert cache.get_or_compute("k", lambda: "ok") == ("ok", "miss")
@@ -0,0 +1,92 @@
+import base64
+from types import SimpleNamespace
+import pytest
+from utils.response_renderer import StreamingRenderer, parse_format, render_response, render_stream
+
+
+def part(text=None, code=None, output=None, image=None, mime_type="image/png"):
+    return SimpleNamespace(
+        text=text,
+        executable_code=SimpleNamespace(code=code) if code else None,
+        code_execution_result=SimpleNamespace(output=output) if output else None,
+        inline_data=SimpleNamespace(data=image, mime_type=mime_type) if image else None,
+    )
+
+
+def response(*parts):
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=list(parts)))])
+
+
+def test_text_is_escaped_and_split_into_paragraphs_across_chunks():
+    renderer = StreamingRenderer("html")
+    deltas = [renderer.feed(chunk) for chunk in ["\nFees are <b>low", "</b> & fair.\n", "\nHousing", " is\nnear."]]
+    deltas.append(renderer.close())
+
+    assert "".join(deltas) == "<p>Fees are &lt;b&gt;low&lt;/b&gt; &amp; fair.</p><p>Housing is<br/>near.</p>"
+    # The trailing newline is held back until the next chunk shows whether it ends the paragraph.
+    assert deltas[1] == "&lt;/b&gt; &amp; fair."
+
+
+def test_streamed_deltas_add_up_to_the_whole_rendering():
+    chunks = [response(part(text=f"word{i} " + ("\n\n" if i % 3 == 2 else ""))) for i in range(10)]
+    chunks.insert(4, response(part(code="print('<hi>')"), part(output="<hi>")))
+
+    streamed = "".join(render_stream(iter(chunks), "html"))
+
+    assert streamed == render_response(chunks, "html")
+    assert "<hr/><pre>print('&lt;hi&gt;')</pre><hr/><pre>&lt;hi&gt;</pre><hr/><p>word4" in streamed
+
+
+def test_markdown_and_text_formats_pass_text_through():
+    chunks = [response(part(text="**Yes**, see:")), response(part(code="x = 1"))]
+
+    assert render_response(chunks, "markdown") == "**Yes**, see:\n\n```python\nx = 1\n```"
+    assert render_response(chunks, "text") == "**Yes**, see:\nx = 1"
+    assert render_response("plain <answer>", "text") == "plain <answer>"
+    with pytest.raises(ValueError):
+        parse_format("pdf")
+
+
+def test_large_images_are_offloaded_and_small_ones_inlined():
+    stored = []
+
+    def store_image(data, mime_type):
+        stored.append((data, mime_type))
+        return "https://bucket.example/responses/abc.png?X-Amz-Signature=1&x=2"
+
+    renderer = StreamingRenderer("html", store_image=store_image, inline_image_limit=8)
+    small = renderer.feed(response(part(image=b"tiny")))
+    large = renderer.feed(response(part(image=b"x" * 100, mime_type="image/jpeg")))
+    encoded = renderer.feed(response(part(image=base64.b64encode(b"y" * 30).decode())))
+
+    assert small == f'<img src="data:image/png;base64,{base64.b64encode(b"tiny").decode()}" alt="Image result"/>'
+    assert large == '<hr/><img src="https://bucket.example/responses/abc.png?X-Amz-Signature=1&amp;x=2" alt="Image result"/>'
+    assert stored == [(b"x" * 100, "image/jpeg"), (b"y" * 30, "image/png")]
+    assert encoded.startswith("<hr/><img src=\"https://bucket.example")
+    assert renderer.images_offloaded == 2
+
+
+def test_failed_offload_falls_back_to_an_inline_image():
+    def broken_store(data, mime_type):
+        raise ConnectionError("S3 unavailable")
+
+    html = render_response(response(part(image=b"z" * 100)), "html", store_image=broken_store)
+
+    assert html.startswith('<img src="data:image/png;base64,')
+
+
+def test_closing_the_rendered_stream_closes_the_source():
+    closed = []
+
+    def source():
+        try:
+            yield "one "
+            yield "two"
+        finally:
+            closed.append(True)
+
+    rendered = render_stream(source(), "html")
+    assert next(rendered) == "<p>one "
+    rendered.close()
+
+    assert closed == [True]
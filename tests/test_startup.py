@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+
+def test_importing_the_app_does_not_load_heavy_sdks():
+    script = "import sys, app; print(' '.join(m for m in ('vertexai', 'google.genai', 'google.generativeai', 'boto3') if m in sys.modules))"
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+
+    result = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
@@ -0,0 +1,77 @@
+import threading
+from botocore.exceptions import ClientError
+from utils.textract_services import MIN_PART_SIZE, extract_text_to_s3
+
+
+class FakeTextract:
+    def __init__(self, pages, lines_per_page=3, throttle_first=False):
+        self.pages = pages
+        self.lines_per_page = lines_per_page
+        self.throttle_first = throttle_first
+        self.calls = 0
+
+    def get_document_text_detection(self, JobId, MaxResults, NextToken=None):
+        self.calls += 1
+        if self.throttle_first and self.calls == 1:
+            raise ClientError({"Error": {"Code": "ThrottlingException"}}, "GetDocumentTextDetection")
+        page = int(NextToken or 0)
+        blocks = [{"BlockType": "PAGE"}] + [
+            {"BlockType": "LINE", "Text": f"page {page} line {i}"} for i in range(self.lines_per_page)
+        ] + [{"BlockType": "WORD", "Text": "ignored"}]
+        response = {"JobStatus": "SUCCEEDED", "Blocks": blocks}
+        if page + 1 < self.pages:
+            response["NextToken"] = str(page + 1)
+        return response
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.parts = {}
+        self.aborted = []
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key, ContentType):
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self._lock:
+            self.parts[PartNumber] = Body
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        self.objects[Key] = b"".join(self.parts[number] for number in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted.append(Key)
+
+
+def test_small_document_is_written_with_one_put_and_retries_throttling():
+    s3 = FakeS3()
+    textract = FakeTextract(pages=3, throttle_first=True)
+
+    result = extract_text_to_s3("job", "uploads/abc_notes.pdf", textract=textract, s3=s3, keep_text=True,
+                                sleep=lambda delay: None)
+
+    assert result["output_key"] == "processed/abc_notes.pdf.txt"
+    assert (result["pages"], result["lines"]) == (3, 9)
+    assert s3.objects["processed/abc_notes.pdf.txt"].decode().splitlines()[-1] == "page 2 line 2"
+    assert result["text"].startswith("page 0 line 0\npage 0 line 1")
+
+
+def test_large_document_is_streamed_as_ordered_multipart_parts():
+    s3 = FakeS3()
+    # Each page carries ~1 MiB of text, so several parts are needed.
+    textract = FakeTextract(pages=16, lines_per_page=60000)
+
+    result = extract_text_to_s3("job", "uploads/big.pdf", textract=textract, s3=s3, max_concurrency=3)
+
+    body = s3.objects["processed/big.pdf.txt"]
+    assert len(s3.parts) > 1
+    assert all(len(part) >= MIN_PART_SIZE for number, part in s3.parts.items() if number < len(s3.parts))
+    assert len(body) == result["bytes"] and "text" not in result
+    assert body.decode().splitlines()[60000] == "page 1 line 0"
@@ -0,0 +1,65 @@
+import json
+from data.filter_dataset_by_quality import process_file
+from data.token_counting import (ApproximateTokenCounter, ReservoirSampler, StratifiedReservoirSampler,
+                                 get_token_counter)
+
+
+def test_counters_count_batches():
+    texts = ["Hello, world!", "internationalization"]
+
+    assert get_token_counter("whitespace").count_batch(texts) == [2, 1]
+    assert ApproximateTokenCounter().count_batch(texts) == [6, 5]
+
+
+def test_reservoir_is_bounded_uniform_and_seeded():
+    first, second = ReservoirSampler(10, seed=7), ReservoirSampler(10, seed=7)
+    for i in range(1000):
+        first.add(i)
+        second.add(i)
+
+    assert len(first.items) == 10
+    assert first.items == second.items
+    assert first.seen == 1000
+
+
+def test_stratified_sample_keeps_stratum_shares():
+    sampler = StratifiedReservoirSampler(10, seed=1)
+    for i in range(800):
+        sampler.add("short", ("short", i))
+    for i in range(200):
+        sampler.add("long", ("long", i))
+
+    strata = [stratum for stratum, _ in sampler.items]
+    assert (strata.count("short"), strata.count("long")) == (8, 2)
+
+
+def test_stratified_sample_is_not_a_file_order_prefix():
+    sampler = StratifiedReservoirSampler(100, seed=3)
+    for i in range(150):
+        sampler.add("a", ("a", i))
+    for i in range(50):
+        sampler.add("b", ("b", i))
+
+    sample = sampler.items
+    b_items = sorted(i for stratum, i in sample if stratum == "b")
+    assert len(b_items) == 25 and b_items != list(range(25))
+    assert max(b_items) >= 25
+    assert sample == sampler.items
+
+
+def test_process_file_filters_by_tokens_and_samples(tmp_path):
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    lines = []
+    for i, answer in enumerate(["Too short.", "LIU offers many undergraduate and graduate programs to students."] * 5):
+        lines.append(json.dumps({
+            "systemInstruction": {"role": "system", "parts": [{"text": "You are an educational chatbot for LIU."}]},
+            "contents": [{"role": "user", "parts": [{"text": f"Question number {i} about the university?"}]},
+                         {"role": "model", "parts": [{"text": answer}]}],
+        }))
+    source.write_text("\n".join(lines) + "\n")
+
+    report = process_file(str(source), str(output), 3, get_token_counter("whitespace"), min_tokens=5, seed=1)
+
+    assert (report["examples"], report["within_budget"], report["saved"]) == (10, 5, 3)
+    assert all("Too short" not in line for line in output.read_text().splitlines())
+    assert report["model_tokens"]["total"] == 10
@@ -0,0 +1,145 @@
+import time
+import pytest
+from flask import Flask
+import socketio as python_socketio
+from socketio.packet import Packet
+import controller.custom_document_processing_controller as controller
+import utils.transcription_cache as cache
+from model.socketio_instance import socketio
+from model.socketio_queue import LocalBroker, LocalBrokerManager, message_queue_options
+from utils.metrics import socketio_emits
+from utils.transcription_notifier import TranscriptionNotifier, transcription_room
+
+
+class Recorder:
+    def __init__(self):
+        self.emits = []
+        self.spawned = []
+
+    def emit(self, event, payload, to=None):
+        self.emits.append((event, payload, to))
+
+    def spawn(self, fn, *args):
+        self.spawned.append((fn, args))
+
+    def run_spawned(self):
+        spawned, self.spawned = self.spawned, []
+        for fn, args in spawned:
+            fn(*args)
+
+
+def make_notifier(window=0.25):
+    recorder = Recorder()
+    notifier = TranscriptionNotifier(window=window, emit=recorder.emit, spawn=recorder.spawn, sleep=lambda s: None)
+    return notifier, recorder
+
+
+def test_bursts_are_coalesced_per_upload():
+    notifier, recorder = make_notifier()
+
+    notifier.publish("uploads/a.pdf", "draft")
+    notifier.publish("uploads/a.pdf", "final")
+    notifier.publish("uploads/b.pdf", "other")
+    assert recorder.emits == []
+    assert len(recorder.spawned) == 2
+
+    recorder.run_spawned()
+
+    assert recorder.emits == [
+        ("transcription_update", {"text": "final", "s3_key": "uploads/a.pdf", "updates": 2}, "transcription:uploads/a.pdf"),
+        ("transcription_update", {"text": "other", "s3_key": "uploads/b.pdf", "updates": 1}, "transcription:uploads/b.pdf"),
+    ]
+    assert notifier.stats()["received"] == 3 and notifier.stats()["sent"] == 2
+
+
+def test_errors_follow_pending_updates_and_keyless_transcriptions_are_broadcast():
+    notifier, recorder = make_notifier()
+    notifier.publish("uploads/a.pdf", "partial")
+    notifier.error("uploads/a.pdf", {"job_id": "j1", "error": "boom"})
+    recorder.run_spawned()
+
+    assert [event for event, _, _ in recorder.emits] == ["transcription_update", "transcription_error"]
+    assert recorder.emits[1][1] == {"job_id": "j1", "error": "boom", "s3_key": "uploads/a.pdf"}
+
+    immediate, recorder = make_notifier(window=0)
+    immediate.publish(cache.DEFAULT_DOCUMENT_KEY, "no key")
+    assert recorder.emits == [("transcription_update", {"text": "no key", "s3_key": "latest", "updates": 1}, None)]
+
+
+@pytest.fixture
+def app(monkeypatch):
+    notifier = TranscriptionNotifier(window=0)
+    monkeypatch.setattr(controller, "transcription_notifier", notifier)
+    app = Flask(__name__)
+    app.register_blueprint(controller.Custom_document_tuning_bp)
+    socketio.init_app(app, async_mode="threading")
+    return app
+
+
+def received(client):
+    messages = {}
+    for message in client.get_received():
+        messages.setdefault(message["name"], []).append(message["args"][0])
+    return messages
+
+
+def test_lambda_updates_only_reach_the_uploads_room(app):
+    waiting = socketio.test_client(app)
+    bystander = socketio.test_client(app)
+    waiting.emit("subscribe_transcription", {"s3_key": "uploads/mine.pdf"})
+    bystander.emit("subscribe_transcription", {"s3_key": "uploads/theirs.pdf"})
+
+    response = app.test_client().post("/lambda_proxy", json={"text": "Hello there", "s3_key": "uploads/mine.pdf"})
+
+    assert response.status_code == 200
+    assert received(waiting)["transcription_update"] == [
+        {"text": "Hello there", "s3_key": "uploads/mine.pdf", "updates": 1}]
+    assert "transcription_update" not in received(bystander)
+
+
+def test_subscribing_after_the_transcription_arrived_replays_it(app):
+    cache.store_transcription("Already done", "uploads/early.pdf")
+    late = socketio.test_client(app)
+    counted = socketio_emits.labels("transcription_update").value, socketio_emits.labels("transcription_error").value
+
+    late.emit("subscribe_transcription", {"s3_key": "uploads/early.pdf"})
+    late.emit("subscribe_transcription", {})
+
+    messages = received(late)
+    assert messages["transcription_update"] == [{"text": "Already done", "s3_key": "uploads/early.pdf", "updates": 0}]
+    assert messages["transcription_error"] == [{"error": "Missing s3_key"}]
+    # Replies to the subscriber go through the instrumented server, so they show up in /metrics.
+    assert (socketio_emits.labels("transcription_update").value,
+            socketio_emits.labels("transcription_error").value) == (counted[0] + 1, counted[1] + 1)
+
+
+def test_local_broker_fans_room_emits_out_across_workers():
+    # Flask-SocketIO's test client refuses message queues, so two bare servers stand in for two workers.
+    broker = LocalBroker()
+    first = python_socketio.Server(async_mode="threading", client_manager=LocalBrokerManager(broker=broker))
+    second = python_socketio.Server(async_mode="threading", client_manager=LocalBrokerManager(broker=broker))
+    delivered = []
+    second._send_eio_packet = lambda eio_sid, pkt: delivered.append((eio_sid, Packet(encoded_packet=pkt.data).data))
+    second.manager.initialize()
+    sid = second.manager.connect("browser", "/")
+    second.enter_room(sid, transcription_room("uploads/shared.pdf"))
+    try:
+        first.emit("transcription_update", {"text": "via queue"}, to=transcription_room("uploads/shared.pdf"))
+        first.emit("transcription_update", {"text": "elsewhere"}, to=transcription_room("uploads/other.pdf"))
+
+        deadline = time.monotonic() + 2
+        while len(delivered) < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+
+        assert delivered == [("browser", ["transcription_update", {"text": "via queue"}])]
+        assert broker.published == 2
+    finally:
+        broker.close()
+
+
+def test_message_queue_options():
+    assert message_queue_options(url="") == {}
+    assert message_queue_options(url="redis://cache:6379/0", channel="chat") == {
+        "message_queue": "redis://cache:6379/0", "channel": "chat"}
+    assert isinstance(message_queue_options(url="local://tests")["client_manager"], LocalBrokerManager)
@@ -0,0 +1,182 @@
+import json
+from types import SimpleNamespace
+import pytest
+from flask import Flask
+import controller.tuning_job_controller as controller
+import job_manager
+from job_manager import TuningJobRunner
+from model.tuning_job_registry import TuningJobRegistry
+from utils.services import prepare_tuning_job, tuning_config
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch, gemini_line):
+    path = tmp_path / "train.jsonl"
+    path.write_text("\n".join(gemini_line(f"q{i}", f"a{i}") for i in range(10)) + "\n")
+    monkeypatch.setenv("TRAINING_DATASET_PATH", str(path))
+    return path
+
+
+def make_job(name, state, model=None):
+    return SimpleNamespace(name=name, state=state, tuned_model=SimpleNamespace(model=model, endpoint=None))
+
+
+class FakeTuningService:
+    """Finishes every job on its first poll."""
+
+    def __init__(self):
+        self.submitted = []
+        self.refreshed = []
+
+    def submit(self, plan):
+        self.submitted.append(plan)
+        return make_job(f"tuningJobs/{len(self.submitted)}", "JOB_STATE_QUEUED")
+
+    def refresh(self, name):
+        self.refreshed.append(name)
+        return make_job(name, "JOB_STATE_SUCCEEDED", model=f"tunedModels/{name[-1]}")
+
+
+def make_runner(registry, service, spawned):
+    return TuningJobRunner(submit=service.submit, refresh=service.refresh, emit=lambda *args: None,
+                           spawn=lambda func, *args: spawned.append(lambda: func(*args)), sleep=lambda delay: None,
+                           registry=registry)
+
+
+def test_overrides_are_validated_and_shape_the_fingerprint(dataset):
+    config, options = tuning_config({"epoch_count": 3, "learning_rate": 0.5, "max_examples": 5})
+
+    assert config["epoch_count"] == 3 and config["batch_size"] == 4 and config["learning_rate"] == 0.5
+    assert options == {"max_examples": 5}
+    for bad in ({"epochs": 2}, {"epoch_count": 1.5}, {"batch_size": 0}, {"base_model": ""}, {"num_shards": True}):
+        with pytest.raises(ValueError):
+            tuning_config(bad)
+
+    plan = prepare_tuning_job()
+    assert plan["dataset"]["examples"] == 10
+    assert prepare_tuning_job({"display_name": "Other name"})["fingerprint"] == plan["fingerprint"]
+    assert prepare_tuning_job({"epoch_count": 2})["fingerprint"] != plan["fingerprint"]
+    assert prepare_tuning_job({"max_examples": 5})["fingerprint"] != plan["fingerprint"]
+    # Jobs of the fake service are never reused for real requests, and the other way around.
+    assert plan["service"] == "gemini" and prepare_tuning_job(service="fake")["fingerprint"] != plan["fingerprint"]
+
+    # The fingerprint follows the streamed examples, not the file they come from.
+    as_array = dataset.parent / "train.json"
+    as_array.write_text(json.dumps([{"text_input": f"q{i}", "output": f"a{i}"} for i in range(10)]))
+    assert prepare_tuning_job(dataset_path=str(as_array))["fingerprint"] == plan["fingerprint"]
+
+
+def test_matching_requests_reuse_the_registered_job_across_restarts(dataset, tmp_path):
+    path = str(tmp_path / "jobs.json")
+    service, spawned = FakeTuningService(), []
+    runner = make_runner(TuningJobRegistry(path), service, spawned)
+
+    snapshot, started = runner.start({"epoch_count": 2})
+    assert started and snapshot["config"]["epoch_count"] == 2
+    spawned.pop()()
+    assert runner.snapshot()["ready"] and runner.snapshot()["fine_tuned_model"] == "tunedModels/1"
+
+    # After a restart, the same request reuses the finished model; a different one tunes again.
+    restarted, activated = make_runner(TuningJobRegistry(path), service, spawned), []
+    restarted.add_success_listener(activated.append)
+    snapshot, started = restarted.start({"epoch_count": 2, "display_name": "Renamed"})
+    assert started and snapshot["state"] == "PREPARING"
+    spawned.pop()()
+    assert restarted.snapshot()["reused"] and restarted.snapshot()["fine_tuned_model"] == "tunedModels/1"
+    assert len(service.submitted) == 1 and service.refreshed == ["tuningJobs/1", "tuningJobs/1"]
+    assert [job.name for job in activated] == ["tuningJobs/1"] and job_manager.tuning_job_instance.name == "tuningJobs/1"
+
+    assert restarted.start({"epoch_count": 3})[1] is True
+    spawned.pop()()
+    assert len(service.submitted) == 2
+    assert [entry["fine_tuned_model"] for entry in TuningJobRegistry(path).entries()] == ["tunedModels/2", "tunedModels/1"]
+
+
+def test_a_job_still_running_at_restart_is_polled_again(dataset, tmp_path):
+    registry = TuningJobRegistry(str(tmp_path / "jobs.json"))
+    fingerprint = prepare_tuning_job()["fingerprint"]
+    registry.record(fingerprint, job_id="tuningJobs/7", state="JOB_STATE_RUNNING")
+    service, spawned = FakeTuningService(), []
+    runner = make_runner(registry, service, spawned)
+
+    states = []
+    runner._emit = lambda event, payload: states.append((payload["state"], payload.get("reused", False)))
+
+    assert runner.start()[1] is True
+    assert runner.start()[1] is False
+    spawned.pop()()
+
+    assert states == [("PREPARING", False), ("JOB_STATE_RUNNING", True), ("JOB_STATE_SUCCEEDED", False)]
+    assert service.submitted == [] and service.refreshed == ["tuningJobs/7"]
+    assert registry.get(fingerprint)["state"] == "JOB_STATE_SUCCEEDED"
+
+
+def test_a_registered_job_that_no_longer_exists_is_marked_failed(dataset, tmp_path):
+    registry = TuningJobRegistry(str(tmp_path / "jobs.json"))
+    fingerprint = prepare_tuning_job()["fingerprint"]
+    registry.record(fingerprint, job_id="tuningJobs/gone", state="JOB_STATE_RUNNING")
+    service, spawned = FakeTuningService(), []
+    service.refresh = lambda name: (_ for _ in ()).throw(RuntimeError("404 NOT_FOUND"))
+    runner = make_runner(registry, service, spawned)
+
+    runner.start()
+    spawned.pop()()
+
+    assert not runner.is_active() and runner.snapshot()["state"] == "JOB_STATE_FAILED"
+    assert registry.get(fingerprint)["state"] == "JOB_STATE_FAILED"
+    assert runner.start()[1] is True
+
+
+def test_failed_jobs_are_not_reused(dataset, tmp_path):
+    registry = TuningJobRegistry(str(tmp_path / "jobs.json"))
+    fingerprint = prepare_tuning_job()["fingerprint"]
+    registry.record(fingerprint, job_id="tuningJobs/9", state="JOB_STATE_FAILED")
+    service, spawned = FakeTuningService(), []
+
+    assert make_runner(registry, service, spawned).start()[1] is True
+    spawned.pop()()
+
+    assert registry.get(fingerprint)["job_id"] == "tuningJobs/1"
+
+
+def test_tuning_job_endpoint_rejects_bad_overrides(dataset, tmp_path, monkeypatch):
+    service, spawned = FakeTuningService(), []
+    monkeypatch.setattr(job_manager, "tuning_job_runner", make_runner(TuningJobRegistry(None), service, spawned))
+    app = Flask(__name__)
+    app.register_blueprint(controller.tuning_bp)
+    client = app.test_client()
+
+    assert client.post("/tuning-job", json={"epoch_count": "many"}).status_code == 400
+    response = client.post("/tuning-job", json={"batch_size": 8})
+    assert response.status_code == 202 and response.get_json()["config"]["batch_size"] == 8
+
+
+def test_requests_are_prepared_off_the_request_thread(dataset, tmp_path):
+    prepared, spawned = [], []
+    service = FakeTuningService()
+    runner = TuningJobRunner(submit=service.submit, refresh=service.refresh, emit=lambda *args: None,
+                             spawn=lambda func, *args: spawned.append(lambda: func(*args)), sleep=lambda delay: None,
+                             registry=TuningJobRegistry(None),
+                             prepare=lambda overrides: prepared.append(overrides) or prepare_tuning_job(overrides))
+
+    snapshot, started = runner.start({"epoch_count": 2})
+    assert started and snapshot["state"] == "PREPARING" and prepared == []
+    # A request while a job is active is turned away without reading the dataset.
+    assert runner.start({"epoch_count": 3})[1] is False and prepared == []
+    with pytest.raises(ValueError):
+        TuningJobRunner(registry=TuningJobRegistry(None), spawn=spawned.append).start({"epochs": 2})
+
+    spawned.pop()()
+    assert prepared == [{"epoch_count": 2}] and runner.snapshot()["ready"]
+
+
+def test_a_request_that_cannot_be_prepared_fails_and_can_be_retried(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRAINING_DATASET_PATH", str(tmp_path / "missing.jsonl"))
+    service, spawned = FakeTuningService(), []
+    runner = make_runner(TuningJobRegistry(None), service, spawned)
+
+    runner.start()
+    spawned.pop()()
+
+    assert runner.snapshot()["state"] == "JOB_STATE_FAILED" and not runner.is_active()
+    assert service.submitted == [] and runner.start()[1] is True
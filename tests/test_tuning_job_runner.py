@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+from job_manager import TuningJobRunner
+
+
+def make_job(state, model=None):
+    return SimpleNamespace(name="tuningJobs/1", state=state, tuned_model=SimpleNamespace(model=model, endpoint=None))
+
+
+def test_job_is_polled_with_backoff_until_it_finishes():
+    states = iter([make_job("JOB_STATE_RUNNING"), RuntimeError("503"), make_job("JOB_STATE_RUNNING"),
+                   make_job("JOB_STATE_SUCCEEDED", model="tunedModels/liu")])
+
+    def refresh(name):
+        result = next(states)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    events, sleeps, spawned, succeeded = [], [], [], []
+    runner = TuningJobRunner(
+        submit=lambda: make_job("JOB_STATE_QUEUED"),
+        refresh=refresh,
+        emit=lambda event, payload: events.append(payload["state"]),
+        spawn=spawned.append,
+        sleep=sleeps.append,
+        initial_delay=1, max_delay=3,
+    )
+    runner.add_success_listener(succeeded.append)
+
+    snapshot, started = runner.start()
+    assert started and snapshot["state"] == "SUBMITTING"
+    assert runner.start()[1] is False
+
+    spawned[0]()
+
+    assert events == ["SUBMITTING", "JOB_STATE_QUEUED", "JOB_STATE_RUNNING", "JOB_STATE_SUCCEEDED"]
+    assert sleeps == [1, 2, 3, 3]
+    assert runner.snapshot()["ready"] is True
+    assert runner.snapshot()["fine_tuned_model"] == "tunedModels/liu"
+    assert len(succeeded) == 1
+    assert runner.start()[1] is False
+
+
+def test_failed_submission_can_be_retried():
+    def submit():
+        raise RuntimeError("quota exceeded")
+
+    spawned = []
+    runner = TuningJobRunner(submit=submit, refresh=None, emit=lambda *args: None, spawn=spawned.append, sleep=None)
+    runner.start()
+    spawned[0]()
+
+    assert runner.snapshot()["state"] == "JOB_STATE_FAILED"
+    assert runner.snapshot()["error"] == "quota exceeded"
+    assert runner.start()[1] is True
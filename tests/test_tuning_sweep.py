@@ -0,0 +1,183 @@
+import json
+import pytest
+from model.tuning_job_registry import TuningJobRegistry
+from model.tuning_services import FakeTuningService
+from utils.services import prepare_tuning_job
+from utils.tuning_sweep import SweepScheduler, expand_search
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def datasets(tmp_path, gemini_line):
+    paths = {}
+    for name, size in (("small", 5), ("large", 20)):
+        path = tmp_path / f"{name}.jsonl"
+        path.write_text("\n".join(gemini_line(f"q{i}", f"a{i}") for i in range(size)) + "\n")
+        paths[name] = str(path)
+    return paths
+
+
+def make_scheduler(tmp_path, datasets, clock, service=None, **options):
+    """
+    Builds a scheduler on a fake service whose submitted plans are kept in service.plans,
+    so the fake evaluation can score a job by its settings. Passing the service of an
+    earlier scheduler simulates a restart.
+    """
+    service = service or FakeTuningService(seconds_per_epoch=60, clock=clock)
+    if not hasattr(service, "plans"):
+        service.plans = {}
+        original_submit = service.submit
+
+        def submit(plan):
+            job = original_submit(plan)
+            service.plans[job.name] = plan
+            return job
+
+        service.submit = submit
+
+    def evaluate(job, sweep):
+        # Pretend more epochs on the larger dataset score better.
+        plan = service.plans[job.name]
+        return {"f1": plan["config"]["epoch_count"] / 10 + plan["dataset"]["examples"] / 100, "examples": 3, "errors": 0}
+
+    settings = dict(state_dir=str(tmp_path / "sweeps"), datasets=datasets, evaluate=evaluate,
+                    max_concurrent=2, poll_interval=10, clock=clock, sleep=clock.sleep, spawn=lambda func: func())
+    settings.update(options)
+    return SweepScheduler(service, **settings), service
+
+
+def test_grid_and_random_search_expand_to_distinct_trials():
+    grid = expand_search("grid", {"epoch_count": [1, 2], "batch_size": [4, 8], "dataset": ["small", "large"]})
+    assert len(grid) == 8 and {"epoch_count": 2, "batch_size": 8, "dataset": "small"} in grid
+
+    space = {"learning_rate": {"min": 0.01, "max": 1.0, "log": True}, "epoch_count": {"min": 1, "max": 3}}
+    trials = expand_search("random", space, trials=6, seed=3)
+    assert trials == expand_search("random", space, trials=6, seed=3)
+    assert all(0.01 <= trial["learning_rate"] <= 1.0 and trial["epoch_count"] in (1, 2, 3) for trial in trials)
+
+    for search, bad in (("grid", {"epochs": [1]}), ("grid", {"epoch_count": {"min": 1, "max": 2}}),
+                        ("grid", {"epoch_count": []}), ("random", {"epoch_count": [1]}), ("bayes", {"epoch_count": [1]})):
+        with pytest.raises(ValueError):
+            expand_search(search, bad, trials=0 if search == "random" else None)
+
+
+def test_trials_run_under_the_concurrency_limit_and_are_ranked(tmp_path, datasets):
+    clock = FakeClock()
+    scheduler, service = make_scheduler(tmp_path, datasets, clock)
+
+    sweep = scheduler.create({"search": "grid", "space": {"epoch_count": [1, 2], "dataset": ["small", "large"]}})
+    assert [trial["state"] for trial in sweep["trials"]] == ["queued"] * 4
+    with pytest.raises(ValueError):
+        scheduler.create({"space": {"dataset": ["unknown"]}})
+
+    assert scheduler.run_until_complete()
+
+    sweep = scheduler.get(sweep["id"])
+    assert sweep["state"] == "completed" and service.submitted == 4 and service.peak_active == 2
+    assert [entry["params"] for entry in sweep["ranking"]] == [
+        {"dataset": "large", "epoch_count": 2}, {"dataset": "large", "epoch_count": 1},
+        {"dataset": "small", "epoch_count": 2}, {"dataset": "small", "epoch_count": 1},
+    ]
+    assert sweep["best"]["trial"] == sweep["ranking"][0]["trial"]
+    # Two slots and jobs of 60 to 120 simulated seconds: about 240 seconds, not the 360 of a serial run.
+    assert clock.now - 1000 <= 260
+
+
+def test_quota_errors_requeue_trials_with_backoff(tmp_path, datasets):
+    clock = FakeClock()
+    service = FakeTuningService(seconds_per_epoch=30, max_active=1, clock=clock)
+    scheduler, _ = make_scheduler(tmp_path, datasets, clock, service=service, max_concurrent=3)
+
+    sweep = scheduler.create({"search": "grid", "space": {"epoch_count": [1, 2, 3]}})
+    assert scheduler.run_until_complete()
+
+    trials = scheduler.get(sweep["id"])["trials"]
+    assert service.peak_active == 1 and service.submitted == 3
+    assert all(trial["state"] == "completed" for trial in trials)
+    assert max(trial["attempts"] for trial in trials) > 1
+
+
+def test_progress_on_disk_survives_a_restart(tmp_path, datasets):
+    clock = FakeClock()
+    scheduler, service = make_scheduler(tmp_path, datasets, clock)
+    sweep_id = scheduler.create({"search": "grid", "space": {"epoch_count": [1, 2, 3]}})["id"]
+    scheduler.step()
+    clock.sleep(70)
+
+    restarted, _ = make_scheduler(tmp_path, datasets, clock, service=service)
+    assert restarted.has_unfinished()
+    assert [trial["state"] for trial in restarted.get(sweep_id)["trials"]] == ["running", "running", "queued"]
+    assert restarted.run_until_complete()
+
+    assert service.submitted == 3
+    saved = json.loads((tmp_path / "sweeps" / f"{sweep_id}.json").read_text())
+    assert saved["state"] == "completed" and len(saved["ranking"]) == 3
+
+
+def test_registered_jobs_are_reused_and_failures_are_not_ranked(tmp_path, datasets):
+    clock = FakeClock()
+    registry = TuningJobRegistry(str(tmp_path / "jobs.json"))
+    service = FakeTuningService(seconds_per_epoch=10, failure_rate=1.0, clock=clock)
+    scheduler, _ = make_scheduler(tmp_path, datasets, clock, service=service, registry=registry)
+    plan = prepare_tuning_job({"epoch_count": 1}, datasets["small"], service="fake")
+    service.plans["tuningJobs/earlier"] = plan
+    registry.record(plan["fingerprint"], job_id="tuningJobs/earlier", state="JOB_STATE_SUCCEEDED")
+    service.get = lambda name, get=service.get: (
+        get(name) if name != "tuningJobs/earlier" else
+        type("Job", (), {"name": name, "state": "JOB_STATE_SUCCEEDED",
+                         "tuned_model": type("Model", (), {"model": "tunedModels/earlier", "endpoint": None})})())
+
+    sweep = scheduler.create({"search": "grid", "space": {"epoch_count": [1, 2], "dataset": ["small"]}})
+    assert scheduler.run_until_complete()
+
+    trials = scheduler.get(sweep["id"])["trials"]
+    assert service.submitted == 1 and trials[0]["reused"] and trials[0]["rank"] == 1
+    assert trials[1]["state"] == "failed" and "rank" not in trials[1]
+    assert registry.get(trials[1]["fingerprint"])["state"] == "JOB_STATE_FAILED"
+
+
+def test_evaluations_run_in_the_background_without_holding_up_other_trials(tmp_path, datasets):
+    clock, evaluations = FakeClock(), []
+    scheduler, service = make_scheduler(tmp_path, datasets, clock, max_concurrent=1, spawn=evaluations.append)
+
+    sweep_id = scheduler.create({"search": "grid", "space": {"epoch_count": [1, 2]}})["id"]
+    scheduler.step()
+    clock.sleep(60)
+    scheduler.step()
+
+    # The first job finished; its evaluation is pending while the second job is already submitted.
+    assert [trial["state"] for trial in scheduler.get(sweep_id)["trials"]] == ["evaluating", "running"]
+    assert service.submitted == 2 and len(evaluations) == 1
+    evaluations.pop()()
+    clock.sleep(120)
+    scheduler.step()
+    evaluations.pop()()
+    assert scheduler.step() and scheduler.get(sweep_id)["state"] == "completed"
+
+
+def test_jobs_that_cannot_be_polled_fail_their_trial(tmp_path, datasets):
+    clock = FakeClock()
+    registry = TuningJobRegistry(str(tmp_path / "jobs.json"))
+    scheduler, service = make_scheduler(tmp_path, datasets, clock, registry=registry, max_poll_errors=3)
+
+    def unavailable(name):
+        raise RuntimeError("503 UNAVAILABLE")
+
+    sweep_id = scheduler.create({"search": "grid", "space": {"epoch_count": [1]}})["id"]
+    scheduler.step()
+    service.get = unavailable
+
+    assert scheduler.run_until_complete(max_steps=5)
+    trial = scheduler.get(sweep_id)["trials"][0]
+    assert trial["state"] == "failed" and trial["poll_errors"] == 3
+    assert registry.get(trial["fingerprint"])["state"] == "JOB_STATE_FAILED"
@@ -0,0 +1,58 @@
+import threading
+from model.vertex_model_registry import VertexModelRegistry
+
+
+class FakeFactory:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, project, location, model_name):
+        self.calls.append(model_name)
+        return object()
+
+
+def test_model_is_built_once_and_shared_across_threads():
+    factory = FakeFactory()
+    registry = VertexModelRegistry(model_factory=factory)
+    models = []
+
+    threads = [threading.Thread(target=lambda: models.append(registry.get_model())) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(factory.calls) == 1
+    assert all(model is models[0] for model in models)
+
+
+def test_endpoint_change_rebuilds_and_notifies(monkeypatch):
+    monkeypatch.delenv("VERTEX_ENDPOINT_ID", raising=False)
+    factory = FakeFactory()
+    registry = VertexModelRegistry(model_factory=factory)
+    rebuilt = []
+    registry.add_rebuild_listener(rebuilt.append)
+
+    first = registry.get_model()
+    monkeypatch.setenv("VERTEX_ENDPOINT_ID", "1234")
+    second = registry.get_model()
+
+    assert first is not second
+    assert factory.calls[-1].endswith("/endpoints/1234")
+    assert rebuilt == [registry.model_name()]
+
+
+def test_credentials_change_rebuilds(monkeypatch, tmp_path):
+    creds = tmp_path / "creds.json"
+    creds.write_text("{}")
+    monkeypatch.setenv("GOOGLE_APPLICATION_CREDENTIALS", str(creds))
+    factory = FakeFactory()
+    registry = VertexModelRegistry(model_factory=factory)
+
+    registry.get_model()
+    other = tmp_path / "other.json"
+    other.write_text("{}")
+    monkeypatch.setenv("GOOGLE_APPLICATION_CREDENTIALS", str(other))
+    registry.get_model()
+
+    assert len(factory.calls) == 2